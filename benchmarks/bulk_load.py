@@ -0,0 +1,84 @@
+"""Compares building a large model with bulk_load to building it one request per element.
+
+Run from the repository root with:
+    python -m benchmarks.bulk_load
+"""
+import argparse
+
+from python_logic.model import Model
+from .common import time_call, element_requests
+
+LAYER_TYPES = ["Dense", "Activation", "Batch Normalization"]
+
+
+def describe_chain(layer_count):
+    # a chain of layers, with the units of every Dense layer set
+    vertices = {}
+    edges = {}
+    for i in range(layer_count):
+        layer_type = LAYER_TYPES[i % len(LAYER_TYPES)]
+        vertices[str(i)] = {
+            "layerType": layer_type,
+            "x": i * 10,
+            "y": (i % 7) * 50,
+            "fieldValues": {"units": str(16 + i % 100)} if layer_type == "Dense" else {},
+        }
+        if i != 0:
+            edges["e" + str(i)] = {
+                "sourceVertexId": str(i - 1),
+                "sourcePortId": "output_shape_port",
+                "targetVertexId": str(i),
+                "targetPortId": "input_shape_port",
+            }
+    return vertices, edges
+
+
+def build_one_request_per_batch(vertices, edges):
+    model = Model()
+    for req in element_requests(vertices, edges):
+        model.request_model_changes([req])
+    return model
+
+
+def build_one_batch(vertices, edges):
+    model = Model()
+    model.request_model_changes(element_requests(vertices, edges))
+    return model
+
+
+def build_bulk(vertices, edges):
+    model = Model()
+    err = model.bulk_load(vertices, edges)
+    assert err is None, "Assert bulk load succeeded: " + str(err)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument(
+        "--max-baseline-layers",
+        type=int,
+        default=5000,
+        help="larger graphs skip the per-request builds, whose loop checks make them quadratic on a chain",
+    )
+    args = parser.parse_args()
+
+    print("{:>8} {:>26} {:>16} {:>14}".format("layers", "one request/batch (s)", "one batch (s)", "bulk load (s)"))
+
+    for layer_count in [int(size) for size in args.sizes.split(",")]:
+        vertices, edges = describe_chain(layer_count)
+
+        bulk_time, bulk_model = time_call(lambda: build_bulk(vertices, edges))
+        row = ["-", "-"]
+        if layer_count <= args.max_baseline_layers:
+            for idx, build in enumerate([build_one_request_per_batch, build_one_batch]):
+                build_time, model = time_call(lambda: build(vertices, edges))
+                assert model.save_snapshot()["vertices"] == bulk_model.save_snapshot()["vertices"], "Assert models match"
+                row[idx] = "{:.2f}".format(build_time)
+
+        print("{:>8} {:>26} {:>16} {:>14.2f}".format(layer_count, row[0], row[1], bulk_time))
+
+
+if __name__ == "__main__":
+    main()
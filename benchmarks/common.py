@@ -0,0 +1,31 @@
+import time
+
+# helpers shared by the benchmarks
+
+
+def time_call(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def element_requests(vertices, edges):
+    # the createLayer, setLayerFields and createEdge requests that build the graph bulk_load
+    # would build from the same vertex and edge descriptions
+    reqs = []
+    for layer_id in vertices:
+        description = vertices[layer_id]
+        reqs.append({
+            "type": "createLayer",
+            "layerType": description["layerType"],
+            "newLayerId": layer_id,
+            "x": description["x"],
+            "y": description["y"],
+        })
+        if len(description.get("fieldValues", {})) != 0:
+            reqs.append({"type": "setLayerFields", "layerId": layer_id, "fieldValues": description["fieldValues"]})
+    for edge_id in edges:
+        req = {"type": "createEdge", "newEdgeId": edge_id}
+        req.update(edges[edge_id])
+        reqs.append(req)
+    return reqs
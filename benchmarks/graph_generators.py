@@ -0,0 +1,103 @@
+"""Synthetic networks for the benchmarks, as the vertex and edge descriptions bulk_load takes.
+
+Every generator starts from one Input layer whose shape is (batch, 64) and keeps the last
+dimension at 64, so changing the Input's first dimension propagates through the whole graph. In
+residual graphs it stops at the first Add layer, since its two inputs change one at a time and
+don't agree in between.
+"""
+
+INPUT_ID = "input"
+UNITS = "64"
+INPUT_SHAPES = ["(8, 64)", "(16, 64)"]
+X_SPACING = 150
+Y_SPACING = 100
+
+
+def _vertex(layer_type, column, row, field_values=None):
+    return {
+        "layerType": layer_type,
+        "x": column * X_SPACING,
+        "y": row * Y_SPACING,
+        "fieldValues": field_values if field_values is not None else {},
+    }
+
+
+def _dense(column, row):
+    return _vertex("Dense", column, row, {"units": UNITS})
+
+
+def _edge(source_id, target_id, target_port_id="input_shape_port"):
+    return {
+        "sourceVertexId": source_id,
+        "sourcePortId": "output_shape_port",
+        "targetVertexId": target_id,
+        "targetPortId": target_port_id,
+    }
+
+
+def _with_input():
+    vertices = {INPUT_ID: _vertex("Input", 0, 0, {"output_shape": INPUT_SHAPES[0]})}
+    return vertices, {}
+
+
+def layered_graph(vertex_count):
+    # a deep sequential network of Dense, Activation and Batch Normalization layers
+    vertices, edges = _with_input()
+    block_types = ["Dense", "Activation", "Batch Normalization"]
+    previous_id = INPUT_ID
+    for idx in range(1, vertex_count):
+        layer_id = "l" + str(idx)
+        layer_type = block_types[idx % len(block_types)]
+        if layer_type == "Dense":
+            vertices[layer_id] = _dense(0, idx)
+        else:
+            vertices[layer_id] = _vertex(layer_type, 0, idx)
+        edges["e" + str(idx)] = _edge(previous_id, layer_id)
+        previous_id = layer_id
+    return vertices, edges
+
+
+def residual_graph(vertex_count):
+    # blocks of Dense, Activation and an Add that joins the block's output to its input
+    vertices, edges = _with_input()
+    block_input_id = INPUT_ID
+    idx = 1
+    while idx + 3 <= vertex_count:
+        dense_id = "d" + str(idx)
+        activation_id = "a" + str(idx)
+        add_id = "s" + str(idx)
+        vertices[dense_id] = _dense(1, idx)
+        vertices[activation_id] = _vertex("Activation", 1, idx + 1)
+        vertices[add_id] = _vertex("Add", 0, idx + 2, {
+            "first_input_shape": INPUT_SHAPES[0],
+            "second_input_shape": INPUT_SHAPES[0],
+        })
+        edges["e" + dense_id] = _edge(block_input_id, dense_id)
+        edges["e" + activation_id] = _edge(dense_id, activation_id)
+        edges["e" + add_id + "f"] = _edge(activation_id, add_id, "first_input_shape_port")
+        edges["e" + add_id + "s"] = _edge(block_input_id, add_id, "second_input_shape_port")
+        block_input_id = add_id
+        idx += 3
+    return vertices, edges
+
+
+def wide_graph(vertex_count):
+    # branches of a Dense and an Activation layer that all start at the Input, so the Input
+    # has a very high fan-out
+    vertices, edges = _with_input()
+    branch_count = (vertex_count - 1) // 2
+    for branch in range(branch_count):
+        dense_id = "d" + str(branch)
+        activation_id = "a" + str(branch)
+        vertices[dense_id] = _dense(branch, 1)
+        vertices[activation_id] = _vertex("Activation", branch, 2)
+        edges["e" + dense_id] = _edge(INPUT_ID, dense_id)
+        edges["e" + activation_id] = _edge(dense_id, activation_id)
+    return vertices, edges
+
+
+GRAPH_GENERATORS = {
+    "layered": layered_graph,
+    "residual": residual_graph,
+    "wide": wide_graph,
+}
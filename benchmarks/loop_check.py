@@ -0,0 +1,117 @@
+"""Times the loop check in Graph.validate_edge against the old search over the source's ancestors.
+
+Run from the repository root with:
+    python -m benchmarks.loop_check
+"""
+import argparse
+import random
+import time
+
+from python_logic.model.graph import Graph, Vertex, Port
+
+CHAIN_LENGTHS = [100, 1000, 10000]
+# unconnected layers, like ones just dropped onto the canvas
+LOOSE_VERTEX_COUNT = 20
+
+
+def new_vertex():
+    return Vertex(
+        "Activation",
+        {
+            "input": Port("top", 0.5, "input", "input_shape"),
+            "output": Port("bottom", 0.5, "output", "output_shape"),
+        },
+        0,
+        0,
+    )
+
+
+def build_chain_graph(chain_length):
+    graph = Graph()
+    chain_ids = ["c" + str(i) for i in range(chain_length)]
+    for idx, vtx_id in enumerate(chain_ids):
+        graph.add_vertex(vtx_id, new_vertex())
+        if idx != 0:
+            graph.create_edge("e" + str(idx), chain_ids[idx - 1], "output", vtx_id, "input")
+
+    loose_ids = ["l" + str(i) for i in range(LOOSE_VERTEX_COUNT)]
+    for vtx_id in loose_ids:
+        graph.add_vertex(vtx_id, new_vertex())
+
+    return graph, chain_ids, loose_ids
+
+
+def legacy_would_create_loop(graph, source_vertex_id, target_vertex_id):
+    # the check validate_edge did before it used the topological order
+    source_ancestors = set()
+    source_ancestors_uninvestigated = set()
+    source_ancestors_uninvestigated.add(source_vertex_id)
+    while len(source_ancestors_uninvestigated) != 0:
+        ancestor_id = source_ancestors_uninvestigated.pop()
+        source_ancestors.add(ancestor_id)
+
+        for edge_id in graph.edge_ids_into_vertex(ancestor_id):
+            edge_source_id = graph.get_edge(edge_id).source_vertex_id()
+            if edge_source_id not in source_ancestors and edge_source_id not in source_ancestors_uninvestigated:
+                source_ancestors_uninvestigated.add(edge_source_id)
+
+    return target_vertex_id in source_ancestors
+
+
+def time_checks(check, graph, pairs):
+    start = time.perf_counter()
+    for source_id, target_id in pairs:
+        check(graph, source_id, target_id)
+    return (time.perf_counter() - start) / len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chain-lengths", type=int, nargs="+", default=CHAIN_LENGTHS)
+    parser.add_argument("--checks", type=int, default=200,
+                        help="edges checked for each case")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    new_check = lambda graph, source_id, target_id: graph.would_create_loop(source_id, target_id)
+
+    print("{:>8} {:>28} {:>12} {:>12} {:>8}".format(
+        "chain", "case", "old (us)", "new (us)", "speedup"))
+
+    for chain_length in args.chain_lengths:
+        graph, chain_ids, loose_ids = build_chain_graph(chain_length)
+        last_id = chain_ids[-1]
+
+        cases = [
+            # dragging a wire from the end of the chain over the loose layers
+            ("chain end -> loose layer", [(last_id, rnd.choice(loose_ids)) for _ in range(args.checks)]),
+            # wiring a loose layer into the chain
+            ("loose layer -> chain", [(rnd.choice(loose_ids), rnd.choice(chain_ids)) for _ in range(args.checks)]),
+            # skip connections further down the chain
+            ("chain -> later in chain", [
+                (chain_ids[i], chain_ids[rnd.randrange(i + 1, chain_length)])
+                for i in (rnd.randrange(0, chain_length - 1) for _ in range(args.checks))
+            ]),
+            # edges back up the chain, which would make loops
+            ("chain end -> chain (loop)", [(last_id, rnd.choice(chain_ids)) for _ in range(args.checks)]),
+        ]
+
+        for case_name, pairs in cases:
+            for source_id, target_id in pairs:
+                assert legacy_would_create_loop(graph, source_id, target_id) == graph.would_create_loop(source_id, target_id), \
+                    "Assert both checks agree"
+
+            old_time = time_checks(legacy_would_create_loop, graph, pairs)
+            new_time = time_checks(new_check, graph, pairs)
+            print("{:>8} {:>28} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+                chain_length,
+                case_name,
+                old_time * 1e6,
+                new_time * 1e6,
+                old_time / new_time,
+            ))
+
+
+if __name__ == "__main__":
+    main()
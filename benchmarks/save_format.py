@@ -0,0 +1,122 @@
+"""Compares the binary save format to pickling the graph, like saves used to.
+
+Run from the repository root with:
+    python -m benchmarks.save_format
+
+Loading a binary save is a few times slower than unpickling. Unpickling restores the objects
+as they were, while a binary load builds and validates every layer again. The "decode" column
+is the part of the load spent reading the file.
+"""
+import argparse
+import os
+import pickle
+import tempfile
+
+from python_logic.model import Model
+from python_logic.model.save_format import write_save_file, read_save_file, read_save_header
+from .common import time_call
+
+LAYER_TYPES = ["Dense", "Activation", "Batch Normalization"]
+
+
+def build_model(vertex_count):
+    # a chain of layers that all have input_shape_port and output_shape_port ports
+    model = Model()
+    model.request_model_changes([
+        {
+            "type": "createLayer",
+            "layerType": LAYER_TYPES[i % len(LAYER_TYPES)],
+            "newLayerId": str(i),
+            "x": i * 10,
+            "y": (i % 7) * 50.5,
+        }
+        for i in range(vertex_count)
+    ])
+    model.request_model_changes([
+        {
+            "type": "createEdge",
+            "newEdgeId": "e" + str(i),
+            "sourceVertexId": str(i),
+            "sourcePortId": "output_shape_port",
+            "targetVertexId": str(i + 1),
+            "targetPortId": "input_shape_port",
+        }
+        for i in range(vertex_count - 1)
+    ])
+    return model
+
+
+def bench_pickle(model, file_path):
+    def save():
+        with open(file_path, "wb") as handle:
+            pickle.dump({"graph": model._graph, "layer_dict": model._layer_dict}, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load():
+        with open(file_path, "rb") as handle:
+            return pickle.load(handle)
+
+    save_time, _ = time_call(save)
+    load_time, _ = time_call(load)
+    return save_time, load_time, None, None, os.path.getsize(file_path)
+
+
+def bench_save_format(model, file_path, compress):
+    def save():
+        snapshot = model.save_snapshot()
+        with open(file_path, "wb") as handle:
+            write_save_file(handle, snapshot["metadata"], snapshot["vertices"], snapshot["edges"], compress=compress)
+
+    def load():
+        with open(file_path, "rb") as handle:
+            metadata, records = read_save_file(handle)
+            Model().load_snapshot(metadata, records)
+
+    def decode():
+        with open(file_path, "rb") as handle:
+            metadata, records = read_save_file(handle)
+            for _ in records:
+                pass
+
+    def read_header():
+        with open(file_path, "rb") as handle:
+            return read_save_header(handle)
+
+    save_time, _ = time_call(save)
+    load_time, _ = time_call(load)
+    decode_time, _ = time_call(decode)
+    header_time, _ = time_call(read_header)
+    return save_time, load_time, decode_time, header_time, os.path.getsize(file_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vertices", type=int, default=10000)
+    args = parser.parse_args()
+
+    model = build_model(args.vertices)
+
+    print("{} vertices".format(args.vertices))
+    print("{:>22} {:>10} {:>10} {:>12} {:>12} {:>12}".format(
+        "format", "save (ms)", "load (ms)", "decode (ms)", "header (ms)", "size (KB)"))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "model")
+        results = [
+            ("pickle", bench_pickle(model, file_path)),
+            ("binary", bench_save_format(model, file_path, compress=False)),
+            ("binary + compression", bench_save_format(model, file_path, compress=True)),
+        ]
+
+    for name, (save_time, load_time, decode_time, header_time, size) in results:
+        print("{:>22} {:>10.1f} {:>10.1f} {:>12} {:>12} {:>12.1f}".format(
+            name,
+            save_time * 1000,
+            load_time * 1000,
+            "-" if decode_time is None else "{:.1f}".format(decode_time * 1000),
+            "-" if header_time is None else "{:.3f}".format(header_time * 1000),
+            size / 1024,
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Times model operations on generated layered, residual and wide graphs, saving the results as JSON and comparing them to a baseline.
+
+Run from the repository root with:
+    python -m benchmarks.suite --output baseline.json
+and after a change, to see what got slower:
+    python -m benchmarks.suite --output results.json --baseline baseline.json
+The command exits with status 1 if anything regressed past the threshold.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from python_logic.model import Model
+from python_logic.model.file_utils import spill_model, load_spilled_model
+from .common import time_call, element_requests
+from .graph_generators import GRAPH_GENERATORS, INPUT_ID, INPUT_SHAPES
+
+SIZES = [100, 1000, 10000, 100000]
+# building with request_model_changes is only timed up to this many vertices
+MAX_REQUEST_BUILD_SIZE = 10000
+# how many different requests the info request timings are averaged over
+SAMPLED_CALL_COUNT = 200
+# unconnected layers added to each graph, so some validated edges go to free ports
+LOOSE_LAYER_COUNT = 10
+DOCUMENT_ID = "benchmark"
+
+# quick operations are repeated until they've run for this long, up to MAX_REPEATS times
+MIN_MEASURED_SECONDS = 0.2
+MAX_REPEATS = 100
+
+REGRESSION_THRESHOLD = 1.25
+# differences between timings shorter than this, or allocations smaller than this, are noise
+MIN_COMPARED_SECONDS = 1e-5
+MIN_COMPARED_BYTES = 64 * 1024
+
+
+def measure(func, repeats, calls=1, measure_memory=True):
+    # Runs func at least repeats times, then once more while tracing allocations if
+    # measure_memory. func makes calls calls of what's being timed, and the times are per call.
+    # Baselines are compared by the fastest time, which is the least affected by noise.
+    times = []
+    total_seconds = 0
+    while len(times) < repeats or (total_seconds < MIN_MEASURED_SECONDS and len(times) < MAX_REPEATS):
+        elapsed, _ = time_call(func)
+        times.append(elapsed / calls)
+        total_seconds += elapsed
+
+    result = {
+        "seconds": statistics.median(times),
+        "minSeconds": min(times),
+        "calls": calls,
+        "repeats": len(times),
+    }
+    if measure_memory:
+        tracemalloc.start()
+        func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peakBytes"] = peak_bytes
+    return result
+
+
+def build_bulk(vertices, edges):
+    model = Model()
+    err = model.bulk_load(vertices, edges)
+    assert err is None, "Assert bulk load succeeded: " + str(err)
+    return model
+
+
+def input_port_id(layer_type):
+    return "first_input_shape_port" if layer_type == "Add" else "input_shape_port"
+
+
+def bench_graph(generator, size, args, rnd, spill_dir):
+    vertices, edges = generator(size)
+    results = {}
+
+    results["build.bulkLoad"] = measure(lambda: build_bulk(vertices, edges), args.repeats, measure_memory=args.memory)
+    if size <= args.max_request_build_size:
+        reqs = element_requests(vertices, edges)
+        results["build.requestModelChanges"] = measure(
+            lambda: Model().request_model_changes(reqs),
+            args.repeats,
+            measure_memory=args.memory,
+        )
+
+    model = build_bulk(vertices, edges)
+    loose_ids = ["loose" + str(idx) for idx in range(LOOSE_LAYER_COUNT)]
+    model.request_model_changes([
+        {"type": "createLayer", "layerType": "Dense", "newLayerId": layer_id, "x": -500, "y": idx * 100}
+        for idx, layer_id in enumerate(loose_ids)
+    ])
+    layer_types = {layer_id: vertices[layer_id]["layerType"] for layer_id in vertices}
+    layer_types.update((layer_id, "Dense") for layer_id in loose_ids)
+    layer_ids = list(layer_types.keys())
+    target_ids = [layer_id for layer_id in layer_ids if layer_types[layer_id] != "Input"]
+
+    # alternates the Input's shape, which propagates down the graph
+    input_shapes = itertools.cycle(INPUT_SHAPES[1:] + INPUT_SHAPES[:1])
+    results["change.inputShape"] = measure(
+        lambda: model.request_model_changes([
+            {"type": "setLayerFields", "layerId": INPUT_ID, "fieldValues": {"output_shape": next(input_shapes)}},
+        ]),
+        args.repeats,
+        measure_memory=args.memory,
+    )
+
+    def propagate_everything():
+        # checks every edge again, the most propagation a batch of changes can cause
+        model._dirty_vertex_ids.update(model._graph.vertex_ids())
+        model._propagate_model()
+    results["propagate.allVertices"] = measure(propagate_everything, args.repeats, measure_memory=args.memory)
+
+    validate_reqs = []
+    for _ in range(SAMPLED_CALL_COUNT):
+        target_id = rnd.choice(target_ids)
+        validate_reqs.append({
+            "type": "validateEdge",
+            "edgeId": "candidate",
+            "sourceVertexId": rnd.choice(layer_ids),
+            "sourcePortId": "output_shape_port",
+            "targetVertexId": target_id,
+            "targetPortId": input_port_id(layer_types[target_id]),
+        })
+    results["info.validateEdge"] = measure(
+        lambda: [model.make_info_request(req) for req in validate_reqs],
+        args.repeats,
+        calls=len(validate_reqs),
+        measure_memory=False,
+    )
+
+    layer_info_reqs = [{"type": "getLayerInfo", "layerId": rnd.choice(layer_ids)} for _ in range(SAMPLED_CALL_COUNT)]
+    results["info.getLayerInfo"] = measure(
+        lambda: [model.make_info_request(req) for req in layer_info_reqs],
+        args.repeats,
+        calls=len(layer_info_reqs),
+        measure_memory=False,
+    )
+
+    results["serialize.jsonSerializableGraph"] = measure(
+        model.json_serializable_graph,
+        args.repeats,
+        measure_memory=args.memory,
+    )
+    results["serialize.jsonSerializableGraph"]["bytes"] = len(json.dumps(model.json_serializable_graph()))
+
+    results["file.save"] = measure(
+        lambda: spill_model(spill_dir, DOCUMENT_ID, model.save_snapshot()),
+        args.repeats,
+        measure_memory=args.memory,
+    )
+    results["file.save"]["bytes"] = sum(os.path.getsize(os.path.join(spill_dir, name)) for name in os.listdir(spill_dir))
+
+    def load():
+        metadata, records = load_spilled_model(spill_dir, DOCUMENT_ID)
+        Model().load_snapshot(metadata, records)
+    results["file.load"] = measure(load, args.repeats, measure_memory=args.memory)
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # kilobytes on linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def format_bytes(byte_count):
+    return "{:.1f}".format(byte_count / (1024 * 1024)) if byte_count is not None else "-"
+
+
+def compare(results, baseline_results, threshold):
+    # prints the change in time and peak memory of every measurement in both, and returns how
+    # many got worse by more than the threshold
+    print()
+    print("{:<16} {:<34} {:>12} {:>12} {:>7} {:>9}".format(
+        "graph", "operation", "base min (ms)", "now min (ms)", "time", "memory"))
+
+    regression_count = 0
+    for graph_key in results:
+        for operation in results[graph_key]:
+            baseline = baseline_results.get(graph_key, {}).get(operation)
+            if baseline is None:
+                continue
+            current = results[graph_key][operation]
+
+            time_ratio = current["minSeconds"] / baseline["minSeconds"] if baseline["minSeconds"] != 0 else 1
+            time_regressed = time_ratio > threshold and current["minSeconds"] - baseline["minSeconds"] > MIN_COMPARED_SECONDS
+
+            memory_ratio_str = "-"
+            memory_regressed = False
+            if "peakBytes" in current and "peakBytes" in baseline:
+                memory_ratio = current["peakBytes"] / max(baseline["peakBytes"], 1)
+                memory_ratio_str = "{:.2f}x".format(memory_ratio)
+                memory_regressed = memory_ratio > threshold and current["peakBytes"] - baseline["peakBytes"] > MIN_COMPARED_BYTES
+
+            flag = ""
+            if time_regressed or memory_regressed:
+                regression_count += 1
+                flag = "  REGRESSED"
+            print("{:<16} {:<34} {:>12.3f} {:>12.3f} {:>6.2f}x {:>9}{}".format(
+                graph_key,
+                operation,
+                baseline["minSeconds"] * 1000,
+                current["minSeconds"] * 1000,
+                time_ratio,
+                memory_ratio_str,
+                flag,
+            ))
+
+    return regression_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--graphs", nargs="+", choices=sorted(GRAPH_GENERATORS), default=sorted(GRAPH_GENERATORS))
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-request-build-size", type=int, default=MAX_REQUEST_BUILD_SIZE)
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the runs that trace allocations to find peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to save the results to as JSON")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare to")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="how many times slower or bigger counts as a regression")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    results = {}
+
+    print("{:<16} {:<34} {:>12} {:>12}".format("graph", "operation", "time (ms)", "peak (MB)"))
+    with tempfile.TemporaryDirectory() as spill_dir:
+        for graph_name in args.graphs:
+            for size in args.sizes:
+                graph_key = graph_name + "/" + str(size)
+                results[graph_key] = bench_graph(GRAPH_GENERATORS[graph_name], size, args, rnd, spill_dir)
+                for operation, result in results[graph_key].items():
+                    print("{:<16} {:<34} {:>12.3f} {:>12}".format(
+                        graph_key,
+                        operation,
+                        result["seconds"] * 1000,
+                        format_bytes(result.get("peakBytes")),
+                    ))
+
+    output = {
+        "metadata": {
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "gitCommit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "graphs": args.graphs,
+            "sizes": args.sizes,
+            "repeats": args.repeats,
+            "seed": args.seed,
+            "maxRssBytes": max_rss_bytes(),
+        },
+        "results": results,
+    }
+    if args.output is not None:
+        with open(args.output, "w") as handle:
+            json.dump(output, handle, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        regression_count = compare(results, baseline["results"], args.threshold)
+        print()
+        print(str(regression_count) + " regressions")
+        if regression_count != 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
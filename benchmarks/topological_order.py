@@ -0,0 +1,119 @@
+"""Times the cached topological order kept by Graph against the old scanning sort.
+
+Run from the repository root with:
+    python -m benchmarks.topological_order
+"""
+import argparse
+import random
+import time
+
+from python_logic.model.graph import Graph, Vertex, Port
+
+SIZES = [100, 1000, 5000, 10000, 50000]
+# the old sort is quadratic, so it is only timed on the smaller graphs
+LEGACY_SORT_MAX_SIZE = 5000
+
+
+def new_vertex():
+    return Vertex(
+        "Add",
+        {
+            "first_input": Port("top", 1/3, "input", "first_input_shape"),
+            "second_input": Port("top", 2/3, "input", "second_input_shape"),
+            "output": Port("bottom", 0.5, "output", "output_shape"),
+        },
+        0,
+        0,
+    )
+
+
+def build_graph(vertex_count, rnd, shuffle_vertices):
+    # Edges are added in a random order. With shuffle_vertices the vertices are also added
+    # in a random order, so most new edges force the incremental order to move vertices.
+    graph = Graph()
+    vertex_ids = [str(i) for i in range(vertex_count)]
+    added_ids = list(vertex_ids)
+    if shuffle_vertices:
+        rnd.shuffle(added_ids)
+    for vtx_id in added_ids:
+        graph.add_vertex(vtx_id, new_vertex())
+
+    # each vertex gets up to two inputs from earlier vertices, like a residual network
+    edges = []
+    for i in range(1, vertex_count):
+        edges.append((vertex_ids[i - 1], vertex_ids[i], "first_input"))
+        if i >= 2 and rnd.random() < 0.5:
+            edges.append((vertex_ids[rnd.randrange(0, i - 1)], vertex_ids[i], "second_input"))
+    rnd.shuffle(edges)
+
+    start = time.perf_counter()
+    for edge_idx, (source_id, target_id, target_port_id) in enumerate(edges):
+        graph.create_edge(str(edge_idx), source_id, "output", target_id, target_port_id)
+    edge_insert_time = time.perf_counter() - start
+
+    return graph, len(edges), edge_insert_time
+
+
+def legacy_topo_sort(graph):
+    # the sort Model used before the order was cached on Graph
+    top_to_bottom = []
+    remaining_vertex_ids = set(graph.vertex_ids())
+
+    while len(remaining_vertex_ids) != 0:
+        root_vertex_ids = []
+        for vertex_id in remaining_vertex_ids:
+            is_root = True
+
+            for edge_id_in in graph.edge_ids_into_vertex(vertex_id):
+                edge_source_id = graph.get_edge(edge_id_in).source_vertex_id()
+
+                if edge_source_id in remaining_vertex_ids:
+                    is_root = False
+
+            if is_root:
+                root_vertex_ids.append(vertex_id)
+
+        for root_vertex_id in root_vertex_ids:
+            top_to_bottom.append(root_vertex_id)
+            remaining_vertex_ids.remove(root_vertex_id)
+
+    return top_to_bottom
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shuffle-vertices", action="store_true",
+                        help="add vertices in a random order (worst case for edge insertion)")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+
+    print("{:>8} {:>8} {:>16} {:>16} {:>16}".format(
+        "vertices", "edges", "edge insert (us)", "read order (ms)", "old sort (ms)"))
+
+    for size in args.sizes:
+        graph, edge_count, edge_insert_time = build_graph(size, rnd, args.shuffle_vertices)
+
+        start = time.perf_counter()
+        graph.topological_order()
+        read_time = time.perf_counter() - start
+
+        legacy_time_str = "skipped"
+        if size <= LEGACY_SORT_MAX_SIZE:
+            start = time.perf_counter()
+            legacy_topo_sort(graph)
+            legacy_time_str = "{:.2f}".format((time.perf_counter() - start) * 1000)
+
+        print("{:>8} {:>8} {:>16.2f} {:>16.2f} {:>16}".format(
+            size,
+            edge_count,
+            edge_insert_time / edge_count * 1e6,
+            read_time * 1000,
+            legacy_time_str,
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compares serializing the whole graph to viewport, paged and spatial queries.
+
+Run from the repository root with:
+    python -m benchmarks.viewport_queries
+"""
+import argparse
+import json
+import time
+
+from python_logic.model import Model
+
+# roughly the size of a screen on the canvas
+VIEWPORT_WIDTH = 1600
+VIEWPORT_HEIGHT = 900
+SPACING = 150
+
+
+def build_grid_model(vertex_count):
+    # a grid of layers, each connected to the one to its right
+    columns = int(vertex_count ** 0.5)
+    vertices = {}
+    edges = {}
+    for i in range(vertex_count):
+        vertices[str(i)] = {
+            "layerType": "Activation",
+            "x": (i % columns) * SPACING,
+            "y": (i // columns) * SPACING,
+        }
+        if i % columns != 0:
+            edges["e" + str(i)] = {
+                "sourceVertexId": str(i - 1),
+                "sourcePortId": "output_shape_port",
+                "targetVertexId": str(i),
+                "targetPortId": "input_shape_port",
+            }
+
+    model = Model()
+    err = model.bulk_load(vertices, edges)
+    assert err is None, "Assert bulk load succeeded: " + str(err)
+    return model
+
+
+def time_request(model, req, repeats):
+    # time to answer the request and encode the response, like the server does
+    start = time.perf_counter()
+    for _ in range(repeats):
+        response_size = len(json.dumps(model.make_info_request(req)))
+    return (time.perf_counter() - start) / repeats, response_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vertices", type=int, default=50000)
+    parser.add_argument("--page-size", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    model = build_grid_model(args.vertices)
+
+    requests = [
+        ("full getGraphData", {"type": "getGraphData"}),
+        ("first page", {"type": "getGraphData", "pageSize": args.page_size}),
+        ("viewport", {
+            "type": "getViewportGraphData",
+            "minX": 3000,
+            "minY": 3000,
+            "maxX": 3000 + VIEWPORT_WIDTH,
+            "maxY": 3000 + VIEWPORT_HEIGHT,
+        }),
+        ("box select", {
+            "type": "verticesInRectangle",
+            "minX": 3000,
+            "minY": 3000,
+            "maxX": 3000 + VIEWPORT_WIDTH,
+            "maxY": 3000 + VIEWPORT_HEIGHT,
+        }),
+        ("radius", {"type": "verticesInRadius", "x": 5000, "y": 5000, "radius": 600}),
+        ("10 nearest", {"type": "nearestVertices", "x": 5000, "y": 5000, "count": 10}),
+    ]
+
+    print("{} vertices".format(args.vertices))
+    print("{:>20} {:>10} {:>14}".format("request", "time (ms)", "response (KB)"))
+    for name, req in requests:
+        seconds, response_size = time_request(model, req, args.repeats)
+        print("{:>20} {:>10.2f} {:>14.1f}".format(name, seconds * 1000, response_size / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Times recovering a document from its write-ahead log after a crash.
+
+Run from the repository root with:
+    python -m benchmarks.write_ahead_log
+"""
+import argparse
+import random
+import tempfile
+
+from python_logic.model import Model
+from python_logic.model_pool import ModelPool
+from python_logic.model.write_ahead_log import WriteAheadLog, read_write_ahead_log
+from python_logic.model.file_utils import save_writer
+from .common import time_call
+
+LAYER_TYPES = ["Dense", "Activation", "Batch Normalization"]
+DOCUMENT_ID = "benchmark"
+# the layers are connected in chains of this many
+CHAIN_LENGTH = 20
+
+
+def generate_operations(operation_count, seed):
+    # 30% layer creations, 30% edges chaining the layers, 30% moves and 10% field changes,
+    # interleaved the way an editing session would
+    rnd = random.Random(seed)
+    layer_count = 0
+    edge_count = 0
+    # the next layer to connect to the one after it
+    next_source_idx = 0
+    operations = []
+
+    while len(operations) < operation_count:
+        roll = rnd.random()
+        if roll < 0.3 or layer_count < 2:
+            operations.append({
+                "type": "createLayer",
+                "layerType": LAYER_TYPES[layer_count % len(LAYER_TYPES)],
+                "newLayerId": str(layer_count),
+                "x": rnd.randint(0, 5000),
+                "y": rnd.randint(0, 5000),
+            })
+            layer_count += 1
+        elif roll < 0.6 and next_source_idx < layer_count - 1:
+            operations.append({
+                "type": "createEdge",
+                "newEdgeId": "e" + str(edge_count),
+                "sourceVertexId": str(next_source_idx),
+                "sourcePortId": "output_shape_port",
+                "targetVertexId": str(next_source_idx + 1),
+                "targetPortId": "input_shape_port",
+            })
+            edge_count += 1
+            next_source_idx += 1
+            if (next_source_idx + 1) % CHAIN_LENGTH == 0:
+                next_source_idx += 1
+        elif roll < 0.9:
+            operations.append({
+                "type": "moveVertex",
+                "vertexId": str(rnd.randrange(layer_count)),
+                "x": rnd.randint(0, 5000),
+                "y": rnd.randint(0, 5000),
+            })
+        else:
+            dense_idx = rnd.randrange(0, layer_count, len(LAYER_TYPES))
+            operations.append({
+                "type": "setLayerFields",
+                "layerId": str(dense_idx),
+                "fieldValues": {"units": str(rnd.randint(1, 512))},
+            })
+
+    return operations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    operations = generate_operations(args.operations, args.seed)
+    batches = [operations[i:i + args.batch_size] for i in range(0, len(operations), args.batch_size)]
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        # compaction is turned off so the whole session has to be replayed
+        model = Model()
+        write_ahead_log = WriteAheadLog(log_dir, DOCUMENT_ID, 1, compact_entry_count=len(batches) + 1)
+        model.set_write_ahead_log(write_ahead_log)
+
+        def apply_all():
+            for batch in batches:
+                model.request_model_changes(batch)
+
+        apply_time, _ = time_call(apply_all)
+        write_ahead_log.close()
+
+        read_time, entry_count = time_call(
+            lambda: sum(1 for _ in read_write_ahead_log(log_dir, DOCUMENT_ID, 0))
+        )
+        replay_time, _ = time_call(
+            lambda: Model().replay_log_entries(read_write_ahead_log(log_dir, DOCUMENT_ID, 0))
+        )
+        # what the server does on startup: replay, then write a checkpoint so the log can go
+        recover_time, recovered = time_call(lambda: ModelPool(log_dir, 10 ** 12, 10, 3600).get_model(DOCUMENT_ID))
+        save_writer.wait_until_idle()
+
+        assert recovered.json_serializable_graph() == model.json_serializable_graph(), "Assert recovered graph matches"
+
+    print("{} operations in {} log entries".format(len(operations), entry_count))
+    print("{:>34} {:>10}".format("step", "time (s)"))
+    for name, seconds in [
+        ("apply with logging", apply_time),
+        ("read log", read_time),
+        ("read and replay log", replay_time),
+        ("recover (replay + checkpoint)", recover_time),
+    ]:
+        print("{:>34} {:>10.2f}".format(name, seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 
 const SERVER_SOCKET_PATH = `/socket_path`;
+const DOCUMENT_ID_STORAGE_KEY = "documentId";
+// big graphs are fetched in pages of this many vertices and edges
+const GRAPH_PAGE_SIZE = 2000;
 
 export async function getModelStandIn(): Promise<ModelStandIn> {
   const model = new ModelStandIn();
@@ -11,20 +14,43 @@ declare const io: any;
 /** Class that implements the IModelInterface and acts as a wrapper for the server's model */
 class ModelStandIn implements IModelInterface {
   private socketio: any;
+  private documentId: string;
   private graphDataChangedListeners: Array<(newGraph: IGraphData) => void> = [];
 
   private pendingRequestListeners: {[requestId: string]: (val: any) => void} = {};
 
+  // The latest graph received from the server, which deltas are applied to
+  private graphData: IGraphData | null = null;
+  private graphVersion = -1;
+
   /**
    * Constructs a model stand-in.
    */
   constructor() {
+    this.documentId = this.getDocumentId();
     this.socketio = io(SERVER_SOCKET_PATH);
 
-    this.socketio.on("graph_changed", (message: {newGraph: IGraphData}) => {
-      console.log(message);
-      for (const listener of this.graphDataChangedListeners) {
-        listener(message.newGraph);
+    // Graph changes are only sent to a document's subscribers. A reconnected socket has
+    // lost its subscriptions, so this subscribes again on every connect.
+    this.socketio.on("connect", () => {
+      const subscription: DocumentSubscriptionMessage = {documentId: this.documentId};
+      this.socketio.emit("subscribe", subscription);
+    });
+
+    this.socketio.on("graph_changed", (message: GraphChangedMessage) => {
+      if (message.documentId !== this.documentId) {
+        return;
+      }
+      this.onGraphChanged(message).catch((err) => console.error(err));
+    });
+
+    // saves are written in the background, and this is sent once the file is written
+    this.socketio.on("file_saved", (message: FileSavedMessage) => {
+      if (message.documentId !== this.documentId) {
+        return;
+      }
+      if (message.error !== null) {
+        console.error(`Could not save ${message.fileName}: ${message.error}`);
       }
     });
 
@@ -95,6 +121,95 @@ class ModelStandIn implements IModelInterface {
     this.graphDataChangedListeners.push(listener);
   }
 
+  /**
+   * Applies a graph change from the server, then calls the data changed listeners.
+   * If the message is a delta against a version other than the one this has,
+   * the full graph is requested instead.
+   * @param message - The graph changed message
+   */
+  private async onGraphChanged(message: GraphChangedMessage): Promise<void> {
+    if (message.version <= this.graphVersion) {
+      return;
+    }
+
+    if ("newGraph" in message) {
+      this.graphData = message.newGraph;
+      this.graphVersion = message.version;
+    } else if (this.graphData !== null && message.baseVersion === this.graphVersion) {
+      this.graphData = this.applyDelta(this.graphData, message.delta);
+      this.graphVersion = message.version;
+    } else {
+      const fetched = await this.fetchGraphData();
+      if (fetched.version <= this.graphVersion) {
+        return;
+      }
+      this.graphData = fetched.data;
+      this.graphVersion = fetched.version;
+    }
+
+    for (const listener of this.graphDataChangedListeners) {
+      listener(this.graphData);
+    }
+  }
+
+  /**
+   * Fetches the whole graph from the server a page at a time, starting over if it changes
+   * partway through.
+   * @returns The graph data and its version
+   */
+  private async fetchGraphData(): Promise<{data: IGraphData, version: number}> {
+    while (true) {
+      const data: IGraphData = {vertices: {}, edges: {}};
+      let cursor: string | undefined;
+
+      while (true) {
+        const response = await this.requestModelInfo<"getGraphDataPage">({
+          type: "getGraphData",
+          pageSize: GRAPH_PAGE_SIZE,
+          cursor: cursor,
+        });
+        if ("requestError" in response) {
+          throw new Error("Could not fetch the graph: " + response.requestError);
+        }
+        if (response.cursorExpired) {
+          break;
+        }
+
+        Object.assign(data.vertices, response.data.vertices);
+        Object.assign(data.edges, response.data.edges);
+
+        if (response.nextCursor === null) {
+          return {data: data, version: response.version};
+        }
+        cursor = response.nextCursor;
+      }
+    }
+  }
+
+  /**
+   * Creates new graph data with a delta applied. The given graph data is left unchanged,
+   * since views compare the new data against the data they were last given.
+   * @param graphData - The graph data to apply the delta to
+   * @param delta - The changes to apply
+   * @returns The changed graph data
+   */
+  private applyDelta(graphData: IGraphData, delta: IGraphDelta): IGraphData {
+    const vertices = {...graphData.vertices, ...delta.vertices.added, ...delta.vertices.modified};
+    const edges = {...graphData.edges, ...delta.edges.added, ...delta.edges.modified};
+
+    for (const vertexId of delta.vertices.removed) {
+      delete vertices[vertexId];
+    }
+    for (const edgeId of delta.edges.removed) {
+      delete edges[edgeId];
+    }
+
+    return {
+      vertices: vertices,
+      edges: edges,
+    };
+  }
+
   /**
    * Internal method to make a request to the server.
    * @param req - The request to send to the server
@@ -106,6 +221,7 @@ class ModelStandIn implements IModelInterface {
     const id = this.getUniqueRequestId();
     const message: MessageToServer = {
       requestId: id,
+      documentId: this.documentId,
       request: req,
     };
 
@@ -122,6 +238,20 @@ class ModelStandIn implements IModelInterface {
     return promise;
   }
 
+  /**
+   * Gets the id of the server document this tab edits. Each tab gets its own document,
+   * which is kept when the page is reloaded.
+   * @returns The document id
+   */
+  private getDocumentId(): string {
+    let documentId = sessionStorage.getItem(DOCUMENT_ID_STORAGE_KEY);
+    if (documentId === null) {
+      documentId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+      sessionStorage.setItem(DOCUMENT_ID_STORAGE_KEY, documentId);
+    }
+    return documentId;
+  }
+
   /**
    * Creates a unique id for a request to send to the server.
    */
@@ -33,6 +33,21 @@ interface IGraphData {
   };
 }
 
+interface IGraphItemChanges<T> {
+  added: {
+    [key: string]: T;
+  };
+  modified: {
+    [key: string]: T;
+  };
+  removed: string[];
+}
+
+interface IGraphDelta {
+  vertices: IGraphItemChanges<IVertexData>;
+  edges: IGraphItemChanges<IEdgeData>;
+}
+
 interface ILayerData {
   ports: {
     [key: string]: {
@@ -101,6 +116,27 @@ type ModelChangeRequest = {
   newLayerId: string;
   x: number;
   y: number;
+} | {
+  /** Adds many layers and edges at once, or none of them if any are invalid */
+  type: "bulkLoad";
+  vertices: {
+    [layerId: string]: {
+      layerType: string;
+      x: number;
+      y: number;
+      fieldValues?: {
+        [key: string]: string;
+      };
+    };
+  };
+  edges: {
+    [edgeId: string]: {
+      sourceVertexId: string;
+      sourcePortId: string;
+      targetVertexId: string;
+      targetPortId: string;
+    };
+  };
 };
 
 type ModelVersioningRequest = {
@@ -278,6 +314,82 @@ interface IModelInfoReqs extends ReqMapType<keyof IModelInfoReqs> {
     };
     "response": {
       data: IGraphData;
+      version: number;
+    };
+  };
+  "getGraphDataPage": {
+    "request": {
+      type: "getGraphData";
+      pageSize: number;
+      /** The nextCursor of the previous page, or undefined for the first page */
+      cursor?: string;
+    };
+    "response": {
+      /** True if the graph changed since the first page, and paging has to start over */
+      cursorExpired: true;
+      version: number;
+    } | {
+      cursorExpired: false;
+      data: IGraphData;
+      version: number;
+      /** null on the last page */
+      nextCursor: string | null;
+    } | {
+      /** The cursor wasn't one the server sent */
+      requestError: "cursor_malformed";
+    };
+  };
+  "verticesInRectangle": {
+    "request": {
+      type: "verticesInRectangle";
+      minX: number;
+      minY: number;
+      maxX: number;
+      maxY: number;
+    };
+    "response": {
+      vertexIds: string[];
+    };
+  };
+  "verticesInRadius": {
+    "request": {
+      type: "verticesInRadius";
+      x: number;
+      y: number;
+      radius: number;
+    };
+    "response": {
+      /** Nearest first */
+      vertices: Array<{vertexId: string, distance: number}>;
+    };
+  };
+  "nearestVertices": {
+    "request": {
+      type: "nearestVertices";
+      x: number;
+      y: number;
+      count: number;
+    };
+    "response": {
+      /** Nearest first, up to count of them */
+      vertices: Array<{vertexId: string, distance: number}>;
+    };
+  };
+  "getViewportGraphData": {
+    "request": {
+      type: "getViewportGraphData";
+      minX: number;
+      minY: number;
+      maxX: number;
+      maxY: number;
+    };
+    "response": {
+      /**
+       * The vertices positioned in the rectangle, the edges connected to them,
+       * and the vertices at the other ends of those edges
+       */
+      data: IGraphData;
+      version: number;
     };
   };
   "getListOfLayers": {
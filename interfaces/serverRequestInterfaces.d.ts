@@ -12,8 +12,13 @@ interface IServerReqTypes extends IEnforceRequestType<keyof IServerReqTypes> {
     request: {
       type: "request_model_changes";
       reqs: ModelChangeRequest[];
+      /** If any request fails, none of them are applied */
+      atomic?: boolean;
+    };
+    response: {
+      /** The error for each request, or null if it was applied */
+      results: Array<string | null>;
     };
-    response: {};
   };
   request_versioning_change: {
     request: {
@@ -33,8 +38,31 @@ interface IServerReqTypes extends IEnforceRequestType<keyof IServerReqTypes> {
   }
 }
 
+type GraphChangedMessage = {
+  documentId: string;
+  version: number;
+  newGraph: IGraphData;
+} | {
+  documentId: string;
+  version: number;
+  baseVersion: number;
+  delta: IGraphDelta;
+};
+
+/** Sent as "subscribe" or "unsubscribe" to start or stop getting a document's graph changes */
+interface DocumentSubscriptionMessage {
+  documentId: string;
+}
+
+interface FileSavedMessage {
+  documentId: string;
+  fileName: string;
+  error: string | null;
+}
+
 type MessageToServer = {
   requestId: string;
+  documentId: string;
   request: IServerReqTypes[keyof IServerReqTypes]["request"];
 };
 
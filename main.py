@@ -1,20 +1,102 @@
 import sys
 import os
-from flask import Flask, send_from_directory, request
-from flask_socketio import SocketIO, send, Namespace
-from python_logic.model import Model
-# from graph_server_interface import GraphServerInterface
+
+# eventlet has to patch threading before anything else is imported, so the locks and
+# conditions made when the python_logic modules are imported are green ones that don't block
+# the event loop. tpool reads its thread count when it's imported.
+os.environ.setdefault("EVENTLET_THREADPOOL_SIZE", str(os.cpu_count() or 1))
 import eventlet
+from eventlet import tpool
 eventlet.monkey_patch()
 
+import time
+from flask import Flask, send_from_directory, request, jsonify, json as flask_json
+from flask_socketio import SocketIO, send, Namespace, join_room, leave_room
+from python_logic.model_pool import ModelPool
+from python_logic.move_coalescer import MoveCoalescer
+from python_logic.document_router import ConsistentHashRouter
+from python_logic.message_queue import message_queue_from_url
+from python_logic.request_profiler import RequestProfiler
+from python_logic.model.metrics import metrics
+from python_logic.model.file_utils import save_writer, convert_legacy_saves
+from python_logic.model.write_ahead_log import write_ahead_log_committer
+from python_logic.model.layers import set_shape_inference_executor, shape_inference_cache
+# from graph_server_interface import GraphServerInterface
+
+# The save writer's and log committer's threads are green threads, so the encoding, disk
+# writes and fsyncs are done in a real thread to keep them from stalling the event loop.
+# Keras shape computations are done in a real thread for the same reason, and while a request
+# waits on one, requests for other documents are handled.
+save_writer.set_executor(tpool.execute)
+write_ahead_log_committer.set_executor(tpool.execute)
+set_shape_inference_executor(tpool.execute)
+
 script_dir = os.path.dirname(os.path.realpath(__file__))
 APP_DIRECTORY = os.path.abspath(os.path.join(script_dir, './client/build'))
 
+# To use more than one worker, a server is started for each worker id, all with the same
+# worker ids and message queue url. Each document is owned by one worker, picked by consistent
+# hashing, and requests that reach another worker are forwarded to the owner through the
+# message queue. Socket.IO uses the same queue, so the owner's emits reach clients connected
+# to any worker.
+WORKER_ID = os.environ.get("TS_CANVAS_WORKER_ID", "0")
+WORKER_IDS = os.environ.get("TS_CANVAS_WORKER_IDS", WORKER_ID).split(",")
+MESSAGE_QUEUE_URL = os.environ.get("TS_CANVAS_MESSAGE_QUEUE_URL")
+PORT = int(os.environ.get("TS_CANVAS_PORT", 8080))
+assert WORKER_ID in WORKER_IDS, "Assert TS_CANVAS_WORKER_IDS includes TS_CANVAS_WORKER_ID"
+assert len(WORKER_IDS) == 1 or MESSAGE_QUEUE_URL is not None, "Assert a message queue url is set when there's more than one worker"
+
+# the fraction of requests profiled, see /metrics/profiles
+PROFILE_SAMPLE_RATE = float(os.environ.get("TS_CANVAS_PROFILE_SAMPLE_RATE", 0))
+
+class MeasuredJson:
+    """Flask's json module, recording how long encoding Socket.IO packets takes and their size"""
+    @staticmethod
+    def dumps(*args, **kwargs):
+        start_time = time.perf_counter()
+        encoded = flask_json.dumps(*args, **kwargs)
+        metrics.observe_latency("socketio.encode", time.perf_counter() - start_time)
+        # non-ascii characters are escaped, so this is the size in bytes
+        metrics.observe_size("socketio.encodedBytes", len(encoded))
+        return encoded
+
+    @staticmethod
+    def loads(*args, **kwargs):
+        return flask_json.loads(*args, **kwargs)
+
 app = Flask(__name__)
-socketio = SocketIO(app)
+socketio = SocketIO(app, message_queue=MESSAGE_QUEUE_URL, json=MeasuredJson)
+request_profiler = RequestProfiler(PROFILE_SAMPLE_RATE)
 
 SOCKET_NAMESPACE_STR = '/socket_path'
 
+# requests that don't say which document they're for all go to the same one
+DEFAULT_DOCUMENT_ID = "default"
+
+def document_room(document_id):
+    # the Socket.IO room of the clients subscribed to a document's graph changes
+    return "document:" + document_id
+
+def request_name(req):
+    # the request's type, and the type of the request it wraps if it has one,
+    # like "request_model_info.getLayerInfo"
+    if "req" in req:
+        return req["type"] + "." + req["req"]["type"]
+    return req["type"]
+
+def worker_channel(worker_id):
+    # the message queue channel of the requests forwarded to a worker
+    return "worker:" + worker_id
+
+SPILL_DIR = os.environ.get("TS_CANVAS_SPILL_DIR", os.path.join(script_dir, "spilled_models"))
+MODEL_MEMORY_BUDGET_BYTES = int(os.environ.get("TS_CANVAS_MODEL_MEMORY_BUDGET_BYTES", 1024 * 1024 * 1024))
+MAX_RESIDENT_MODELS = int(os.environ.get("TS_CANVAS_MAX_RESIDENT_MODELS", 500))
+MODEL_IDLE_SECONDS = float(os.environ.get("TS_CANVAS_MODEL_IDLE_SECONDS", 15 * 60))
+IDLE_CHECK_INTERVAL_SECONDS = 30
+# Batches of moveVertex requests arriving within this long of each other are applied together,
+# with only the latest position of each vertex. 0 applies every batch as it arrives.
+MOVE_COALESCE_SECONDS = float(os.environ.get("TS_CANVAS_MOVE_COALESCE_SECONDS", 1 / 60))
+
 # turn off Flask logging
 import logging
 log = logging.getLogger("werkzeug")
@@ -24,6 +106,14 @@ log.setLevel(logging.ERROR)
 def indexDefaultPath():
     return send_from_directory(APP_DIRECTORY, "index.html")
 
+@app.route("/metrics")
+def send_metrics():
+    return jsonify(socket_namespace.metrics())
+
+@app.route("/metrics/profiles")
+def send_profiles():
+    return jsonify(request_profiler.recent_profiles())
+
 @app.route("/<path:path>")
 def send_file(path):
     return send_from_directory(APP_DIRECTORY, path)
@@ -32,43 +122,159 @@ class MyCustomNamespace(Namespace):
     def __init__(self, *args):
         super().__init__(*args)
 
-        self._model = Model()
+        self._model_pool = ModelPool(
+            SPILL_DIR,
+            MODEL_MEMORY_BUDGET_BYTES,
+            MAX_RESIDENT_MODELS,
+            MODEL_IDLE_SECONDS,
+        )
+        self._move_coalescer = MoveCoalescer()
+
+        self._document_router = ConsistentHashRouter(WORKER_IDS)
+        self._message_queue = message_queue_from_url(MESSAGE_QUEUE_URL)
+        self._message_queue.subscribe(worker_channel(WORKER_ID), self._on_forwarded_request)
+
+    def metrics(self):
+        return {
+            "workerId": WORKER_ID,
+            "requests": metrics.to_json_serializable(),
+            "modelPool": self._model_pool.metrics(),
+            "saveWriter": save_writer.stats(),
+            "writeAheadLog": write_ahead_log_committer.stats(),
+            "shapeInferenceCache": {
+                "hitCount": shape_inference_cache.hit_count(),
+                "missCount": shape_inference_cache.miss_count(),
+                "size": shape_inference_cache.size(),
+            },
+        }
+
+    def spill_idle_models_forever(self):
+        while True:
+            socketio.sleep(IDLE_CHECK_INTERVAL_SECONDS)
+            self._model_pool.spill_idle_models()
+
+    def on_subscribe(self, data):
+        join_room(document_room(data.get("documentId", DEFAULT_DOCUMENT_ID)))
+
+    def on_unsubscribe(self, data):
+        leave_room(document_room(data.get("documentId", DEFAULT_DOCUMENT_ID)))
 
     def on_model_request(self, data):
         # print(data)
+        # responses only go to the client that made the request
+        sid = request.sid
+        document_id = data.get("documentId", DEFAULT_DOCUMENT_ID)
+
+        owner_id = self._document_router.owner_of(document_id)
+        if owner_id != WORKER_ID:
+            self._message_queue.publish(worker_channel(owner_id), {"sid": sid, "data": data})
+            return
+
+        self._handle_model_request(sid, data)
+
+    def _on_forwarded_request(self, message):
+        # called by the message queue, and handled like the other requests, in its own task
+        socketio.start_background_task(self._handle_model_request, message["sid"], message["data"])
+
+    def _handle_model_request(self, sid, data):
+        name = request_name(data["request"])
+        start_time = time.perf_counter()
+        with request_profiler.profiled(name):
+            self._apply_model_request(sid, data)
+        metrics.observe_latency("request." + name, time.perf_counter() - start_time)
+
+    def _apply_model_request(self, sid, data):
         request_id = data["requestId"]
+        document_id = data.get("documentId", DEFAULT_DOCUMENT_ID)
         req = data["request"]
         req_type = req["type"]
 
-        response = None
-        changed = False
+        # Requests for the same document are handled one at a time, and their responses and
+        # graph changes are sent in the order they're handled
+        with self._model_pool.using_model(document_id) as model:
+            # Moves are queued while holding the lock too, so they can't get ahead of a request
+            # that was waiting for it
+            if (
+                MOVE_COALESCE_SECONDS > 0 and
+                req_type == "request_model_changes" and
+                not req.get("atomic", False) and
+                MoveCoalescer.can_coalesce(req.get("reqs"))):
+                def on_applied(results):
+                    self._emit_response(sid, request_id, {"results": results})
+
+                if self._move_coalescer.add(document_id, req["reqs"], on_applied):
+                    socketio.start_background_task(self._flush_moves_after_window, document_id)
+                return
+
+            # moves that arrived before this request are applied first
+            self._flush_moves(document_id, model)
+
+            response = None
+            changed = False
 
-        if req_type == "request_model_changes":
-            self._model.request_model_changes(req["reqs"])
-            changed = True
-            response = {}
-        elif req_type == "request_model_info":
-            response = self._model.make_info_request(req["req"])
-        elif req_type == "request_versioning_change":
-            response = self._model.make_versioning_request(req["req"])
-            changed = True
-            response = {}
+            if req_type == "request_model_changes":
+                results = model.request_model_changes(req["reqs"], req.get("atomic", False))
+                changed = True
+                response = {"results": results}
+            elif req_type == "request_model_info":
+                response = model.make_info_request(req["req"])
+            elif req_type == "request_versioning_change":
+                def on_save_complete(error, file_name=req["req"].get("fileName")):
+                    socketio.emit("file_saved", {
+                        "documentId": document_id,
+                        "fileName": file_name,
+                        "error": error,
+                    }, namespace=SOCKET_NAMESPACE_STR, room=sid)
 
+                response = model.make_versioning_request(req["req"], on_save_complete)
+                changed = True
+                response = {}
+
+            self._emit_response(sid, request_id, response)
+
+            if changed:
+                self._emit_graph_changes(document_id, model)
+    
+    def _flush_moves_after_window(self, document_id):
+        socketio.sleep(MOVE_COALESCE_SECONDS)
+        with self._model_pool.using_model(document_id) as model:
+            self._flush_moves(document_id, model)
+    
+    def _flush_moves(self, document_id, model):
+        # the moves are applied as one batch, which sends one graph change for all of them
+        if self._move_coalescer.flush(document_id, model.request_model_changes):
+            self._emit_graph_changes(document_id, model)
+    
+    def _emit_response(self, sid, request_id, response):
         socketio.emit("model_req_response", {
             "request_id": request_id,
             "response": response
-        }, namespace=SOCKET_NAMESPACE_STR)
-
-        if changed:
+        }, namespace=SOCKET_NAMESPACE_STR, room=sid)
+    
+    def _emit_graph_changes(self, document_id, model):
+        # Sent to the document's subscribers. Usually a delta against the previous graph version;
+        # clients whose version doesn't match the delta's base version fall back to requesting
+        # the full graph.
+        graph_changes = model.take_graph_changes()
+        if graph_changes is not None:
+            graph_changes["documentId"] = document_id
             socketio.emit(
                 "graph_changed",
-                {
-                    "newGraph": self._model.json_serializable_graph(),
-                },
-                namespace=SOCKET_NAMESPACE_STR
+                graph_changes,
+                namespace=SOCKET_NAMESPACE_STR,
+                room=document_room(document_id),
             )
 
-socketio.on_namespace(MyCustomNamespace(SOCKET_NAMESPACE_STR))
+# saves made before the binary save format are converted the first time the server starts
+for save_name, error in convert_legacy_saves().items():
+    if error is None:
+        print("Converted legacy save " + save_name)
+    else:
+        print("Could not convert legacy save " + save_name + ", it won't be listed: " + error)
+
+socket_namespace = MyCustomNamespace(SOCKET_NAMESPACE_STR)
+socketio.on_namespace(socket_namespace)
+socketio.start_background_task(socket_namespace.spill_idle_models_forever)
 
 if __name__ == "__main__":
     host = '127.0.0.1'
@@ -78,4 +284,4 @@ if __name__ == "__main__":
     # else:
     #     host = "0.0.0.0"
 
-    socketio.run(app, host=host, port=8080)
+    socketio.run(app, host=host, port=PORT)
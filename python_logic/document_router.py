@@ -0,0 +1,42 @@
+import bisect
+import hashlib
+
+VIRTUAL_NODE_COUNT = 100
+
+def _hash(key):
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+class ConsistentHashRouter:
+    """Picks the worker that owns each document from a hash ring. Each worker is put on the
+    ring many times, so documents are spread evenly, and adding or removing a worker only
+    moves the documents it gains or loses."""
+    def __init__(self, worker_ids, virtual_node_count=VIRTUAL_NODE_COUNT):
+        assert virtual_node_count > 0, "Assert virtual node count is positive"
+
+        self._virtual_node_count = virtual_node_count
+        # sorted hashes of the virtual nodes, and the worker id of each
+        self._ring_hashes = []
+        self._ring_worker_ids = []
+        self._worker_ids = set()
+
+        for worker_id in worker_ids:
+            self.add_worker(worker_id)
+
+    def add_worker(self, worker_id):
+        assert worker_id not in self._worker_ids, "Assert worker " + worker_id + " isn't already on the ring"
+        self._worker_ids.add(worker_id)
+
+        for idx in range(self._virtual_node_count):
+            node_hash = _hash(worker_id + "#" + str(idx))
+            ring_idx = bisect.bisect_left(self._ring_hashes, node_hash)
+            self._ring_hashes.insert(ring_idx, node_hash)
+            self._ring_worker_ids.insert(ring_idx, worker_id)
+
+    def owner_of(self, document_id):
+        # the worker of the first virtual node at or after the document's hash, wrapping around
+        assert len(self._ring_hashes) != 0, "Assert there is a worker on the ring"
+
+        ring_idx = bisect.bisect_left(self._ring_hashes, _hash(document_id))
+        if ring_idx == len(self._ring_hashes):
+            ring_idx = 0
+        return self._ring_worker_ids[ring_idx]
@@ -0,0 +1,59 @@
+import json
+import threading
+import time
+
+# Message queues carry JSON serializable messages between the server's workers. Subscribers
+# are called with each message published on their channel, by any worker.
+
+CHANNEL_PREFIX = "ts_canvas:"
+RECONNECT_SECONDS = 1
+
+class LocalMessageQueue:
+    """Message queue within one process, for running a single worker and for tests"""
+    def __init__(self):
+        # channel -> list of callbacks
+        self._subscribers = {}
+
+    def subscribe(self, channel, callback):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def publish(self, channel, message):
+        # round trips through JSON like messages between processes do
+        message = json.loads(json.dumps(message))
+        for callback in self._subscribers.get(channel, []):
+            callback(message)
+
+class RedisMessageQueue:
+    """Message queue shared by the workers connected to a Redis server, using its pub/sub"""
+    def __init__(self, url):
+        # redis is only needed when running more than one worker
+        import redis
+
+        self._redis_module = redis
+        self._redis = redis.Redis.from_url(url)
+
+    def subscribe(self, channel, callback):
+        listener = threading.Thread(target=self._listen_forever, args=(channel, callback), daemon=True)
+        listener.start()
+
+    def publish(self, channel, message):
+        self._redis.publish(CHANNEL_PREFIX + channel, json.dumps(message))
+
+    def _listen_forever(self, channel, callback):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL_PREFIX + channel)
+                for item in pubsub.listen():
+                    callback(json.loads(item["data"]))
+            except self._redis_module.ConnectionError as exp:
+                print("Lost connection to the message queue, reconnecting: " + str(exp))
+                time.sleep(RECONNECT_SECONDS)
+
+def message_queue_from_url(url):
+    # an in process queue if there's no url, otherwise one for the url's backend
+    if url is None:
+        return LocalMessageQueue()
+
+    assert url.startswith("redis://") or url.startswith("rediss://"), "Assert message queue url is a redis url"
+    return RedisMessageQueue(url)
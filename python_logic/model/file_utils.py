@@ -1,40 +1,226 @@
 import os
-import sys
-import pickle
+import re
+import tempfile
+import threading
+import time
+from .save_format import write_save_file, read_save_header, read_save_file, SaveFormatException
+from .legacy_save_format import read_legacy_save
+from .save_writer import SaveWriter
 
 SAVE_FILE_DIR = "save_files"
-SAVE_EXTENSION = ".pickle"
+SAVE_EXTENSION = ".tsmodel"
+LOG_EXTENSION = ".wal"
+# saves from before the binary save format, and where they're kept once they're converted
+LEGACY_SAVE_EXTENSION = ".pickle"
+CONVERTED_LEGACY_SAVE_DIR = os.path.join(SAVE_FILE_DIR, "converted_pickles")
+# spill files are named <hex document id>.tsmodel, and log segments <hex document id>.<segment>.wal
+_SPILL_FILE_NAME_PATTERN = re.compile(r"([0-9a-f]*)" + re.escape(SAVE_EXTENSION))
+_LOG_SEGMENT_FILE_NAME_PATTERN = re.compile(r"([0-9a-f]*)\.([0-9]+)" + re.escape(LOG_EXTENSION))
+# spilled documents that couldn't be loaded are moved to this subdirectory of the spill directory
+MOVED_ASIDE_DIR = "unreadable"
+
+def _read_header(file_path):
+    try:
+        with open(file_path, "rb") as handle:
+            return read_save_header(handle)
+    except (OSError, SaveFormatException):
+        return None
 
 def list_of_saved():
     os.makedirs(SAVE_FILE_DIR, exist_ok=True)
 
-    file_names = os.listdir(SAVE_FILE_DIR)
-
-    # remove file extensions
-    save_names = ['.'.join(file_name.split('.')[:-1]) for file_name in file_names]
+    save_names = []
+    for file_name in sorted(os.listdir(SAVE_FILE_DIR)):
+        if not file_name.endswith(SAVE_EXTENSION):
+            continue
+        # only the header is read, to skip files that aren't valid saves
+        if _read_header(os.path.join(SAVE_FILE_DIR, file_name)) is None:
+            continue
+        # remove file extensions
+        save_names.append(file_name[:-len(SAVE_EXTENSION)])
 
     return save_names
 
-def save_model(save_file_name, model):
-    os.makedirs(SAVE_FILE_DIR, exist_ok=True)
-    save_file_path = os.path.join(SAVE_FILE_DIR, save_file_name)
+def _write_model_file(file_path, snapshot):
+    # The file is written next to its destination and then renamed over it, so a crash
+    # partway through leaves the previous version of the file intact.
+    metadata = dict(snapshot["metadata"])
+    metadata["savedAt"] = time.time()
 
-    with open(save_file_path + SAVE_EXTENSION, "wb") as handle:
-        pickle.dump(model, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    file_dir, file_name = os.path.split(file_path)
+    temp_fd, temp_file_path = tempfile.mkstemp(dir=file_dir, prefix=file_name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(temp_fd, "wb") as handle:
+            write_save_file(handle, metadata, snapshot["vertices"], snapshot["edges"])
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_file_path, file_path)
+    except:
+        os.remove(temp_file_path)
+        raise
 
-def load_model(load_file_name):
-    load_file_path = os.path.join(SAVE_FILE_DIR, load_file_name + SAVE_EXTENSION)
+# saves are written in the background by this, shared by every model
+save_writer = SaveWriter(_write_model_file)
+
+def _records_closing_handle(handle, records):
+    try:
+        for record in records:
+            yield record
+    finally:
+        handle.close()
 
-    if not os.path.exists(load_file_path):
+def _read_model_file(file_path):
+    # returns the metadata and a generator of records, which closes the file when it finishes
+    if not os.path.exists(file_path):
         return None
 
-    with open(load_file_path, "rb") as handle:
-        model = pickle.load(handle)
+    handle = open(file_path, "rb")
+    try:
+        metadata, records = read_save_file(handle)
+    except:
+        handle.close()
+        raise
+
+    return metadata, _records_closing_handle(handle, records)
+
+def list_legacy_saves():
+    os.makedirs(SAVE_FILE_DIR, exist_ok=True)
+    return sorted(
+        file_name[:-len(LEGACY_SAVE_EXTENSION)]
+        for file_name in os.listdir(SAVE_FILE_DIR)
+        if file_name.endswith(LEGACY_SAVE_EXTENSION)
+    )
+
+def convert_legacy_saves():
+    # Converts pickle saves to the binary format, moving the converted pickles out of the save
+    # file directory. Saves that can't be converted are left where they are. Returns
+    # {save name: error message or None}.
+    results = {}
+    for save_name in list_legacy_saves():
+        save_file_path = os.path.join(SAVE_FILE_DIR, save_name + SAVE_EXTENSION)
+        legacy_file_path = os.path.join(SAVE_FILE_DIR, save_name + LEGACY_SAVE_EXTENSION)
+        if os.path.exists(save_file_path):
+            results[save_name] = "A save with the same name already exists"
+            continue
+
+        try:
+            with open(legacy_file_path, "rb") as handle:
+                snapshot = read_legacy_save(handle)
+            _write_model_file(save_file_path, snapshot)
+        except (OSError, ValueError, SaveFormatException) as exp:
+            results[save_name] = str(exp)
+            continue
+
+        os.makedirs(CONVERTED_LEGACY_SAVE_DIR, exist_ok=True)
+        os.replace(legacy_file_path, os.path.join(CONVERTED_LEGACY_SAVE_DIR, save_name + LEGACY_SAVE_EXTENSION))
+        results[save_name] = None
+
+    return results
 
-    return model
+def save_model(save_file_name, snapshot, on_complete=None):
+    # queues the snapshot to be written, on_complete is called with None or an error message
+    os.makedirs(SAVE_FILE_DIR, exist_ok=True)
+    save_writer.save(
+        os.path.join(SAVE_FILE_DIR, save_file_name + SAVE_EXTENSION),
+        snapshot,
+        on_complete,
+    )
+
+def load_model(load_file_name):
+    load_file_path = os.path.join(SAVE_FILE_DIR, load_file_name + SAVE_EXTENSION)
+    save_writer.wait_until_written(load_file_path)
+    return _read_model_file(load_file_path)
 
 def try_delete_file(file_name):
     file_path = os.path.join(SAVE_FILE_DIR, file_name + SAVE_EXTENSION)
+    save_writer.wait_until_written(file_path)
 
     if os.path.exists(file_path):
         os.remove(file_path)
+
+def _spill_file_path(spill_dir, document_id):
+    # document ids come from clients, so they're hex encoded to make safe file names
+    return os.path.join(spill_dir, document_id.encode("utf-8").hex() + SAVE_EXTENSION)
+
+def log_segment_path(spill_dir, document_id, segment):
+    return os.path.join(spill_dir, document_id.encode("utf-8").hex() + "." + str(segment) + LOG_EXTENSION)
+
+def list_spilled_document_ids(spill_dir):
+    # documents with a spill file, or with a write-ahead log left by a server that stopped
+    os.makedirs(spill_dir, exist_ok=True)
+
+    # other files, like temp files left by a crash, are skipped
+    document_ids = set()
+    for file_name in os.listdir(spill_dir):
+        match = _SPILL_FILE_NAME_PATTERN.fullmatch(file_name) or _LOG_SEGMENT_FILE_NAME_PATTERN.fullmatch(file_name)
+        if match is None:
+            continue
+        try:
+            document_ids.add(bytes.fromhex(match.group(1)).decode("utf-8"))
+        except ValueError:
+            continue
+
+    return list(document_ids)
+
+def list_log_segments(spill_dir, document_id):
+    # the document's write-ahead log segment numbers, in increasing order
+    hex_document_id = document_id.encode("utf-8").hex()
+
+    segments = []
+    if os.path.isdir(spill_dir):
+        for file_name in os.listdir(spill_dir):
+            match = _LOG_SEGMENT_FILE_NAME_PATTERN.fullmatch(file_name)
+            if match is not None and match.group(1) == hex_document_id:
+                segments.append(int(match.group(2)))
+
+    return sorted(segments)
+
+def delete_log_segments(spill_dir, document_id, before_segment=None):
+    for segment in list_log_segments(spill_dir, document_id):
+        if before_segment is None or segment < before_segment:
+            os.remove(log_segment_path(spill_dir, document_id, segment))
+
+def spill_model(spill_dir, document_id, snapshot):
+    # Writes the snapshot with the save writer, like other writes, and waits until it's written.
+    # It replaces an earlier checkpoint still waiting to be written. Raises OSError if it
+    # couldn't be written.
+    written = threading.Event()
+    errors = []
+    def on_complete(error):
+        errors.append(error)
+        written.set()
+
+    queue_spill_model(spill_dir, document_id, snapshot, on_complete)
+    written.wait()
+    if errors[0] is not None:
+        raise OSError("Could not write spill file: " + errors[0])
+
+def queue_spill_model(spill_dir, document_id, snapshot, on_complete=None):
+    # like spill_model, but written in the background by the save writer
+    os.makedirs(spill_dir, exist_ok=True)
+    save_writer.save(_spill_file_path(spill_dir, document_id), snapshot, on_complete)
+
+def wait_until_spilled(spill_dir, document_id):
+    save_writer.wait_until_written(_spill_file_path(spill_dir, document_id))
+
+def load_spilled_model(spill_dir, document_id):
+    spill_file_path = _spill_file_path(spill_dir, document_id)
+    save_writer.wait_until_written(spill_file_path)
+    return _read_model_file(spill_file_path)
+
+def move_aside_spilled_model(spill_dir, document_id):
+    # Moves a document's spill file and log segments into a subdirectory, where they aren't
+    # picked up again but can still be recovered by hand. Returns the directory.
+    spill_file_path = _spill_file_path(spill_dir, document_id)
+    save_writer.wait_until_written(spill_file_path)
+
+    moved_dir = os.path.join(spill_dir, MOVED_ASIDE_DIR, document_id.encode("utf-8").hex() + "." + str(int(time.time())))
+    os.makedirs(moved_dir, exist_ok=True)
+
+    file_paths = [log_segment_path(spill_dir, document_id, segment) for segment in list_log_segments(spill_dir, document_id)]
+    if os.path.exists(spill_file_path):
+        file_paths.append(spill_file_path)
+    for file_path in file_paths:
+        os.replace(file_path, os.path.join(moved_dir, os.path.basename(file_path)))
+
+    return moved_dir
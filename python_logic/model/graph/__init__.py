@@ -1,4 +1,5 @@
 from .edge import Edge
 from .graph import Graph
 from .vertex import Vertex
-from .port import Port
\ No newline at end of file
+from .port import Port
+from .graph_change_log import GraphChangeLog
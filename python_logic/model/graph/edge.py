@@ -24,6 +24,9 @@ class Edge:
     def target_vertex_id(self):
         return self._tgt_vtx_id
     
+    def is_consistent(self):
+        return self._consistency
+    
     def set_consistency(self, consistency):
         assert type(consistency) == bool, "Assert consistency value is a boolean"
         self._consistency = consistency
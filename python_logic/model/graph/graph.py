@@ -1,12 +1,27 @@
 from .edge import Edge
-import random
+from .spatial_index import SpatialGridIndex
+from .id_allocator import IdAllocator
 
 class Graph():
     def __init__(self):
         self._edges = {}
         self._edges_by_source = {}
         self._edges_by_target = {}
+        # (target vertex id, target port id) -> id of the edge into that port
+        self._edges_by_target_port = {}
         self._vertices = {}
+
+        # Vertex ids in a topological order, kept up to date as vertices and edges change.
+        # Deleted vertices leave a None hole until the list is compacted.
+        self._topo_order = []
+        self._topo_index = {}
+        self._topo_hole_count = 0
+
+        # vertex ids by position
+        self._spatial_index = SpatialGridIndex()
+
+        self._vertex_id_allocator = IdAllocator()
+        self._edge_id_allocator = IdAllocator()
     
     def create_edge(
         self,
@@ -16,6 +31,9 @@ class Graph():
         target_vertex_id,
         target_port_id):
         
+        self._reorder_for_new_edge(source_vertex_id, target_vertex_id)
+
+        self._edge_id_allocator.observe(edge_id)
         self._edges[edge_id] = Edge(
             source_vertex_id,
             source_port_id,
@@ -25,6 +43,7 @@ class Graph():
         
         self._edges_by_source[source_vertex_id].add(edge_id)
         self._edges_by_target[target_vertex_id].add(edge_id)
+        self._edges_by_target_port[(target_vertex_id, target_port_id)] = edge_id
     
     def validate_edge(
         self,
@@ -44,43 +63,132 @@ class Graph():
         if not self._vertices[target_vertex_id].has_port(target_port_id):
             return "Target port with id " + target_port_id + " does not exist on the target vertex"
         
-        source_vtx = self._vertices[source_vertex_id]
-        target_vtx = self._vertices[target_vertex_id]
-        source_port = source_vtx.get_port(source_port_id)
-        target_port = target_vtx.get_port(target_port_id)
+        port_types_err = Graph._validate_port_types(
+            self._vertices[source_vertex_id],
+            source_port_id,
+            self._vertices[target_vertex_id],
+            target_port_id,
+        )
+        if port_types_err is not None:
+            return port_types_err
+
+        if (target_vertex_id, target_port_id) in self._edges_by_target_port:
+            return "Target port is already occupied"
+        
+        if self.would_create_loop(source_vertex_id, target_vertex_id):
+            return "Loop detected"
         
-        # check port types
-        if source_port.port_type() != "output":
+        return None
+    
+    @staticmethod
+    def _validate_port_types(source_vtx, source_port_id, target_vtx, target_port_id):
+        if source_vtx.get_port(source_port_id).port_type() != "output":
             return "Source port is not an output port"
         
-        if target_port.port_type() != "input":
+        if target_vtx.get_port(target_port_id).port_type() != "input":
             return "Target port is not an input port"
-
-        # check if target port already has an input
-        for input_edge_id in self._edges_by_target[target_vertex_id]:
-            input_edge = self._edges[input_edge_id]
-
-            if input_edge.target_port_id() == target_port_id:
-                return "Target port is already occupied"
         
-        # check for loops
-        source_ancestors = set()
-        source_ancestors_uninvestigated = set()
-        source_ancestors_uninvestigated.add(source_vertex_id)
-        while len(source_ancestors_uninvestigated) != 0:
-            ancestor_id = source_ancestors_uninvestigated.pop()
-            source_ancestors.add(ancestor_id)
-
-            for edge_id in self._edges_by_target[ancestor_id]:
-                edge_source_id = self._edges[edge_id].source_vertex_id()
-                if edge_source_id not in source_ancestors and edge_source_id not in source_ancestors_uninvestigated:
-                    source_ancestors_uninvestigated.add(edge_source_id)
+        return None
+    
+    def add_subgraph(self, new_vertices, new_edges):
+        # Adds {vertex id: vertex} and {edge id: (source vertex id, source port id, target
+        # vertex id, target port id)}, whose edges can also connect to vertices already in the
+        # graph. Loops are checked for with one topological sort of the whole graph, instead of
+        # a search per edge. Returns an error message, leaving the graph unchanged, or None.
+        for vtx_id in new_vertices:
+            if vtx_id in self._vertices:
+                return "A vertex with the id " + vtx_id + " already exists"
         
-        if target_vertex_id in source_ancestors:
-            return "Loop detected"
+        new_occupied_ports = set()
+        new_edges_by_source = {}
+        for edge_id in new_edges:
+            source_vertex_id, source_port_id, target_vertex_id, target_port_id = new_edges[edge_id]
+            if edge_id in self._edges:
+                return "An edge with the id " + edge_id + " already exists"
+            
+            source_vtx = new_vertices.get(source_vertex_id, self._vertices.get(source_vertex_id))
+            target_vtx = new_vertices.get(target_vertex_id, self._vertices.get(target_vertex_id))
+            if source_vtx is None:
+                return "Source vertex with id " + source_vertex_id + " of edge " + edge_id + " does not exist"
+            if not source_vtx.has_port(source_port_id):
+                return "Source port with id " + source_port_id + " of edge " + edge_id + " does not exist on the source vertex"
+            if target_vtx is None:
+                return "Target vertex with id " + target_vertex_id + " of edge " + edge_id + " does not exist"
+            if not target_vtx.has_port(target_port_id):
+                return "Target port with id " + target_port_id + " of edge " + edge_id + " does not exist on the target vertex"
+            
+            port_types_err = Graph._validate_port_types(source_vtx, source_port_id, target_vtx, target_port_id)
+            if port_types_err is not None:
+                return port_types_err + " for edge " + edge_id
+            
+            if (target_vertex_id, target_port_id) in new_occupied_ports or (target_vertex_id, target_port_id) in self._edges_by_target_port:
+                return "Target port of edge " + edge_id + " is already occupied"
+            new_occupied_ports.add((target_vertex_id, target_port_id))
+            new_edges_by_source.setdefault(source_vertex_id, []).append(target_vertex_id)
+        
+        topo_order = self._topological_sort_with(new_vertices, new_edges_by_source)
+        if topo_order is None:
+            return "The edges would create a loop"
+        
+        for vtx_id in new_vertices:
+            self._vertices[vtx_id] = new_vertices[vtx_id]
+            self._vertex_id_allocator.observe(vtx_id)
+            self._edges_by_source[vtx_id] = set()
+            self._edges_by_target[vtx_id] = set()
+            self._spatial_index.insert(vtx_id, new_vertices[vtx_id].x(), new_vertices[vtx_id].y())
+        
+        for edge_id in new_edges:
+            source_vertex_id, source_port_id, target_vertex_id, target_port_id = new_edges[edge_id]
+            self._edges[edge_id] = Edge(source_vertex_id, source_port_id, target_vertex_id, target_port_id)
+            self._edge_id_allocator.observe(edge_id)
+            self._edges_by_source[source_vertex_id].add(edge_id)
+            self._edges_by_target[target_vertex_id].add(edge_id)
+            self._edges_by_target_port[(target_vertex_id, target_port_id)] = edge_id
+        
+        self._topo_order = topo_order
+        self._topo_hole_count = 0
+        for idx, vtx_id in enumerate(topo_order):
+            self._topo_index[vtx_id] = idx
         
         return None
     
+    def _topological_sort_with(self, new_vertex_ids, new_edges_by_source):
+        # Kahn's algorithm over the graph plus the new vertices and {source id: [target ids]} of
+        # the new edges. Returns the order, or None if there's a loop.
+        in_degrees = {}
+        for vtx_id in self._vertices:
+            in_degrees[vtx_id] = len(self._edges_by_target[vtx_id])
+        for vtx_id in new_vertex_ids:
+            in_degrees[vtx_id] = 0
+        for target_ids in new_edges_by_source.values():
+            for target_id in target_ids:
+                in_degrees[target_id] += 1
+        
+        # starting from the current order keeps the existing vertices in a similar order
+        topo_order = [vtx_id for vtx_id in self._topo_order if vtx_id is not None and in_degrees[vtx_id] == 0]
+        topo_order.extend(vtx_id for vtx_id in new_vertex_ids if in_degrees[vtx_id] == 0)
+        
+        idx = 0
+        while idx < len(topo_order):
+            vtx_id = topo_order[idx]
+            idx += 1
+            
+            if vtx_id in self._edges_by_source:
+                for edge_id in self._edges_by_source[vtx_id]:
+                    target_id = self._edges[edge_id].target_vertex_id()
+                    in_degrees[target_id] -= 1
+                    if in_degrees[target_id] == 0:
+                        topo_order.append(target_id)
+            for target_id in new_edges_by_source.get(vtx_id, ()):
+                in_degrees[target_id] -= 1
+                if in_degrees[target_id] == 0:
+                    topo_order.append(target_id)
+        
+        if len(topo_order) != len(in_degrees):
+            return None
+        
+        return topo_order
+    
     def delete_vertex(self, vtx_id):
         del self._vertices[vtx_id]
         # | is the union operator for sets
@@ -89,19 +197,150 @@ class Graph():
 
         del self._edges_by_source[vtx_id]
         del self._edges_by_target[vtx_id]
+        self._spatial_index.remove(vtx_id)
+
+        # removing a vertex can't invalidate the order of the others, so just leave a hole
+        self._topo_order[self._topo_index[vtx_id]] = None
+        del self._topo_index[vtx_id]
+        self._topo_hole_count += 1
+        if self._topo_hole_count * 2 > len(self._topo_order):
+            self._compact_topo_order()
     
     def delete_edge(self, edge_id):
         edge = self._edges[edge_id]
 
         self._edges_by_source[edge.source_vertex_id()].remove(edge_id)
         self._edges_by_target[edge.target_vertex_id()].remove(edge_id)
+        del self._edges_by_target_port[(edge.target_vertex_id(), edge.target_port_id())]
         
         del self._edges[edge_id]
 
     def add_vertex(self, vtx_id, vertex):
         self._vertices[vtx_id] = vertex
+        self._vertex_id_allocator.observe(vtx_id)
         self._edges_by_source[vtx_id] = set()
         self._edges_by_target[vtx_id] = set()
+        self._spatial_index.insert(vtx_id, vertex.x(), vertex.y())
+
+        # a vertex without edges can go anywhere in the order
+        self._topo_index[vtx_id] = len(self._topo_order)
+        self._topo_order.append(vtx_id)
+    
+    def move_vertex(self, vtx_id, new_x, new_y):
+        vertex = self._vertices[vtx_id]
+        vertex.set_x(new_x)
+        vertex.set_y(new_y)
+        self._spatial_index.move(vtx_id, new_x, new_y)
+    
+    def vertex_ids_in_rectangle(self, min_x, min_y, max_x, max_y):
+        return self._spatial_index.ids_in_rectangle(min_x, min_y, max_x, max_y)
+    
+    def vertex_ids_in_radius(self, x_pos, y_pos, radius):
+        # (distance, vertex id) pairs, nearest first
+        return self._spatial_index.ids_in_radius(x_pos, y_pos, radius)
+    
+    def nearest_vertex_ids(self, x_pos, y_pos, count):
+        # (distance, vertex id) pairs, nearest first
+        return self._spatial_index.nearest_ids(x_pos, y_pos, count)
+    
+    def topological_order(self):
+        return [vtx_id for vtx_id in self._topo_order if vtx_id is not None]
+    
+    def topological_index(self, vtx_id):
+        # vertices have a lower index than every vertex downstream of them
+        return self._topo_index[vtx_id]
+    
+    def would_create_loop(self, source_vertex_id, target_vertex_id):
+        # An edge makes a loop if the source is reachable from the target. Every vertex on such a
+        # path sits between the target and the source in the topological order, so if the target
+        # is already after the source there's no loop. Otherwise the target's descendants and the
+        # source's ancestors are searched a step at a time each, only within those bounds, until
+        # the searches meet or either one runs out.
+        lower_bound = self._topo_index[target_vertex_id]
+        upper_bound = self._topo_index[source_vertex_id]
+        if lower_bound > upper_bound:
+            return False
+        if source_vertex_id == target_vertex_id:
+            return True
+
+        forward_ids = set([target_vertex_id])
+        forward_uninvestigated_ids = [target_vertex_id]
+        backward_ids = set([source_vertex_id])
+        backward_uninvestigated_ids = [source_vertex_id]
+        while len(forward_uninvestigated_ids) != 0 and len(backward_uninvestigated_ids) != 0:
+            vertex_id = forward_uninvestigated_ids.pop()
+            for edge_id in self._edges_by_source[vertex_id]:
+                edge_target_id = self._edges[edge_id].target_vertex_id()
+                if edge_target_id in backward_ids:
+                    return True
+                if edge_target_id not in forward_ids and self._topo_index[edge_target_id] < upper_bound:
+                    forward_ids.add(edge_target_id)
+                    forward_uninvestigated_ids.append(edge_target_id)
+
+            vertex_id = backward_uninvestigated_ids.pop()
+            for edge_id in self._edges_by_target[vertex_id]:
+                edge_source_id = self._edges[edge_id].source_vertex_id()
+                if edge_source_id in forward_ids:
+                    return True
+                if edge_source_id not in backward_ids and self._topo_index[edge_source_id] > lower_bound:
+                    backward_ids.add(edge_source_id)
+                    backward_uninvestigated_ids.append(edge_source_id)
+
+        return False
+    
+    def _compact_topo_order(self):
+        self._topo_order = self.topological_order()
+        self._topo_hole_count = 0
+        for idx, vtx_id in enumerate(self._topo_order):
+            self._topo_index[vtx_id] = idx
+    
+    def _reorder_for_new_edge(self, source_vertex_id, target_vertex_id):
+        # Pearce-Kelly dynamic topological sort: only the vertices between the target and the
+        # source in the current order are looked at, and only the ones connected to the new
+        # edge are moved.
+        lower_bound = self._topo_index[target_vertex_id]
+        upper_bound = self._topo_index[source_vertex_id]
+
+        if lower_bound > upper_bound:
+            return
+
+        # vertices reachable from the target that are not already after the source
+        forward_ids = set([target_vertex_id])
+        uninvestigated_ids = [target_vertex_id]
+        while len(uninvestigated_ids) != 0:
+            vertex_id = uninvestigated_ids.pop()
+            for edge_id in self._edges_by_source[vertex_id]:
+                edge_target_id = self._edges[edge_id].target_vertex_id()
+                if edge_target_id == source_vertex_id:
+                    raise ValueError("An edge from " + source_vertex_id + " to " + target_vertex_id + " would create a loop")
+                if edge_target_id not in forward_ids and self._topo_index[edge_target_id] < upper_bound:
+                    forward_ids.add(edge_target_id)
+                    uninvestigated_ids.append(edge_target_id)
+        
+        if source_vertex_id in forward_ids:
+            raise ValueError("An edge from " + source_vertex_id + " to itself would create a loop")
+
+        # vertices the source is reachable from that are not already before the target
+        backward_ids = set([source_vertex_id])
+        uninvestigated_ids = [source_vertex_id]
+        while len(uninvestigated_ids) != 0:
+            vertex_id = uninvestigated_ids.pop()
+            for edge_id in self._edges_by_target[vertex_id]:
+                edge_source_id = self._edges[edge_id].source_vertex_id()
+                if edge_source_id not in backward_ids and self._topo_index[edge_source_id] > lower_bound:
+                    backward_ids.add(edge_source_id)
+                    uninvestigated_ids.append(edge_source_id)
+        
+        # the source's ancestors take the lowest of the freed positions, then the target's descendants
+        reordered_ids = (
+            sorted(backward_ids, key=self._topo_index.__getitem__) +
+            sorted(forward_ids, key=self._topo_index.__getitem__)
+        )
+        freed_indices = sorted(self._topo_index[vertex_id] for vertex_id in reordered_ids)
+
+        for vertex_id, idx in zip(reordered_ids, freed_indices):
+            self._topo_order[idx] = vertex_id
+            self._topo_index[vertex_id] = idx
     
     def has_edge_id(self, edge_id):
         return edge_id in self._edges
@@ -118,6 +357,15 @@ class Graph():
     def vertex_ids(self):
         return list(self._vertices.keys())
     
+    def edge_ids(self):
+        return list(self._edges.keys())
+    
+    def vertex_count(self):
+        return len(self._vertices)
+    
+    def edge_count(self):
+        return len(self._edges)
+    
     def edge_ids_between_vertices(self, vertex_ids):
         edges_out_of_vertices = set()
         edges_into_vertices = set()
@@ -134,31 +382,20 @@ class Graph():
         # & operator finds intersection
         return list(edges_into_vertices & edges_out_of_vertices)
     
-    @staticmethod
-    def _new_unique_ids_dict(count, dictionary):
-        ids = []
-        
-        for _ in range(count):
-            random_float = random.uniform(0, 1)
-            factor = 1000
-
-            while True:
-                generated_id = str(int(random_float*factor))
-
-                if generated_id not in ids and generated_id not in dictionary:
-                    ids.append(generated_id)
-                    break
-                else:
-                    factor *= 10
-        
-        return ids
-
-    
     def new_unique_edge_ids(self, count):
-        return Graph._new_unique_ids_dict(count, self._edges)
+        return self._edge_id_allocator.allocate(count)
     
     def new_unique_vertex_ids(self, count):
-        return Graph._new_unique_ids_dict(count, self._vertices)
+        return self._vertex_id_allocator.allocate(count)
+    
+    def id_allocator_state(self):
+        # the next vertex and edge ids to hand out, so they can be saved with the graph
+        return self._vertex_id_allocator.next_id(), self._edge_id_allocator.next_id()
+    
+    def advance_id_allocators(self, next_vertex_id, next_edge_id):
+        # makes sure ids handed out before the graph was saved aren't handed out again
+        self._vertex_id_allocator.advance_to(next_vertex_id)
+        self._edge_id_allocator.advance_to(next_edge_id)
     
     def edge_ids_into_vertex(self, vertex_id):
         return self._edges_by_target[vertex_id]
@@ -166,6 +403,59 @@ class Graph():
     def edge_ids_out_of_vertex(self, vertex_id):
         return self._edges_by_source[vertex_id]
     
+    def is_port_occupied(self, vertex_id, port_id):
+        return (vertex_id, port_id) in self._edges_by_target_port
+    
+    def subgraph_to_json_serializable(self, vertex_ids):
+        # The given vertices, the edges with at least one end on them, and the vertices at the
+        # other ends of those edges, so that every edge can be drawn
+        vertices = {}
+        edges = {}
+        for vtx_id in vertex_ids:
+            vertices[vtx_id] = self._vertices[vtx_id].to_json_serializable()
+        
+        for vtx_id in vertex_ids:
+            # | is the union operator for sets
+            for edge_id in self._edges_by_source[vtx_id] | self._edges_by_target[vtx_id]:
+                if edge_id in edges:
+                    continue
+                edge = self._edges[edge_id]
+                edges[edge_id] = edge.to_json_serializable()
+                for end_vtx_id in [edge.source_vertex_id(), edge.target_vertex_id()]:
+                    if end_vtx_id not in vertices:
+                        vertices[end_vtx_id] = self._vertices[end_vtx_id].to_json_serializable()
+        
+        return {
+            "vertices": vertices,
+            "edges": edges,
+        }
+    
+    def page_to_json_serializable(self, vertex_ids, edge_ids, offset, page_size):
+        # Part of the graph, for sending a big graph in pieces: the given vertices, and then the
+        # given edges, from offset on, page_size of them in all. The id lists are kept between
+        # pages, so each page is a slice of them, and ids no longer in the graph are skipped.
+        # Returns the page and the offset of the next page, or None if this is the last.
+        page_vertex_ids = vertex_ids[offset:offset + page_size]
+        edge_offset = max(0, offset - len(vertex_ids))
+        page_edge_ids = edge_ids[edge_offset:edge_offset + page_size - len(page_vertex_ids)]
+        
+        vertices = {}
+        edges = {}
+        
+        for vtx_id in page_vertex_ids:
+            if vtx_id in self._vertices:
+                vertices[vtx_id] = self._vertices[vtx_id].to_json_serializable()
+        
+        for edge_id in page_edge_ids:
+            if edge_id in self._edges:
+                edges[edge_id] = self._edges[edge_id].to_json_serializable()
+        
+        next_offset = offset + page_size
+        if next_offset >= len(vertex_ids) + len(edge_ids):
+            next_offset = None
+        
+        return {"vertices": vertices, "edges": edges}, next_offset
+    
     def to_json_serializable(self):
         vertices = {}
         edges = {}
@@ -0,0 +1,78 @@
+class GraphChangeLog:
+    """Records which vertices and edges were added, modified or removed since it was last cleared"""
+    def __init__(self):
+        # id -> "added", "modified" or "removed"
+        self._vertex_changes = {}
+        self._edge_changes = {}
+    
+    def vertex_added(self, vtx_id):
+        GraphChangeLog._record_added(self._vertex_changes, vtx_id)
+    
+    def vertex_modified(self, vtx_id):
+        GraphChangeLog._record_modified(self._vertex_changes, vtx_id)
+    
+    def vertex_removed(self, vtx_id):
+        GraphChangeLog._record_removed(self._vertex_changes, vtx_id)
+    
+    def edge_added(self, edge_id):
+        GraphChangeLog._record_added(self._edge_changes, edge_id)
+    
+    def edge_modified(self, edge_id):
+        GraphChangeLog._record_modified(self._edge_changes, edge_id)
+    
+    def edge_removed(self, edge_id):
+        GraphChangeLog._record_removed(self._edge_changes, edge_id)
+    
+    def is_empty(self):
+        return len(self._vertex_changes) == 0 and len(self._edge_changes) == 0
+    
+    def clear(self):
+        self._vertex_changes = {}
+        self._edge_changes = {}
+    
+    @staticmethod
+    def _record_added(changes, item_id):
+        # an item removed and then re-added in the same batch has only been replaced
+        if changes.get(item_id) == "removed":
+            changes[item_id] = "modified"
+        else:
+            changes[item_id] = "added"
+    
+    @staticmethod
+    def _record_modified(changes, item_id):
+        if item_id not in changes:
+            changes[item_id] = "modified"
+    
+    @staticmethod
+    def _record_removed(changes, item_id):
+        # the client never saw an item that was added and removed in the same batch
+        if changes.get(item_id) == "added":
+            del changes[item_id]
+        else:
+            changes[item_id] = "removed"
+    
+    @staticmethod
+    def _changes_to_json_serializable(changes, get_item):
+        added = {}
+        modified = {}
+        removed = []
+        for item_id in changes:
+            change = changes[item_id]
+            if change == "added":
+                added[item_id] = get_item(item_id).to_json_serializable()
+            elif change == "modified":
+                modified[item_id] = get_item(item_id).to_json_serializable()
+            else:
+                removed.append(item_id)
+        
+        return {
+            "added": added,
+            "modified": modified,
+            "removed": removed,
+        }
+    
+    def to_json_serializable(self, graph):
+        return {
+            "vertices": GraphChangeLog._changes_to_json_serializable(self._vertex_changes, graph.get_vertex),
+            "edges": GraphChangeLog._changes_to_json_serializable(self._edge_changes, graph.get_edge),
+        }
@@ -0,0 +1,26 @@
+class IdAllocator:
+    """Hands out ids from a counter that only goes up, so no id is handed out twice. Ids that
+    are added some other way, like from a saved file, move the counter past them, so ids that
+    are handed out never need to be checked against the ones in use."""
+    __slots__ = ("_next_id",)
+
+    def __init__(self, next_id=0):
+        self._next_id = next_id
+
+    def allocate(self, count):
+        first_id = self._next_id
+        self._next_id += count
+        return list(map(str, range(first_id, first_id + count)))
+
+    def observe(self, item_id):
+        # called with every id added to the graph
+        if item_id.isdigit() and item_id.isascii():
+            num = int(item_id)
+            if num >= self._next_id:
+                self._next_id = num + 1
+
+    def next_id(self):
+        return self._next_id
+
+    def advance_to(self, next_id):
+        self._next_id = max(self._next_id, next_id)
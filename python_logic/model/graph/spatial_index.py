@@ -0,0 +1,152 @@
+import heapq
+import math
+
+DEFAULT_CELL_SIZE = 400
+
+class SpatialGridIndex:
+    """Buckets ids into square grid cells by position, so the ids in an area can be found
+    without looking at every position"""
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        assert cell_size > 0, "Assert cell size is positive"
+
+        self._cell_size = cell_size
+        # (column, row) -> set of ids, only for cells that aren't empty
+        self._cells = {}
+        self._positions = {}
+
+    def _cell_of(self, x_pos, y_pos):
+        return (math.floor(x_pos / self._cell_size), math.floor(y_pos / self._cell_size))
+
+    def insert(self, item_id, x_pos, y_pos):
+        assert item_id not in self._positions, "Assert id is not already in the index"
+
+        self._positions[item_id] = (x_pos, y_pos)
+        self._cells.setdefault(self._cell_of(x_pos, y_pos), set()).add(item_id)
+
+    def remove(self, item_id):
+        x_pos, y_pos = self._positions.pop(item_id)
+        cell = self._cell_of(x_pos, y_pos)
+        self._cells[cell].remove(item_id)
+        if len(self._cells[cell]) == 0:
+            del self._cells[cell]
+
+    def move(self, item_id, x_pos, y_pos):
+        old_x_pos, old_y_pos = self._positions[item_id]
+        old_cell = self._cell_of(old_x_pos, old_y_pos)
+        new_cell = self._cell_of(x_pos, y_pos)
+
+        self._positions[item_id] = (x_pos, y_pos)
+        if old_cell != new_cell:
+            self._cells[old_cell].remove(item_id)
+            if len(self._cells[old_cell]) == 0:
+                del self._cells[old_cell]
+            self._cells.setdefault(new_cell, set()).add(item_id)
+
+    def ids_in_rectangle(self, min_x, min_y, max_x, max_y):
+        # ids whose positions are inside the rectangle, including its edges
+        if min_x > max_x or min_y > max_y:
+            return []
+
+        min_column, min_row = self._cell_of(min_x, min_y)
+        max_column, max_row = self._cell_of(max_x, max_y)
+
+        # a rectangle much bigger than the occupied area would be mostly empty cells
+        if (max_column - min_column + 1) * (max_row - min_row + 1) > len(self._cells):
+            cells = [
+                cell for cell in self._cells
+                if min_column <= cell[0] <= max_column and min_row <= cell[1] <= max_row
+            ]
+        else:
+            cells = [
+                (column, row)
+                for column in range(min_column, max_column + 1)
+                for row in range(min_row, max_row + 1)
+                if (column, row) in self._cells
+            ]
+
+        ids = []
+        for cell in cells:
+            on_border = cell[0] in (min_column, max_column) or cell[1] in (min_row, max_row)
+            for item_id in self._cells[cell]:
+                if on_border:
+                    x_pos, y_pos = self._positions[item_id]
+                    if not (min_x <= x_pos <= max_x and min_y <= y_pos <= max_y):
+                        continue
+                ids.append(item_id)
+
+        return ids
+
+    def ids_in_radius(self, x_pos, y_pos, radius):
+        # ids within radius of the point, nearest first
+        ids_with_distances = []
+        for item_id in self.ids_in_rectangle(x_pos - radius, y_pos - radius, x_pos + radius, y_pos + radius):
+            distance = self._distance_to(item_id, x_pos, y_pos)
+            if distance <= radius:
+                ids_with_distances.append((distance, item_id))
+
+        ids_with_distances.sort()
+        return ids_with_distances
+
+    def nearest_ids(self, x_pos, y_pos, count):
+        # Returns up to count (distance, id) pairs, nearest first. Rings of cells around the
+        # point's cell are searched outwards, until nothing further out could be nearer than
+        # the count-th nearest found so far.
+        if count <= 0:
+            return []
+
+        center_column, center_row = self._cell_of(x_pos, y_pos)
+        # max-heap, by negated distance, of the nearest found so far
+        nearest = []
+        ring = 0
+        while True:
+            if (2 * ring + 1) ** 2 > 2 * len(self._cells):
+                # the rings now cover more cells than are occupied, so look at the rest directly
+                cells = [
+                    cell for cell in self._cells
+                    if max(abs(cell[0] - center_column), abs(cell[1] - center_row)) >= ring
+                ]
+                self._add_nearest(cells, x_pos, y_pos, count, nearest)
+                break
+
+            self._add_nearest(self._ring_cells(center_column, center_row, ring), x_pos, y_pos, count, nearest)
+
+            # the nearest anything outside the rings searched so far could be
+            outside_distance = min(
+                x_pos - (center_column - ring) * self._cell_size,
+                (center_column + ring + 1) * self._cell_size - x_pos,
+                y_pos - (center_row - ring) * self._cell_size,
+                (center_row + ring + 1) * self._cell_size - y_pos,
+            )
+            if len(nearest) == count and -nearest[0][0] <= outside_distance:
+                break
+            ring += 1
+
+        return sorted((-neg_distance, item_id) for neg_distance, item_id in nearest)
+
+    def _ring_cells(self, center_column, center_row, ring):
+        # the occupied cells whose column or row is ring cells away from the center
+        if ring == 0:
+            cells = [(center_column, center_row)]
+        else:
+            cells = []
+            for column in range(center_column - ring, center_column + ring + 1):
+                cells.append((column, center_row - ring))
+                cells.append((column, center_row + ring))
+            for row in range(center_row - ring + 1, center_row + ring):
+                cells.append((center_column - ring, row))
+                cells.append((center_column + ring, row))
+
+        return [cell for cell in cells if cell in self._cells]
+
+    def _add_nearest(self, cells, x_pos, y_pos, count, nearest):
+        for cell in cells:
+            for item_id in self._cells[cell]:
+                entry = (-self._distance_to(item_id, x_pos, y_pos), item_id)
+                if len(nearest) < count:
+                    heapq.heappush(nearest, entry)
+                elif entry > nearest[0]:
+                    heapq.heapreplace(nearest, entry)
+
+    def _distance_to(self, item_id, x_pos, y_pos):
+        item_x_pos, item_y_pos = self._positions[item_id]
+        return math.hypot(item_x_pos - x_pos, item_y_pos - y_pos)
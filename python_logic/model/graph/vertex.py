@@ -22,6 +22,15 @@ class Vertex:
         
         return Vertex(self._label, cloned_ports, self._x_pos, self._y_pos)
     
+    def label(self):
+        return self._label
+    
+    def x(self):
+        return self._x_pos
+    
+    def y(self):
+        return self._y_pos
+    
     def has_port(self, port_id):
         return port_id in self._ports
     
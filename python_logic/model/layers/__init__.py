@@ -1,6 +1,15 @@
 from .base_layer import BaseLayer
 from .repeat_int_layer import RepeatIntLayer
 from .layer_update_exception import LayerUpdateException
+from .shape_inference_cache import ShapeInferenceCache, shape_inference_cache
+from .shape_inference import (
+    ANALYTIC_BACKEND,
+    KERAS_BACKEND,
+    CROSS_CHECK_BACKEND,
+    shape_inference_backend,
+    set_shape_inference_backend,
+    set_shape_inference_executor,
+    )
 from .dense_layer import DenseLayer
 from .conv2d_layer import Conv2DLayer
 from .input_layer import InputLayer
@@ -3,6 +3,8 @@ from ..value_wrappers import ShapeWrapper
 from .common_value_wrappers import activation_enum_wrapper
 
 class ActivationLayer(BaseLayer):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             field_val_wrappers=[
@@ -19,9 +21,10 @@ class ActivationLayer(BaseLayer):
             ]
         )
     
-    def update(self):
-        input_shape = self.get_field_val_wrapper("input_shape").get_value()
-        self.get_field_val_wrapper("output_shape").set_value(input_shape)
+    def compute_output_values(self, field_values):
+        return {
+            "output_shape": field_values["input_shape"],
+        }
     
     def clone(self):
         clone = ActivationLayer()
@@ -1,8 +1,10 @@
 from .base_layer import BaseLayer
 from ..value_wrappers import ShapeWrapper
-from .layer_update_exception import LayerUpdateException
+from .analytic_shapes import add_output_shape
 
 class AddLayer(BaseLayer):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             [
@@ -20,17 +22,13 @@ class AddLayer(BaseLayer):
             ]
         )
     
-    def update(self):
-        first_input_shape_wrapper = self.get_field_val_wrapper("first_input_shape")
-        second_input_shape_wrapper = self.get_field_val_wrapper("second_input_shape")
-
-        if not first_input_shape_wrapper.compare_to_value(second_input_shape_wrapper.get_value()):
-            raise LayerUpdateException("The input shapes to add layer must agree")
-        
-        self.get_field_val_wrapper("output_shape").set_value(
-            first_input_shape_wrapper.get_value()
-        )
-
+    def compute_output_values(self, field_values):
+        return {
+            "output_shape": add_output_shape(
+                field_values["first_input_shape"],
+                field_values["second_input_shape"],
+            ),
+        }
 
     def clone(self):
         clone = AddLayer()
@@ -0,0 +1,42 @@
+from .layer_update_exception import LayerUpdateException
+
+# Output shape computations in pure python. Shapes don't include the batch dimension.
+
+def dense_output_shape(input_shape, units):
+    return input_shape[:-1] + [units]
+
+def conv_output_length(input_length, kernel_size, padding, stride):
+    # same as keras.utils.conv_utils.conv_output_length with a dilation of 1
+    if padding == "same":
+        output_length = input_length
+    elif padding == "valid":
+        output_length = input_length - kernel_size + 1
+    else:
+        raise LayerUpdateException("Unknown padding \"" + str(padding) + "\"")
+    
+    return (output_length + stride - 1) // stride
+
+def conv2d_output_shape(input_shape, filters, kernel_size, strides, padding):
+    # channels last, like the keras default
+    rows = conv_output_length(input_shape[0], kernel_size[0], padding, strides[0])
+    cols = conv_output_length(input_shape[1], kernel_size[1], padding, strides[1])
+    return [rows, cols, filters]
+
+def reshape_output_shape(input_shape, target_shape):
+    input_shape_dim_product = 1
+    for dim in input_shape:
+        input_shape_dim_product *= dim
+    target_shape_dim_product = 1
+    for dim in target_shape:
+        target_shape_dim_product *= dim
+    
+    if input_shape_dim_product != target_shape_dim_product:
+        raise LayerUpdateException("The products of the input shape ({}) and the target shape ({}) must be the same.".format(input_shape_dim_product, target_shape_dim_product))
+    
+    return list(target_shape)
+
+def add_output_shape(first_input_shape, second_input_shape):
+    if list(first_input_shape) != list(second_input_shape):
+        raise LayerUpdateException("The input shapes to add layer must agree")
+    
+    return list(first_input_shape)
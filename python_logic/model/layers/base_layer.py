@@ -1,8 +1,37 @@
 from ..value_wrappers import BaseValueWrapper, ValueWrapperException
+from .layer_update_exception import LayerUpdateException
+from .layer_schema import LayerSchema
 
 class BaseLayer:
+    # Layers of one class all have the same fields and ports, so the lookup tables for them are
+    # kept in a LayerSchema on the class and instances only store their value wrappers,
+    # in schema field order.
+    __slots__ = ("_field_val_wrappers",)
+
     def __init__(
         self,
+        field_val_wrappers,
+        readonly_field_names,
+        input_ports_with_field_names,
+        output_ports_with_field_names,
+        ):
+        layer_class = type(self)
+        schema = layer_class.__dict__.get("_layer_schema")
+        if schema is None:
+            schema = BaseLayer._create_schema(
+                field_val_wrappers,
+                readonly_field_names,
+                input_ports_with_field_names,
+                output_ports_with_field_names,
+            )
+            layer_class._layer_schema = schema
+        
+        assert len(field_val_wrappers) == len(schema.field_names), "Assert layer has the same fields as its class's schema"
+        
+        self._field_val_wrappers = [entry[1] for entry in field_val_wrappers]
+    
+    @staticmethod
+    def _create_schema(
         field_val_wrappers,
         readonly_field_names,
         input_ports_with_field_names,
@@ -15,13 +44,12 @@ class BaseLayer:
             assert isinstance(entry[0], str), "Assert field val wrapper entries have string names as first values"
             assert isinstance(entry[1], BaseValueWrapper), "Assert field wrappers have value wrappers as second values"
         
-        self._field_val_wrappers = field_val_wrappers
-        
+        field_names = [entry[0] for entry in field_val_wrappers]
         
         assert isinstance(readonly_field_names, list), "Assert BaseLayer constructor argument is a list"
         for field_name in readonly_field_names:
             assert isinstance(field_name, str), "Assert BaseLayer constructor argument is a list of strings"
-            assert self.has_field(field_name), "Assert field names are all in field_val_wrappers"
+            assert field_name in field_names, "Assert field names are all in field_val_wrappers"
         
         for ports_with_field_names in [input_ports_with_field_names, output_ports_with_field_names]:
             assert isinstance(ports_with_field_names, list), "Assert ports with field names argument is a list of port name-field name pairs"
@@ -32,27 +60,24 @@ class BaseLayer:
                 assert isinstance(port_and_name[1], str), "Assert field name is string in port name-field name pair"
         # @TODO : check that there are no conflicting input and output port names
         
-        self._readonly_field_names = readonly_field_names
-        self._input_ports_with_field_names = input_ports_with_field_names
-        self._output_ports_with_field_names = output_ports_with_field_names
+        return LayerSchema(
+            field_names,
+            readonly_field_names,
+            input_ports_with_field_names,
+            output_ports_with_field_names,
+        )
     
     def has_field(self, field_name):
-        for entry in self._field_val_wrappers:
-            if entry[0] == field_name:
-                return True
-        return False
+        return field_name in self._layer_schema.field_indices
     
     def field_names(self):
-        names = []
-        for entry in self._field_val_wrappers:
-            names.append(entry[0])
-        return names
+        return list(self._layer_schema.field_names)
     
     def get_field_val_wrapper(self, field_name):
-        for entry in self._field_val_wrappers:
-            if entry[0] == field_name:
-                return entry[1]
-        return None
+        field_idx = self._layer_schema.field_indices.get(field_name)
+        if field_idx is None:
+            return None
+        return self._field_val_wrappers[field_idx]
     
     @staticmethod
     def copy_layer_fields(source_layer, target_layer):
@@ -62,39 +87,65 @@ class BaseLayer:
             )
 
     def port_names(self):
-        names = []
-        
-        for pair in self._input_ports_with_field_names + self._output_ports_with_field_names:
-            names.append(pair[0])
-        
-        return names
+        return list(self._layer_schema.port_names)
     
     # @QUESTION : should there be less methods here?
     def input_port_count(self):
-        return len(self._input_ports_with_field_names)
+        return self._layer_schema.input_port_count
     
     def output_port_count(self):
-        return len(self._output_ports_with_field_names)
+        return self._layer_schema.output_port_count
     
     def port_is_input(self, port_name):
-        for pair in self._input_ports_with_field_names:
-            if pair[0] == port_name:
-                return True
-        return False
+        return port_name in self._layer_schema.input_port_names
     
     def field_name_of_port(self, port_name):
-        for pair in self._input_ports_with_field_names + self._output_ports_with_field_names:
-            if pair[0] == port_name:
-                return pair[1]
-        
-        raise KeyError(port_name)
-
+        # raises KeyError if there is no such port
+        return self._layer_schema.field_names_by_port[port_name]
 
     def is_field_read_only(self, field_name):
-        return field_name in self._readonly_field_names
+        return field_name in self._layer_schema.readonly_field_names
     
-    def update(self):
+    def compute_output_values(self, field_values):
+        # Takes a dict of every field's value, returns a dict of the values of the fields
+        # computed from them. Should raise LayerUpdateException if they can't be computed.
         raise NotImplementedError()
     
+    def try_update(self, field_value_overrides):
+        # Returns the computed field values the layer would have if the given field values
+        # replaced its current ones, without changing the layer.
+        # Raises LayerUpdateException if the values are invalid or the update would fail.
+        for field_name in field_value_overrides:
+            if not self.has_field(field_name):
+                raise LayerUpdateException("Layer has no field named \"" + field_name + "\"")
+        
+        field_values = {}
+        for field_name, field_val_wrapper in zip(self._layer_schema.field_names, self._field_val_wrappers):
+            if field_name in field_value_overrides:
+                field_value = field_value_overrides[field_name]
+                validated = field_val_wrapper.validate_value(field_value)
+                if validated is not None:
+                    raise LayerUpdateException("Field named \"" + field_name + "\" has invalid value: " + validated)
+                field_values[field_name] = field_value
+            else:
+                field_values[field_name] = field_val_wrapper.get_value()
+        
+        output_values = self.compute_output_values(field_values)
+
+        for field_name in output_values:
+            validated = self.get_field_val_wrapper(field_name).validate_value(output_values[field_name])
+            if validated is not None:
+                raise LayerUpdateException("Could not set " + field_name + " to " + str(output_values[field_name]) + ": " + validated)
+        
+        return output_values
+    
+    def set_field_values(self, field_values):
+        # sets fields without updating the layer
+        for field_name in field_values:
+            self.get_field_val_wrapper(field_name).set_value(field_values[field_name])
+    
+    def update(self):
+        self.set_field_values(self.try_update({}))
+    
     def clone(self):
         raise NotImplementedError()
\ No newline at end of file
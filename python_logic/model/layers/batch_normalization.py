@@ -3,6 +3,8 @@ from .base_layer import BaseLayer
 from ..value_wrappers import ShapeWrapper, IntWrapper, FloatWrapper, BooleanWrapper
 
 class BatchNormalizationLayer(BaseLayer):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             field_val_wrappers=[
@@ -23,10 +25,10 @@ class BatchNormalizationLayer(BaseLayer):
             ]
         )
     
-    def update(self):
-        self.get_field_val_wrapper("output_shape").set_value(
-            self.get_field_val_wrapper("input_shape").get_value()
-        )
+    def compute_output_values(self, field_values):
+        return {
+            "output_shape": field_values["input_shape"],
+        }
     
     def clone(self):
         clone = BatchNormalizationLayer()
@@ -1,10 +1,11 @@
 from .base_layer import BaseLayer
-from .layer_update_exception import LayerUpdateException
-from ..value_wrappers import IntWrapper, EnumStringWrapper, BooleanWrapper, ShapeWrapper, ValueWrapperException
+from ..value_wrappers import IntWrapper, EnumStringWrapper, BooleanWrapper, ShapeWrapper
 from .common_value_wrappers import activation_enum_wrapper
-from keras.layers import Conv2D
+from .shape_inference import conv2d_output_shape
 
 class Conv2DLayer(BaseLayer):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             [
@@ -43,26 +44,16 @@ class Conv2DLayer(BaseLayer):
         )
         self.update()
     
-    def update(self):
-        input_shape = self.get_field_val_wrapper("input_shape").get_value()
-        kernel_size = self.get_field_val_wrapper("kernel_size").get_value()
-        strides = self.get_field_val_wrapper("strides").get_value()
-        padding = self.get_field_val_wrapper("padding").get_value()
-        activation = self.get_field_val_wrapper("activation").get_value()
-        filters = self.get_field_val_wrapper("filters").get_value()
-
-        output_shape = None
-        try:
-            layer = Conv2D(filters=filters, kernel_size=kernel_size, strides=strides, padding=padding, activation=activation)
-            # Add a None as first dimension for keras, remove the None from output dimension
-            output_shape = list(layer.compute_output_shape([None] + input_shape))[1:]
-        except Exception as exp:
-            raise LayerUpdateException("Unknown keras error: " + str(exp))
-        
-        try:
-            self.get_field_val_wrapper("output_shape").set_value(output_shape)
-        except ValueWrapperException as exp:
-            raise LayerUpdateException("Could not set output shape to " + str(output_shape) + ": " + str(exp))
+    def compute_output_values(self, field_values):
+        return {
+            "output_shape": conv2d_output_shape(
+                field_values["input_shape"],
+                field_values["filters"],
+                field_values["kernel_size"],
+                field_values["strides"],
+                field_values["padding"],
+            ),
+        }
     
     def clone(self):
         clone = Conv2DLayer()
@@ -1,10 +1,12 @@
 from .base_layer import BaseLayer
 from .layer_update_exception import LayerUpdateException
-from ..value_wrappers import IntWrapper, EnumStringWrapper, BooleanWrapper, ShapeWrapper, ValueWrapperException
+from ..value_wrappers import IntWrapper, EnumStringWrapper, BooleanWrapper, ShapeWrapper
 from .common_value_wrappers import activation_enum_wrapper
-from keras.layers import Dense
+from .shape_inference import dense_output_shape
 
 class DenseLayer(BaseLayer):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             [
@@ -24,30 +26,13 @@ class DenseLayer(BaseLayer):
         )
         self.update()
     
-    def update(self):
-        input_shape = self.get_field_val_wrapper("input_shape").get_value()
-        # add None as first dimension
-        input_shape = [None] + input_shape
-        activation_function = self.get_field_val_wrapper("activation").get_value()
-        
-        units = self.get_field_val_wrapper("units").get_value()
-        
-        if units <= 1:
+    def compute_output_values(self, field_values):
+        if field_values["units"] <= 1:
             raise LayerUpdateException("Units must be a positive integer")
 
-        output_shape = None
-        
-        try:
-            layer = Dense(units=units, activation=activation_function)
-            # skip first dimension to remove None dim
-            output_shape = list(layer.compute_output_shape(input_shape))[1:]
-        except Exception as exp:
-            raise LayerUpdateException("Unknown keras error: " + str(exp))
-        
-        try:
-            self.get_field_val_wrapper("output_shape").set_value(output_shape)
-        except ValueWrapperException as exp:
-            raise LayerUpdateException("Could not set output shape to " + str(output_shape) + ": " + str(exp))
+        return {
+            "output_shape": dense_output_shape(field_values["input_shape"], field_values["units"]),
+        }
     
     def clone(self):
         clone = DenseLayer()
@@ -2,6 +2,8 @@ from .base_layer import BaseLayer
 from ..value_wrappers import ShapeWrapper
 
 class InputLayer(BaseLayer):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             [
@@ -14,8 +16,8 @@ class InputLayer(BaseLayer):
             ]
         )
     
-    def update(self):
-        pass
+    def compute_output_values(self, field_values):
+        return {}
     
     def clone(self):
         clone = InputLayer()
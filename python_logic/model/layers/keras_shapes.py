@@ -0,0 +1,24 @@
+from .layer_update_exception import LayerUpdateException
+
+# Output shape computations done by keras. Keras is imported when these are first called,
+# since importing it loads tensorflow.
+
+def dense_output_shape(input_shape, units):
+    from keras.layers import Dense
+
+    try:
+        layer = Dense(units=units)
+        # add None as first dimension for keras, skip first dimension to remove None dim
+        return list(layer.compute_output_shape([None] + input_shape))[1:]
+    except Exception as exp:
+        raise LayerUpdateException("Unknown keras error: " + str(exp))
+
+def conv2d_output_shape(input_shape, filters, kernel_size, strides, padding):
+    from keras.layers import Conv2D
+
+    try:
+        layer = Conv2D(filters=filters, kernel_size=kernel_size, strides=strides, padding=padding)
+        # Add a None as first dimension for keras, remove the None from output dimension
+        return list(layer.compute_output_shape([None] + input_shape))[1:]
+    except Exception as exp:
+        raise LayerUpdateException("Unknown keras error: " + str(exp))
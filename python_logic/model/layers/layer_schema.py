@@ -0,0 +1,30 @@
+class LayerSchema:
+    """The field and port layout of a layer class, built once and shared by all its instances"""
+    __slots__ = (
+        "field_names",
+        "field_indices",
+        "readonly_field_names",
+        "port_names",
+        "input_port_names",
+        "field_names_by_port",
+        "input_port_count",
+        "output_port_count",
+    )
+
+    def __init__(
+        self,
+        field_names,
+        readonly_field_names,
+        input_ports_with_field_names,
+        output_ports_with_field_names,
+        ):
+        self.field_names = tuple(field_names)
+        self.field_indices = {field_name: idx for idx, field_name in enumerate(self.field_names)}
+        self.readonly_field_names = frozenset(readonly_field_names)
+
+        ports_with_field_names = input_ports_with_field_names + output_ports_with_field_names
+        self.port_names = tuple(port_name for port_name, _ in ports_with_field_names)
+        self.input_port_names = frozenset(port_name for port_name, _ in input_ports_with_field_names)
+        self.field_names_by_port = dict(ports_with_field_names)
+        self.input_port_count = len(input_ports_with_field_names)
+        self.output_port_count = len(output_ports_with_field_names)
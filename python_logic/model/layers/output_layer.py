@@ -2,6 +2,8 @@ from .base_layer import BaseLayer
 from ..value_wrappers import ShapeWrapper
 
 class OutputLayer(BaseLayer):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             [
@@ -14,8 +16,8 @@ class OutputLayer(BaseLayer):
             []
         )
     
-    def update(self):
-        pass
+    def compute_output_values(self, field_values):
+        return {}
     
     def clone(self):
         clone = OutputLayer()
@@ -2,6 +2,8 @@ from .base_layer import BaseLayer
 from ..value_wrappers import IntWrapper
 
 class RepeatIntLayer(BaseLayer):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             [
@@ -17,10 +19,10 @@ class RepeatIntLayer(BaseLayer):
             ]
         )
     
-    def update(self):
-        self.get_field_val_wrapper("outputInt").set_value(
-            self.get_field_val_wrapper("inputInt").get_value()
-        )
+    def compute_output_values(self, field_values):
+        return {
+            "outputInt": field_values["inputInt"],
+        }
     
     def clone(self):
         clone = RepeatIntLayer()
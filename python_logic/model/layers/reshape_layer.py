@@ -1,8 +1,10 @@
 from .base_layer import BaseLayer
 from ..value_wrappers import ShapeWrapper
-from .layer_update_exception import LayerUpdateException
+from .analytic_shapes import reshape_output_shape
 
 class ReshapeLayer(BaseLayer):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(
             [
@@ -19,20 +21,13 @@ class ReshapeLayer(BaseLayer):
             ]
         )
     
-    def update(self):
-        input_shape = self.get_field_val_wrapper("input_shape").get_value()
-        target_shape = self.get_field_val_wrapper("target_shape").get_value()
-        input_shape_dim_product = 1
-        for dim in input_shape:
-            input_shape_dim_product *= dim
-        target_shape_dim_product = 1
-        for dim in target_shape:
-            target_shape_dim_product *= dim
-        
-        if input_shape_dim_product != target_shape_dim_product:
-                raise LayerUpdateException("The products of the input shape ({}) and the target shape ({}) must be the same.".format(input_shape_dim_product, target_shape_dim_product))
-        self.get_field_val_wrapper("output_shape").set_value(target_shape)
-
+    def compute_output_values(self, field_values):
+        return {
+            "output_shape": reshape_output_shape(
+                field_values["input_shape"],
+                field_values["target_shape"],
+            ),
+        }
     
     def clone(self):
         clone = ReshapeLayer()
@@ -0,0 +1,111 @@
+import logging
+import os
+import time
+from . import analytic_shapes, keras_shapes
+from .layer_update_exception import LayerUpdateException
+from .shape_inference_cache import shape_inference_cache
+from ..metrics import metrics
+
+# "analytic" computes shapes in pure python, "keras" asks keras, and "crosscheck" does both,
+# logs any disagreement, and uses the keras result.
+ANALYTIC_BACKEND = "analytic"
+KERAS_BACKEND = "keras"
+CROSS_CHECK_BACKEND = "crosscheck"
+SHAPE_BACKENDS = [ANALYTIC_BACKEND, KERAS_BACKEND, CROSS_CHECK_BACKEND]
+
+SHAPE_BACKEND_ENV_VAR = "TS_CANVAS_SHAPE_BACKEND"
+
+log = logging.getLogger(__name__)
+
+_backend = os.environ.get(SHAPE_BACKEND_ENV_VAR, ANALYTIC_BACKEND)
+assert _backend in SHAPE_BACKENDS, "Assert " + SHAPE_BACKEND_ENV_VAR + " is one of " + ", ".join(SHAPE_BACKENDS)
+
+_execute = lambda func: func()
+
+def shape_inference_backend():
+    return _backend
+
+def set_shape_inference_backend(backend):
+    global _backend
+    assert backend in SHAPE_BACKENDS, "Assert shape backend is one of " + ", ".join(SHAPE_BACKENDS)
+    _backend = backend
+    # cached shapes might have come from the other backend
+    shape_inference_cache.clear()
+
+def set_shape_inference_executor(execute):
+    # Keras shape computations are passed to execute(func), which calls func and returns its
+    # result or raises its exception, so they can be run off the calling thread
+    global _execute
+    _execute = execute
+
+def _call_keras(layer_type, keras_func, args):
+    start_time = time.perf_counter()
+    try:
+        return _execute(lambda: keras_func(*args))
+    finally:
+        metrics.observe_latency("keras." + layer_type, time.perf_counter() - start_time)
+
+def _call_shape_func(func, args):
+    try:
+        return func(*args), None
+    except LayerUpdateException as exp:
+        return None, str(exp)
+
+def _cross_checked(layer_type, analytic_func, keras_func, args):
+    keras_shape, keras_error = _call_shape_func(_call_keras, (layer_type, keras_func, args))
+    analytic_shape, analytic_error = _call_shape_func(analytic_func, args)
+
+    if (keras_error is None) != (analytic_error is None) or keras_shape != analytic_shape:
+        log.warning(
+            "%s shape backends disagree for %s: keras gave %s, analytic gave %s",
+            layer_type,
+            args,
+            keras_shape if keras_error is None else "error \"" + keras_error + "\"",
+            analytic_shape if analytic_error is None else "error \"" + analytic_error + "\"",
+        )
+    
+    if keras_error is not None:
+        raise LayerUpdateException(keras_error)
+    return keras_shape
+
+def _output_shape(layer_type, analytic_func, keras_func, hyperparameters, input_shape, args):
+    if _backend == ANALYTIC_BACKEND:
+        return analytic_func(*args)
+
+    # building keras layers is slow, so their results are cached
+    if _backend == KERAS_BACKEND:
+        compute_output_shape = lambda: _call_keras(layer_type, keras_func, args)
+    else:
+        compute_output_shape = lambda: _cross_checked(layer_type, analytic_func, keras_func, args)
+    
+    return shape_inference_cache.get_output_shape(
+        layer_type,
+        hyperparameters,
+        input_shape,
+        compute_output_shape,
+    )
+
+def dense_output_shape(input_shape, units):
+    return _output_shape(
+        "Dense",
+        analytic_shapes.dense_output_shape,
+        keras_shapes.dense_output_shape,
+        {"units": units},
+        input_shape,
+        (input_shape, units),
+    )
+
+def conv2d_output_shape(input_shape, filters, kernel_size, strides, padding):
+    return _output_shape(
+        "Conv2D",
+        analytic_shapes.conv2d_output_shape,
+        keras_shapes.conv2d_output_shape,
+        {
+            "filters": filters,
+            "kernel_size": kernel_size,
+            "strides": strides,
+            "padding": padding,
+        },
+        input_shape,
+        (input_shape, filters, kernel_size, strides, padding),
+    )
@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+from .layer_update_exception import LayerUpdateException
+
+SHAPE_INFERENCE_CACHE_SIZE = 4096
+
+class ShapeInferenceCache:
+    """Bounded LRU cache of computed output shapes, and of the errors from computing them"""
+    def __init__(self, max_size):
+        assert isinstance(max_size, int) and max_size > 0, "Assert max cache size is a positive integer"
+
+        self._max_size = max_size
+        # key -> (output shape tuple or None, error message or None)
+        self._entries = OrderedDict()
+        self._hit_count = 0
+        self._miss_count = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _normalize(value):
+        if isinstance(value, (list, tuple)):
+            return tuple(ShapeInferenceCache._normalize(el) for el in value)
+        return value
+    
+    def get_output_shape(self, layer_type, hyperparameters, input_shape, compute_output_shape):
+        # hyperparameters should only include the values that affect the output shape.
+        # compute_output_shape is called on a miss, and should raise LayerUpdateException on error.
+        key = (
+            layer_type,
+            tuple(sorted((name, ShapeInferenceCache._normalize(hyperparameters[name])) for name in hyperparameters)),
+            ShapeInferenceCache._normalize(input_shape),
+        )
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hit_count += 1
+        
+        if entry is None:
+            try:
+                entry = (tuple(compute_output_shape()), None)
+            except LayerUpdateException as exp:
+                entry = (None, str(exp))
+            
+            with self._lock:
+                self._miss_count += 1
+                self._entries[key] = entry
+                if len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+
+        output_shape, error_message = entry
+        if error_message is not None:
+            raise LayerUpdateException(error_message)
+
+        return list(output_shape)
+    
+    def hit_count(self):
+        return self._hit_count
+    
+    def miss_count(self):
+        return self._miss_count
+    
+    def size(self):
+        return len(self._entries)
+    
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._hit_count = 0
+            self._miss_count = 0
+
+# shared by every layer in the process
+shape_inference_cache = ShapeInferenceCache(SHAPE_INFERENCE_CACHE_SIZE)
@@ -0,0 +1,62 @@
+import pickle
+from .save_format import SaveFormatException
+
+# Saves from before the binary save format are pickles of {"graph": Graph, "layer_dict":
+# {layer id: layer}}. They're read with every class replaced by a plain attribute holder, so
+# reading one never runs code from the file, and only the attributes those classes had then
+# are used.
+
+class _LegacyObject:
+    """Stands in for a class from a legacy save, keeping only the attributes it was saved with"""
+
+class _LegacySaveUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if module.split(".")[0] != "python_logic":
+            raise pickle.UnpicklingError("Legacy saves can't contain " + module + "." + name)
+        return type(name, (_LegacyObject,), {})
+
+def _is_savable_value(value):
+    # the values the binary save format can hold
+    if isinstance(value, (bool, int, float, str)):
+        return True
+    return isinstance(value, list) and all(isinstance(el, int) and not isinstance(el, bool) for el in value)
+
+def read_legacy_save(handle):
+    # Returns a snapshot, like Model.save_snapshot's, of the model pickled in the file. Field
+    # values the binary format can't hold are left out, so they get their defaults when loaded.
+    try:
+        saved = _LegacySaveUnpickler(handle).load()
+        graph = saved["graph"]
+        layer_dict = saved["layer_dict"]
+
+        vertex_records = []
+        for vtx_id, vertex in graph._vertices.items():
+            field_values = {}
+            for field_name, field_val_wrapper in layer_dict[vtx_id]._field_val_wrappers:
+                if _is_savable_value(field_val_wrapper._value):
+                    field_values[field_name] = field_val_wrapper._value
+            vertex_records.append((vtx_id, vertex._label, vertex._x_pos, vertex._y_pos, field_values))
+
+        edge_records = [
+            (
+                edge_id,
+                edge._src_vtx_id,
+                edge._src_port_id,
+                edge._tgt_vtx_id,
+                edge._tgt_port_id,
+                edge._consistency,
+            )
+            for edge_id, edge in graph._edges.items()
+        ]
+    except (pickle.UnpicklingError, EOFError, AttributeError, IndexError, KeyError, TypeError, ValueError) as exp:
+        raise SaveFormatException("Not a readable legacy save: " + str(exp))
+
+    return {
+        "metadata": {
+            "vertexCount": len(vertex_records),
+            "edgeCount": len(edge_records),
+            "graphVersion": 0,
+        },
+        "vertices": vertex_records,
+        "edges": edge_records,
+    }
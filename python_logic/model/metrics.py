@@ -0,0 +1,96 @@
+import bisect
+import threading
+
+# upper bounds of the histogram buckets, values above the last bound go in an overflow bucket
+LATENCY_BUCKET_BOUNDS_MS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+SIZE_BUCKET_BOUNDS = [4 ** exponent for exponent in range(13)]
+
+class Histogram:
+    """Counts values into buckets with fixed upper bounds, so percentiles can be estimated
+    without keeping every value"""
+    def __init__(self, bounds):
+        self._bounds = bounds
+        self._bucket_counts = [0] * (len(bounds) + 1)
+        self._count = 0
+        self._sum = 0
+        self._max = 0
+
+    def add(self, value):
+        self._bucket_counts[bisect.bisect_left(self._bounds, value)] += 1
+        self._count += 1
+        self._sum += value
+        self._max = max(self._max, value)
+
+    def percentile(self, fraction):
+        # the upper bound of the bucket holding the value at that fraction of the count, or the
+        # max if that's lower or the value is in the overflow bucket
+        if self._count == 0:
+            return 0
+        rank = fraction * self._count
+        seen_count = 0
+        for idx, bucket_count in enumerate(self._bucket_counts):
+            seen_count += bucket_count
+            if seen_count >= rank and idx < len(self._bounds):
+                return min(self._bounds[idx], self._max)
+        return self._max
+
+    def to_json_serializable(self):
+        return {
+            "count": self._count,
+            "sum": self._sum,
+            "max": self._max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            # bucket upper bound -> count, for the buckets that aren't empty
+            "buckets": {
+                (str(self._bounds[idx]) if idx < len(self._bounds) else "inf"): bucket_count
+                for idx, bucket_count in enumerate(self._bucket_counts)
+                if bucket_count != 0
+            },
+        }
+
+class Metrics:
+    """Latency histograms in milliseconds, size histograms, and counters, by name"""
+    def __init__(self):
+        self._latencies = {}
+        self._sizes = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe_latency(self, name, seconds):
+        with self._lock:
+            histogram = self._latencies.get(name)
+            if histogram is None:
+                histogram = Histogram(LATENCY_BUCKET_BOUNDS_MS)
+                self._latencies[name] = histogram
+            histogram.add(seconds * 1000)
+
+    def observe_size(self, name, size):
+        with self._lock:
+            histogram = self._sizes.get(name)
+            if histogram is None:
+                histogram = Histogram(SIZE_BUCKET_BOUNDS)
+                self._sizes[name] = histogram
+            histogram.add(size)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def to_json_serializable(self):
+        with self._lock:
+            return {
+                "latenciesMs": {name: histogram.to_json_serializable() for name, histogram in sorted(self._latencies.items())},
+                "sizes": {name: histogram.to_json_serializable() for name, histogram in sorted(self._sizes.items())},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._latencies = {}
+            self._sizes = {}
+            self._counters = {}
+
+# shared by every model in the process, and by the server
+metrics = Metrics()
@@ -1,4 +1,6 @@
-from .graph import Graph, Vertex, Port
+import heapq
+import time
+from .graph import Graph, Vertex, Port, GraphChangeLog
 from .layers import (
     BaseLayer,
     RepeatIntLayer,
@@ -14,6 +16,45 @@ from .layers import (
     )
 from .value_wrappers import ValueWrapperException
 from .file_utils import list_of_saved, save_model, load_model, try_delete_file
+from .save_format import SaveFormatException
+from .undo_journal import UndoJournal
+from .metrics import metrics
+
+ESTIMATED_BYTES_PER_LAYER = 2048
+ESTIMATED_BYTES_PER_EDGE = 512
+
+# the keys each type of change request needs
+REQUIRED_REQUEST_KEYS = {
+    "moveVertex": ["vertexId", "x", "y"],
+    "cloneVertex": ["sourceVertexId", "newVertexId", "x", "y"],
+    "createEdge": ["newEdgeId", "sourceVertexId", "sourcePortId", "targetVertexId", "targetPortId"],
+    "deleteVertex": ["vertexId"],
+    "deleteEdge": ["edgeId"],
+    "setLayerFields": ["layerId", "fieldValues"],
+    "createLayer": ["layerType", "newLayerId", "x", "y"],
+    "bulkLoad": ["vertices", "edges"],
+}
+
+def _malformed_request_error(req):
+    # an error message if the change request is missing keys its type needs, or None
+    if not isinstance(req, dict) or not isinstance(req.get("type"), str):
+        return "Request has no type"
+    missing_keys = [key for key in REQUIRED_REQUEST_KEYS.get(req["type"], []) if key not in req]
+    if len(missing_keys) != 0:
+        return req["type"] + " request is missing " + ", ".join(missing_keys)
+    return None
+
+def _parse_graph_page_cursor(cursor):
+    # the graph version and offset in a getGraphData cursor, or None if it isn't one
+    if not isinstance(cursor, str):
+        return None
+    try:
+        version, offset = (int(part) for part in cursor.split(":"))
+    except ValueError:
+        return None
+    if offset < 0:
+        return None
+    return version, offset
 
 
 class Model:
@@ -33,6 +74,28 @@ class Model:
         self._graph = Graph()
         self._layer_dict = {}
 
+        # vertices whose fields changed, and edges that were created or need to be retried,
+        # since the last propagation
+        self._dirty_vertex_ids = set()
+        self._dirty_edge_ids = set()
+
+        # The graph version goes up every time a batch of changes modifies the graph, so clients
+        # can tell whether a delta applies to the graph they have.
+        self._graph_version = 0
+        self._graph_change_log = GraphChangeLog()
+        self._graph_replaced = False
+
+        # the vertex and edge ids in the order the graph is sent in pages, and the graph version
+        # they were listed at
+        self._paged_ids = None
+        self._paged_ids_version = None
+
+        # Each batch of changes is journaled as the small operations that undo it
+        self._undo_journal = UndoJournal()
+
+        # if set, every change is appended to this once it's been applied
+        self._write_ahead_log = None
+
         # self._add_layer("Dense", "a", 0, 0)
         # self._add_layer("Repeat Int", "b", 400, 0)
         # self._add_layer("Conv2D", "c", 0, 100)
@@ -48,6 +111,15 @@ class Model:
 
         self._layer_dict[new_layer_id] = new_layer
 
+        self._graph.add_vertex(
+            new_layer_id,
+            Model._new_vertex(layer_type, new_layer, x_pos, y_pos)
+        )
+        self._graph_change_log.vertex_added(new_layer_id)
+        self._undo_journal.record(("deleteVertex", new_layer_id))
+
+    @staticmethod
+    def _new_vertex(layer_type, new_layer, x_pos, y_pos):
         ports = {}
         input_port_idx = 0
         output_port_idx = 0
@@ -79,20 +151,370 @@ class Model:
                 port_field_name
             )
 
-        self._graph.add_vertex(
-            new_layer_id,
-            Vertex(layer_type, ports, x_pos, y_pos)
+        return Vertex(layer_type, ports, x_pos, y_pos)
+
+    def estimated_memory_bytes(self):
+        # rough estimate from measuring graphs of the built-in layers
+        return (
+            self._graph.vertex_count() * ESTIMATED_BYTES_PER_LAYER +
+            self._graph.edge_count() * ESTIMATED_BYTES_PER_EDGE +
+            self._undo_journal.estimated_bytes()
         )
 
     def json_serializable_graph(self):
         return self._graph.to_json_serializable()
 
-    def request_model_changes(self, reqs):
-        for req in reqs:
-            self.request_model_change(req)
-        self._propagate_model()
+    def graph_version(self):
+        return self._graph_version
+
+    def _pending_graph_version(self):
+        # The version clients will be sent once the pending changes are taken. It's the one
+        # saved and logged, so the version restored from them is never behind a client's.
+        if not self._graph_replaced and self._graph_change_log.is_empty():
+            return self._graph_version
+        return self._graph_version + 1
+
+    def take_graph_changes(self):
+        # Returns the message describing how the graph changed since this was last called, or
+        # None if it didn't. It is a delta against the previous version unless the whole graph
+        # was replaced, in which case it is a full snapshot.
+        if not self._graph_replaced and self._graph_change_log.is_empty():
+            return None
+
+        self._graph_version += 1
+
+        if self._graph_replaced:
+            message = {
+                "version": self._graph_version,
+                "newGraph": self._graph.to_json_serializable(),
+            }
+        else:
+            message = {
+                "version": self._graph_version,
+                "baseVersion": self._graph_version - 1,
+                "delta": self._graph_change_log.to_json_serializable(self._graph),
+            }
+
+        self._graph_replaced = False
+        self._graph_change_log.clear()
+
+        return message
+
+    def save_snapshot(self):
+        # Copies the graph and layer field values into plain records that can be saved.
+        # Vertices are in topological order, so loading them never has to reorder the graph.
+        vertex_records = [self._vertex_record(vtx_id) for vtx_id in self._graph.topological_order()]
+        edge_records = [self._edge_record(edge_id) for edge_id in self._graph.edge_ids()]
+        next_vertex_id, next_edge_id = self._graph.id_allocator_state()
+
+        return {
+            "metadata": {
+                "vertexCount": len(vertex_records),
+                "edgeCount": len(edge_records),
+                "graphVersion": self._pending_graph_version(),
+                "nextVertexId": next_vertex_id,
+                "nextEdgeId": next_edge_id,
+            },
+            "vertices": vertex_records,
+            "edges": edge_records,
+        }
+
+    def _vertex_record(self, vtx_id):
+        vertex = self._graph.get_vertex(vtx_id)
+        layer = self._layer_dict[vtx_id]
+        field_values = {}
+        for field_name in layer.field_names():
+            field_values[field_name] = layer.get_field_val_wrapper(field_name).get_value()
+
+        return (vtx_id, vertex.label(), vertex.x(), vertex.y(), field_values)
+
+    def _edge_record(self, edge_id):
+        edge = self._graph.get_edge(edge_id)
+        return (
+            edge_id,
+            edge.source_vertex_id(),
+            edge.source_port_id(),
+            edge.target_vertex_id(),
+            edge.target_port_id(),
+            edge.is_consistent(),
+        )
+
+    def load_snapshot(self, metadata, records):
+        # Replaces the graph with one built from saved records, which can be a generator that
+        # reads them from a file. Raises SaveFormatException, leaving the model unchanged, if
+        # the records don't describe a valid graph.
+        loaded = Model()
+
+        for record_type, record in records:
+            if record_type == "vertex":
+                loaded._load_vertex_record(record)
+            else:
+                loaded._load_edge_record(record)
+
+        # ids handed out for either graph may still be in use by clients
+        next_vertex_id, next_edge_id = self._graph.id_allocator_state()
+        loaded._graph.advance_id_allocators(
+            max(next_vertex_id, metadata.get("nextVertexId", 0)),
+            max(next_edge_id, metadata.get("nextEdgeId", 0)),
+        )
+
+        self._graph = loaded._graph
+        self._layer_dict = loaded._layer_dict
+        self._dirty_vertex_ids = set()
+        self._dirty_edge_ids = set()
+        self._graph_change_log.clear()
+        self._undo_journal.clear()
+        # the version never goes backwards, so clients can tell the loaded graph is newer
+        self._graph_version = max(self._graph_version, metadata.get("graphVersion", 0))
+
+    def _load_vertex_record(self, record):
+        vtx_id, layer_type, x_pos, y_pos, field_values = record
+
+        if self._graph.has_vertex_id(vtx_id):
+            raise SaveFormatException("Vertex " + vtx_id + " is saved more than once")
+        if layer_type not in self._available_layers:
+            raise SaveFormatException("Unknown layer type " + layer_type)
+
+        self._add_layer(layer_type, vtx_id, x_pos, y_pos)
+        layer = self._layer_dict[vtx_id]
+
+        # Fields that the layer no longer has are skipped, and fields that weren't saved or
+        # whose saved values are no longer valid keep their defaults. Setting a value validates
+        # it, so it isn't validated separately first.
+        loaded_field_count = 0
+        for field_name in field_values:
+            field_val_wrapper = layer.get_field_val_wrapper(field_name)
+            if field_val_wrapper is None:
+                continue
+            try:
+                field_val_wrapper.set_value(field_values[field_name])
+            except ValueWrapperException:
+                continue
+            loaded_field_count += 1
+
+        if loaded_field_count != len(layer.field_names()):
+            try:
+                layer.update()
+            except LayerUpdateException:
+                pass
+
+    def _load_edge_record(self, record):
+        edge_id, src_vtx_id, src_port_id, tgt_vtx_id, tgt_port_id, consistent = record
+
+        if self._graph.has_edge_id(edge_id):
+            raise SaveFormatException("Edge " + edge_id + " is saved more than once")
+        for vtx_id, port_id in [(src_vtx_id, src_port_id), (tgt_vtx_id, tgt_port_id)]:
+            if not self._graph.has_vertex_id(vtx_id) or not self._graph.get_vertex(vtx_id).has_port(port_id):
+                raise SaveFormatException("Edge " + edge_id + " connects to a port that doesn't exist")
+
+        try:
+            self._graph.create_edge(edge_id, src_vtx_id, src_port_id, tgt_vtx_id, tgt_port_id)
+        except ValueError as exp:
+            raise SaveFormatException(str(exp))
+
+        self._graph.get_edge(edge_id).set_consistency(consistent)
+
+    def bulk_load(self, vertex_descriptions, edge_descriptions):
+        # Adds many layers and edges in one batch, see _bulk_load. Returns an error message,
+        # in which case nothing was added, or None.
+        return self.request_model_changes([{
+            "type": "bulkLoad",
+            "vertices": vertex_descriptions,
+            "edges": edge_descriptions,
+        }])[0]
+
+    def set_write_ahead_log(self, write_ahead_log):
+        self._write_ahead_log = write_ahead_log
+
+    def _log_entry(self, entry):
+        if self._write_ahead_log is not None:
+            self._write_ahead_log.append(entry)
+
+    def _checkpoint_if_needed(self):
+        if self._write_ahead_log is not None and self._write_ahead_log.needs_checkpoint():
+            self._write_ahead_log.checkpoint(self.save_snapshot())
+
+    def replay_log_entries(self, entries):
+        # Applies entries read from a write-ahead log, which should be replayed on top of the
+        # checkpoint they were logged after. Returns how many were applied. An entry that
+        # raises is skipped, so one bad entry doesn't keep the document from loading.
+        entry_count = 0
+        for entry in entries:
+            # clients may have any graph from before the entries were replayed, so they're
+            # sent the whole graph, with a version after any they were sent
+            self._graph_replaced = True
+            try:
+                self._replay_log_entry(entry)
+            except Exception as exp:
+                print("Skipped write-ahead log entry that could not be replayed: " + repr(exp))
+                continue
+            self._graph_version = max(self._graph_version, entry.get("graphVersion", 0))
+            entry_count += 1
+
+        return entry_count
+
+    def _replay_log_entry(self, entry):
+        entry_type = entry["type"]
+        if entry_type == "changes":
+            self.request_model_changes(entry["reqs"], entry.get("atomic", False), merge=entry.get("merged", False))
+        elif entry_type == "undo":
+            # The logged operations are used rather than the journal's, since the step being
+            # undone may have been journaled before the checkpoint.
+            self._undo_journal.take_undo_step()
+            for inverse_op in reversed(entry["ops"]):
+                self._apply_inverse_op(inverse_op)
+        elif entry_type == "redo":
+            self._undo_journal.take_redo_step()
+            self.request_model_changes(entry["reqs"], is_redo=True)
+
+    def request_model_changes(self, reqs, atomic=False, is_redo=False, merge=None):
+        # Applies the requests and then propagates once. Returns a list with the error message
+        # or None for each request. If atomic is True and any request fails, the requests
+        # before it are rolled back and the rest aren't tried, so nothing changes, and each
+        # request gets an error message saying why it wasn't applied. merge is
+        # passed to UndoJournal.end_step.
+        self._undo_journal.begin_step(reqs)
+
+        # An unexpected exception rolls back the batch and closes its journal step, so the model
+        # is left as it was and later batches can still be applied
+        try:
+            results = []
+            for req in reqs:
+                result = _malformed_request_error(req)
+                if result is None:
+                    start_time = time.perf_counter()
+                    result = self.request_model_change(req)
+                    metrics.observe_latency("change." + req["type"], time.perf_counter() - start_time)
+                results.append(result)
+                if result is not None and atomic:
+                    self._roll_back_step()
+                    results = [
+                        "Rolled back, since a later request in the batch failed" if earlier_result is None else earlier_result
+                        for earlier_result in results
+                    ]
+                    results.extend(["Not applied, since an earlier request in the batch failed"] * (len(reqs) - len(results)))
+                    return results
+
+            start_time = time.perf_counter()
+            self._propagate_model()
+            metrics.observe_latency("propagation", time.perf_counter() - start_time)
+        except:
+            self._roll_back_step()
+            raise
+
+        merged = self._undo_journal.end_step(clear_redo=not is_redo, merge=merge)
+
+        # only batches that were applied are logged, so replaying the log can't fail on them
+        if is_redo:
+            self._log_entry({"type": "redo", "reqs": reqs, "graphVersion": self._pending_graph_version()})
+        else:
+            self._log_entry({
+                "type": "changes",
+                "reqs": reqs,
+                "atomic": atomic,
+                "merged": merged,
+                "graphVersion": self._pending_graph_version(),
+            })
+
+        self._checkpoint_if_needed()
+        return results
+
+    def _roll_back_step(self):
+        # Undoes the changes made since the journal step was opened, including any propagation.
+        # Batches that are rolled back aren't logged.
+        step = self._undo_journal.abort_step()
+        for inverse_op in reversed(step.inverse_ops()):
+            self._apply_inverse_op(inverse_op)
+
+        self._dirty_vertex_ids = set()
+        self._dirty_edge_ids = set()
+
+    def _undo(self):
+        step = self._undo_journal.take_undo_step()
+        if step is None:
+            return
+
+        # The inverse operations restore every vertex position, field value (including those
+        # changed by propagation) and edge consistency, so nothing needs to be propagated.
+        for inverse_op in reversed(step.inverse_ops()):
+            self._apply_inverse_op(inverse_op)
+
+        self._log_entry({"type": "undo", "ops": step.inverse_ops(), "graphVersion": self._pending_graph_version()})
+        self._checkpoint_if_needed()
+
+    def _redo(self):
+        step = self._undo_journal.take_redo_step()
+        if step is None:
+            return
+
+        self.request_model_changes(step.reqs(), is_redo=True)
+
+    def _apply_inverse_op(self, inverse_op):
+        op_type = inverse_op[0]
+
+        if op_type == "moveVertex":
+            _, vtx_id, old_x, old_y = inverse_op
+            self._graph.move_vertex(vtx_id, old_x, old_y)
+            self._graph_change_log.vertex_modified(vtx_id)
+        elif op_type == "deleteVertex":
+            _, vtx_id = inverse_op
+            self._delete_vertex(vtx_id)
+        elif op_type == "restoreVertex":
+            _, vertex_record, edge_records = inverse_op
+            vtx_id, layer_type, x_pos, y_pos, field_values = vertex_record
+            self._add_layer(layer_type, vtx_id, x_pos, y_pos)
+            self._layer_dict[vtx_id].set_field_values(field_values)
+            for edge_record in edge_records:
+                self._restore_edge(edge_record)
+        elif op_type == "deleteEdge":
+            _, edge_id = inverse_op
+            self._graph.delete_edge(edge_id)
+            self._graph_change_log.edge_removed(edge_id)
+        elif op_type == "restoreEdge":
+            _, edge_record = inverse_op
+            self._restore_edge(edge_record)
+        elif op_type == "setLayerFields":
+            _, layer_id, old_field_values = inverse_op
+            self._layer_dict[layer_id].set_field_values(old_field_values)
+        elif op_type == "setEdgeConsistency":
+            _, edge_id, old_consistency = inverse_op
+            self._set_edge_consistency(edge_id, old_consistency)
+
+    def _restore_edge(self, edge_record):
+        edge_id, src_vtx_id, src_port_id, tgt_vtx_id, tgt_port_id, consistent = edge_record
+        self._graph.create_edge(edge_id, src_vtx_id, src_port_id, tgt_vtx_id, tgt_port_id)
+        self._graph.get_edge(edge_id).set_consistency(consistent)
+        self._graph_change_log.edge_added(edge_id)
+
+    def _delete_vertex(self, vtx_id):
+        # | is the union operator for sets
+        for edge_id in self._graph.edge_ids_into_vertex(vtx_id) | self._graph.edge_ids_out_of_vertex(vtx_id):
+            self._graph_change_log.edge_removed(edge_id)
+
+        self._graph.delete_vertex(vtx_id)
+        del self._layer_dict[vtx_id]
+        self._graph_change_log.vertex_removed(vtx_id)
+
+    def _set_layer_field_values(self, layer_id, field_values):
+        # only the fields whose values differ are set, so a change to the same values isn't
+        # an undo step
+        layer = self._layer_dict[layer_id]
+        changed_field_values = {}
+        old_field_values = {}
+        for field_name in field_values:
+            field_val_wrapper = layer.get_field_val_wrapper(field_name)
+            if not field_val_wrapper.compare_to_value(field_values[field_name]):
+                changed_field_values[field_name] = field_values[field_name]
+                old_field_values[field_name] = field_val_wrapper.get_value()
+        if len(changed_field_values) == 0:
+            return
+
+        self._undo_journal.record(("setLayerFields", layer_id, old_field_values))
+        layer.set_field_values(changed_field_values)
 
     def request_model_change(self, req):
+        # Applies a change without propagating it. Returns an error message if the change
+        # can't be made, in which case nothing was changed, or None.
         req_type = req["type"]
 
         if req_type == "moveVertex":
@@ -101,12 +523,15 @@ class Model:
             new_y = req["y"]
 
             if not self._graph.has_vertex_id(vtx_id):
-                return
+                return "Vertex " + vtx_id + " does not exist"
 
             vtx = self._graph.get_vertex(vtx_id)
+            if vtx.x() == new_x and vtx.y() == new_y:
+                return None
+            self._undo_journal.record(("moveVertex", vtx_id, vtx.x(), vtx.y()))
 
-            vtx.set_x(new_x)
-            vtx.set_y(new_y)
+            self._graph.move_vertex(vtx_id, new_x, new_y)
+            self._graph_change_log.vertex_modified(vtx_id)
         elif req_type == "cloneVertex":
             src_vtx_id = req["sourceVertexId"]
             new_vtx_id = req["newVertexId"]
@@ -114,15 +539,15 @@ class Model:
             new_vtx_y = req["y"]
 
             if self._graph.has_vertex_id(new_vtx_id):
-                return
+                return "A vertex with the id " + new_vtx_id + " already exists"
             if not self._graph.has_vertex_id(src_vtx_id):
-                return
+                return "Vertex " + src_vtx_id + " does not exist"
 
             src_layer = self._layer_dict[src_vtx_id]
 
             # Can only be one input or output layer
             if isinstance(src_layer, InputLayer) or isinstance(src_layer, OutputLayer):
-                return
+                return "Input and output layers can't be cloned"
             # @TODO : prevent cloning of some layers, like Input or Output layers
 
             new_vtx = self._graph.get_vertex(src_vtx_id).clone()
@@ -131,6 +556,8 @@ class Model:
             self._graph.add_vertex(new_vtx_id, new_vtx)
             new_layer = self._layer_dict[src_vtx_id].clone()
             self._layer_dict[new_vtx_id] = new_layer
+            self._graph_change_log.vertex_added(new_vtx_id)
+            self._undo_journal.record(("deleteVertex", new_vtx_id))
         elif req_type == "createEdge":
             new_edge_id = req["newEdgeId"]
             src_vtx_id = req["sourceVertexId"]
@@ -147,7 +574,7 @@ class Model:
             )
 
             if validated is not None:
-                return
+                return validated
 
             self._graph.create_edge(
                 new_edge_id,
@@ -156,27 +583,40 @@ class Model:
                 tgt_vtx_id,
                 tgt_port_id,
             )
+            self._dirty_edge_ids.add(new_edge_id)
+            self._graph_change_log.edge_added(new_edge_id)
+            self._undo_journal.record(("deleteEdge", new_edge_id))
         elif req_type == "deleteVertex":
             vtx_id = req["vertexId"]
             if not self._graph.has_vertex_id(vtx_id):
-                return
+                return "Vertex " + vtx_id + " does not exist"
+
+            edge_records = [
+                self._edge_record(edge_id)
+                for edge_id in self._graph.edge_ids_into_vertex(vtx_id) | self._graph.edge_ids_out_of_vertex(vtx_id)
+            ]
+            self._undo_journal.record(("restoreVertex", self._vertex_record(vtx_id), edge_records))
 
-            self._graph.delete_vertex(vtx_id)
-            del self._layer_dict[vtx_id]
+            self._delete_vertex(vtx_id)
         elif req_type == "deleteEdge":
             edge_id = req["edgeId"]
             if not self._graph.has_edge_id(edge_id):
-                return
+                return "Edge " + edge_id + " does not exist"
 
+            self._undo_journal.record(("restoreEdge", self._edge_record(edge_id)))
             self._graph.delete_edge(edge_id)
+            self._graph_change_log.edge_removed(edge_id)
         elif req_type == "setLayerFields":
             layer_id = req["layerId"]
             field_values = req["fieldValues"]
-            update_validated = self._validate_layer_set_fields(layer_id, field_values)
-            if update_validated is not None:
-                return
-
-            self._layer_set_fields(layer_id, field_values)
+            new_field_values = self._layer_field_values_after_set(layer_id, field_values)
+            if isinstance(new_field_values, str):
+                return new_field_values
+
+            self._set_layer_field_values(layer_id, new_field_values)
+            self._dirty_vertex_ids.add(layer_id)
+            # a change to this layer's other fields might let inconsistent incoming edges propagate
+            self._dirty_edge_ids.update(self._graph.edge_ids_into_vertex(layer_id))
         elif req_type == "createLayer":
             layer_type = req["layerType"]
             new_layer_id = req["newLayerId"]
@@ -184,31 +624,149 @@ class Model:
             layer_y = req["y"]
 
             if new_layer_id in self._layer_dict:
-                return
+                return "A layer with the id " + new_layer_id + " already exists"
 
             if layer_type not in self._available_layers:
-                return
+                return "Unknown layer type " + layer_type
 
             # Only one input and one output allowed in graph
             if layer_type == "Input":
-                for layer in self._layer_dict:
+                for layer in self._layer_dict.values():
                     if isinstance(layer, InputLayer):
-                        return
+                        return "Only one input allowed per graph"
             if layer_type == "Output":
-                for layer in self._layer_dict:
+                for layer in self._layer_dict.values():
                     if isinstance(layer, OutputLayer):
-                        return
+                        return "Only one output allowed per graph"
 
             self._add_layer(layer_type, new_layer_id, layer_x, layer_y)
+        elif req_type == "bulkLoad":
+            return self._bulk_load(req["vertices"], req["edges"])
+        else:
+            return "Unknown request type " + req_type
+
+        return None
+
+    def _bulk_load(self, vertex_descriptions, edge_descriptions):
+        # Vertex descriptions are {layer id: {"layerType", "x", "y", "fieldValues"}}, with field
+        # values given as strings like in setLayerFields, and edge descriptions are {edge id:
+        # {"sourceVertexId", "sourcePortId", "targetVertexId", "targetPortId"}}. Edges can
+        # connect to layers already in the model.
+        # All the layers are built and checked before anything is added, and the edges are
+        # added together with a single loop check, instead of one search per edge.
+        has_input = any(isinstance(layer, InputLayer) for layer in self._layer_dict.values())
+        has_output = any(isinstance(layer, OutputLayer) for layer in self._layer_dict.values())
+
+        new_layers = {}
+        new_vertices = {}
+        for layer_id in vertex_descriptions:
+            description = vertex_descriptions[layer_id]
+            layer_type = description["layerType"]
+
+            if layer_id in self._layer_dict:
+                return "A layer with the id " + layer_id + " already exists"
+            if layer_type not in self._available_layers:
+                return "Unknown layer type " + layer_type
+
+            if layer_type == "Input":
+                if has_input:
+                    return "Only one input allowed per graph"
+                has_input = True
+            if layer_type == "Output":
+                if has_output:
+                    return "Only one output allowed per graph"
+                has_output = True
+
+            layer = self._available_layers[layer_type]()
+            field_value_strings = description.get("fieldValues", {})
+            if len(field_value_strings) != 0:
+                field_values = Model._parse_field_value_strings(layer, field_value_strings)
+                if isinstance(field_values, str):
+                    return "Layer " + layer_id + ": " + field_values
+                try:
+                    field_values.update(layer.try_update(field_values))
+                except LayerUpdateException as exp:
+                    return "Layer " + layer_id + ": " + str(exp)
+                layer.set_field_values(field_values)
+
+            new_layers[layer_id] = layer
+            new_vertices[layer_id] = Model._new_vertex(layer_type, layer, description["x"], description["y"])
+
+        new_edges = {}
+        for edge_id in edge_descriptions:
+            description = edge_descriptions[edge_id]
+            new_edges[edge_id] = (
+                description["sourceVertexId"],
+                description["sourcePortId"],
+                description["targetVertexId"],
+                description["targetPortId"],
+            )
+
+        graph_err = self._graph.add_subgraph(new_vertices, new_edges)
+        if graph_err is not None:
+            return graph_err
+
+        self._layer_dict.update(new_layers)
+        for layer_id in new_layers:
+            self._graph_change_log.vertex_added(layer_id)
+            self._undo_journal.record(("deleteVertex", layer_id))
+        for edge_id in new_edges:
+            self._graph_change_log.edge_added(edge_id)
+            self._undo_journal.record(("deleteEdge", edge_id))
+            self._dirty_edge_ids.add(edge_id)
+
+        return None
 
     def _propagate_model(self):
-        topo_sorted_vertices = self._topo_sort_vertices()
+        # Only the edges out of layers whose fields changed (and edges that were created or
+        # need to be retried) are propagated. Vertices are visited in the graph's topological
+        # order, so every layer is settled before the edges out of it are propagated.
+        dirty_vertex_ids = set(
+            vertex_id for vertex_id in self._dirty_vertex_ids if self._graph.has_vertex_id(vertex_id)
+        )
+        dirty_edge_ids_by_source = {}
+        for edge_id in self._dirty_edge_ids:
+            if self._graph.has_edge_id(edge_id):
+                source_id = self._graph.get_edge(edge_id).source_vertex_id()
+                dirty_edge_ids_by_source.setdefault(source_id, set()).add(edge_id)
+
+        self._dirty_vertex_ids = set()
+        self._dirty_edge_ids = set()
+
+        vertex_heap = [
+            (self._graph.topological_index(vertex_id), vertex_id)
+            for vertex_id in dirty_vertex_ids | set(dirty_edge_ids_by_source.keys())
+        ]
+        heapq.heapify(vertex_heap)
+
+        visited_edge_count = 0
+        updated_layer_count = 0
+        while len(vertex_heap) != 0:
+            _, vertex_id = heapq.heappop(vertex_heap)
+
+            if vertex_id in dirty_vertex_ids:
+                edge_ids_to_propagate = self._graph.edge_ids_out_of_vertex(vertex_id)
+            else:
+                edge_ids_to_propagate = dirty_edge_ids_by_source[vertex_id]
+
+            for edge_out_id in edge_ids_to_propagate:
+                target_changed = self._propagate_edge(edge_out_id)
+                target_id = self._graph.get_edge(edge_out_id).target_vertex_id()
+                visited_edge_count += 1
+                if target_changed:
+                    updated_layer_count += 1
+
+                if target_changed and target_id not in dirty_vertex_ids:
+                    dirty_vertex_ids.add(target_id)
+                    if target_id not in dirty_edge_ids_by_source:
+                        heapq.heappush(vertex_heap, (self._graph.topological_index(target_id), target_id))
 
-        for vertex_id in topo_sorted_vertices:
-            for edge_out_id in self._graph.edge_ids_out_of_vertex(vertex_id):
-                self._propagate_edge(edge_out_id)
+        metrics.observe_size("propagation.edgesVisited", visited_edge_count)
+        metrics.increment("propagation.edgesVisited", visited_edge_count)
+        metrics.increment("propagation.layerUpdates", updated_layer_count)
 
     def _propagate_edge(self, edge_id):
+        # returns True if the target layer's fields were changed by the propagation
         edge =  self._graph.get_edge(edge_id)
         source_vertex = self._graph.get_vertex(edge.source_vertex_id())
         target_vertex = self._graph.get_vertex(edge.target_vertex_id())
@@ -224,79 +782,83 @@ class Model:
         target_field_val_wrapper = target_layer.get_field_val_wrapper(target_field_name)
 
         if target_field_val_wrapper.compare_to_value(source_field_value_wrapper.get_value()):
-            edge.set_consistency(True)
-            return
+            self._set_edge_consistency(edge_id, True)
+            return False
         else:
             # validate value
             source_field_value = source_field_value_wrapper.get_value()
             validated_value = target_layer.get_field_val_wrapper(target_field_name).validate_value(source_field_value)
             if validated_value is None:
-                cloned_layer = target_layer.clone()
-                cloned_layer.get_field_val_wrapper(target_field_name).set_value(source_field_value)
-
-                update_works = None
+                new_field_values = {target_field_name: source_field_value}
                 try:
-                    cloned_layer.update()
-                    update_works = True
+                    new_field_values.update(target_layer.try_update(new_field_values))
                 except LayerUpdateException:
-                    update_works = False
+                    new_field_values = None
 
-                if update_works:
-                    target_layer.get_field_val_wrapper(target_field_name).set_value(source_field_value)
-                    target_layer.update()
-                    edge.set_consistency(True)
+                if new_field_values is not None:
+                    self._set_layer_field_values(edge.target_vertex_id(), new_field_values)
+                    self._set_edge_consistency(edge_id, True)
+                    return True
                 else:
-                    edge.set_consistency(False)
+                    self._set_edge_consistency(edge_id, False)
             else:
-                edge.set_consistency(False)
+                self._set_edge_consistency(edge_id, False)
 
-    def _topo_sort_vertices(self):
-        top_to_bottom = []
-        remaining_vertex_ids = set(self._graph.vertex_ids())
+        return False
 
-        while len(remaining_vertex_ids) != 0:
-            root_vertex_ids = []
-            for vertex_id in remaining_vertex_ids:
-                is_root = True
+    def _set_edge_consistency(self, edge_id, consistency):
+        edge = self._graph.get_edge(edge_id)
+        if edge.is_consistent() != consistency:
+            self._undo_journal.record(("setEdgeConsistency", edge_id, edge.is_consistent()))
+            edge.set_consistency(consistency)
+            self._graph_change_log.edge_modified(edge_id)
 
-                for edge_id_in in self._graph.edge_ids_into_vertex(vertex_id):
-                    edge_source_id = self._graph.get_edge(edge_id_in).source_vertex_id()
-
-                    if edge_source_id in remaining_vertex_ids:
-                        is_root = False
+    @staticmethod
+    def _parse_field_value_strings(layer, field_value_strings):
+        # returns the parsed field values, or an error message
+        field_values = {}
+        for field_name in field_value_strings:
+            field_val_wrapper = layer.get_field_val_wrapper(field_name)
+            if field_val_wrapper is None:
+                return "Field named \"" + field_name + "\" does not exist"
 
-                if is_root:
-                    root_vertex_ids.append(vertex_id)
+            try:
+                field_value = field_val_wrapper.parse_string(field_value_strings[field_name])
+            except ValueWrapperException as exp:
+                return "Field named \"" + field_name + "\" has invalid value: " + str(exp)
 
-            for root_vertex_id in root_vertex_ids:
-                top_to_bottom.append(root_vertex_id)
-                remaining_vertex_ids.remove(root_vertex_id)
+            validated = field_val_wrapper.validate_value(field_value)
+            if validated is not None:
+                return "Field named \"" + field_name + "\" has invalid value: " + validated
 
-        return top_to_bottom
+            field_values[field_name] = field_value
 
-    def _layer_set_fields(self, layer_name, field_value_strings):
-        layer = self._layer_dict[layer_name]
-        for field_name in field_value_strings:
-            layer.get_field_val_wrapper(field_name).set_value_string(field_value_strings[field_name])
-        layer.update()
+        return field_values
 
-    def _validate_layer_set_fields(self, layer_name, field_value_strings):
+    def _layer_field_values_after_set(self, layer_name, field_value_strings):
+        # Returns the values of the fields that would change if the given field value strings
+        # were set on the layer, including computed fields, or an error message.
+        # The layer itself is not changed.
         if layer_name not in self._layer_dict:
             return "Layer does not exist"
 
-        cloned_layer = self._layer_dict[layer_name].clone()
-
-        for field_name in field_value_strings:
-            try:
-                cloned_layer.get_field_val_wrapper(field_name).set_value_string(field_value_strings[field_name])
-            except ValueWrapperException as exp:
-                return "Field named \"" + field_name + "\" has invalid value: " + str(exp)
+        layer = self._layer_dict[layer_name]
+        field_values = Model._parse_field_value_strings(layer, field_value_strings)
+        if isinstance(field_values, str):
+            return field_values
 
         try:
-            cloned_layer.update()
+            field_values.update(layer.try_update(field_values))
         except LayerUpdateException as exp:
             return str(exp)
 
+        return field_values
+
+    def _validate_layer_set_fields(self, layer_name, field_value_strings):
+        field_values = self._layer_field_values_after_set(layer_name, field_value_strings)
+        if isinstance(field_values, str):
+            return field_values
+
         return None
 
     def _validate_edge_propagation(
@@ -338,29 +900,45 @@ class Model:
 
         return update_validated
 
-    def make_versioning_request(self, req):
+    def make_versioning_request(self, req, on_save_complete=None):
+        # Saves are written in the background. on_save_complete is called with None once the
+        # file is written, or with an error message if it couldn't be.
+        start_time = time.perf_counter()
+        self._make_versioning_request(req, on_save_complete)
+        metrics.observe_latency("versioning." + req["type"], time.perf_counter() - start_time)
+
+    def _make_versioning_request(self, req, on_save_complete):
         req_type = req["type"]
 
         if req_type == "undo":
-            print("undo unimplemented")
+            self._undo()
         if req_type == "redo":
-            print("redo unimplemented")
+            self._redo()
         if req_type == "saveFile":
-            save_obj = {
-                "graph": self._graph,
-                "layer_dict": self._layer_dict,
-            }
-            save_model(req["fileName"], save_obj)
+            save_model(req["fileName"], self.save_snapshot(), on_save_complete)
         if req_type == "openFile":
-            load_obj = load_model(req["fileName"])
-            if load_obj is not None:
-                self._graph = load_obj["graph"]
-                self._layer_dict = load_obj["layer_dict"]
+            try:
+                loaded = load_model(req["fileName"])
+                if loaded is not None:
+                    metadata, records = loaded
+                    self.load_snapshot(metadata, records)
+                    self._graph_replaced = True
+                    # the log's earlier entries don't apply to the opened graph
+                    if self._write_ahead_log is not None:
+                        self._write_ahead_log.checkpoint(self.save_snapshot(), wait=True)
+            except SaveFormatException as exp:
+                print("Could not open " + req["fileName"] + ": " + str(exp))
 
         if req_type == "deleteFile":
             try_delete_file(req["fileName"])
 
     def make_info_request(self, req):
+        start_time = time.perf_counter()
+        response = self._make_info_request(req)
+        metrics.observe_latency("info." + req["type"], time.perf_counter() - start_time)
+        return response
+
+    def _make_info_request(self, req):
         req_type = req["type"]
 
         if req_type == "validateEdge":
@@ -449,18 +1027,15 @@ class Model:
             vertex = self._graph.get_vertex(layer_id)
             layer = self._layer_dict[layer_id]
 
+            # fields that are set by incoming edges should be read-only
             port_data = {}
+            occupied_fields = set()
             for port_id in vertex.port_ids():
                 port_data[port_id] = {
                     "valueName": vertex.get_port(port_id).value_name()
                 }
-
-            # get list of fields that are set by incoming edges - these fields should be read-only
-            occupied_fields = []
-            for edge_id_in in  self._graph.edge_ids_into_vertex(layer_id):
-                target_port_id = self._graph.get_edge(edge_id_in).target_port_id()
-                target_field_id = layer.field_name_of_port(target_port_id)
-                occupied_fields.append(target_field_id)
+                if self._graph.is_port_occupied(layer_id, port_id):
+                    occupied_fields.add(layer.field_name_of_port(port_id))
 
             field_data = {}
             for field_name in layer.field_names():
@@ -488,7 +1063,7 @@ class Model:
                     "requestError": "layer_nonexistent"
                 }
 
-            if field_name not in self._layer_dict[layer_id].field_names():
+            if not self._layer_dict[layer_id].has_field(field_name):
                 return {
                     "requestError": "field_nonexistent",
                     "fieldName": field_name
@@ -511,7 +1086,7 @@ class Model:
 
             layer = self._layer_dict[layer_id]
 
-            if field_id not in layer.field_names():
+            if not layer.has_field(field_id):
                 return {
                     "requestError": "field_nonexistent"
                 }
@@ -531,22 +1106,24 @@ class Model:
                     "requestError": "layer_nonexistent"
                 }
 
-            cloned_layer = self._layer_dict[layer_name].clone()
+            layer = self._layer_dict[layer_name]
 
             errors = []
+            field_values = {}
 
             for field_name in field_value_strings:
-                if field_name not in cloned_layer.field_names():
+                if not layer.has_field(field_name):
                     return {
                         "requestError": "field_nonexistent",
                         "fieldName": field_name
                     }
                 else:
-                    validated = cloned_layer.get_field_val_wrapper(field_name).validate_value_string(field_value_strings[field_name])
+                    field_val_wrapper = layer.get_field_val_wrapper(field_name)
+                    validated = field_val_wrapper.validate_value_string(field_value_strings[field_name])
                     if validated is not None:
                         errors.append(field_name + ": " + validated)
                     else:
-                        cloned_layer.get_field_val_wrapper(field_name).set_value_string(field_value_strings[field_name])
+                        field_values[field_name] = field_val_wrapper.parse_string(field_value_strings[field_name])
 
             if len(errors) != 0:
                 return {
@@ -556,7 +1133,7 @@ class Model:
                 }
 
             try:
-                cloned_layer.update()
+                layer.try_update(field_values)
             except LayerUpdateException as exp:
                 return {
                     "requestError": None,
@@ -580,8 +1157,61 @@ class Model:
                 "vertexIds": self._graph.new_unique_vertex_ids(count)
             }
         elif req_type == "getGraphData":
+            # With a pageSize, the graph is sent in pages. Each response has the cursor to ask
+            # for the next page with, and a cursor stops working once the graph version changes.
+            page_size = req.get("pageSize")
+            if page_size is None:
+                return {
+                    "data": self._graph.to_json_serializable(),
+                    "version": self._graph_version,
+                }
+
+            offset = 0
+            cursor = req.get("cursor")
+            if cursor is not None:
+                parsed_cursor = _parse_graph_page_cursor(cursor)
+                if parsed_cursor is None:
+                    return {
+                        "requestError": "cursor_malformed",
+                    }
+                cursor_version, offset = parsed_cursor
+                if cursor_version != self._graph_version:
+                    return {
+                        "cursorExpired": True,
+                        "version": self._graph_version,
+                    }
+
+            if self._paged_ids is None or self._paged_ids_version != self._graph_version:
+                self._paged_ids = (self._graph.vertex_ids(), self._graph.edge_ids())
+                self._paged_ids_version = self._graph_version
+            vertex_ids, edge_ids = self._paged_ids
+
+            data, next_offset = self._graph.page_to_json_serializable(vertex_ids, edge_ids, offset, max(1, page_size))
+            return {
+                "cursorExpired": False,
+                "data": data,
+                "version": self._graph_version,
+                "nextCursor": None if next_offset is None else str(self._graph_version) + ":" + str(next_offset),
+            }
+        elif req_type == "verticesInRectangle":
+            return {
+                "vertexIds": self._graph.vertex_ids_in_rectangle(req["minX"], req["minY"], req["maxX"], req["maxY"]),
+            }
+        elif req_type == "verticesInRadius":
+            nearby = self._graph.vertex_ids_in_radius(req["x"], req["y"], req["radius"])
+            return {
+                "vertices": [{"vertexId": vtx_id, "distance": distance} for distance, vtx_id in nearby],
+            }
+        elif req_type == "nearestVertices":
+            nearest = self._graph.nearest_vertex_ids(req["x"], req["y"], req["count"])
+            return {
+                "vertices": [{"vertexId": vtx_id, "distance": distance} for distance, vtx_id in nearest],
+            }
+        elif req_type == "getViewportGraphData":
+            vertex_ids = self._graph.vertex_ids_in_rectangle(req["minX"], req["minY"], req["maxX"], req["maxY"])
             return {
-                "data": self._graph.to_json_serializable()
+                "data": self._graph.subgraph_to_json_serializable(vertex_ids),
+                "version": self._graph_version,
             }
         elif req_type == "getListOfLayers":
             # @TODO : Make this generated instead of hard-coded
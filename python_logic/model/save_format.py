@@ -0,0 +1,306 @@
+import json
+import struct
+import zlib
+
+# Save file layout:
+#   magic (4 bytes) | format version (uint16) | flags (uint16) | header length (uint32) | header
+#   | body
+# The header is utf-8 JSON metadata, readable without touching the body. The body, zlib
+# compressed if the compressed flag is set, is a stream of vertex and edge records followed
+# by an end record.
+#
+# Strings in records go through a string table: a varint of 0 is followed by a new string,
+# which gets added to the table, and any other varint n refers to the (n-1)th table entry.
+# So repeated names (layer types, field names, port names) are only written once.
+
+MAGIC = b"TSCM"
+FORMAT_VERSION = 1
+
+FLAG_COMPRESSED = 1
+
+_PREAMBLE = struct.Struct("<4sHHI")
+_FLOAT = struct.Struct("<d")
+
+_RECORD_END = 0
+_RECORD_VERTEX = 1
+_RECORD_EDGE = 2
+
+_VALUE_INT = 0
+_VALUE_FLOAT = 1
+_VALUE_FALSE = 2
+_VALUE_TRUE = 3
+_VALUE_STRING = 4
+_VALUE_INT_LIST = 5
+
+_WRITE_CHUNK_SIZE = 64 * 1024
+_READ_CHUNK_SIZE = 64 * 1024
+
+class SaveFormatException(Exception):
+    """Exception to be raised when a save file can't be read"""
+
+class _RecordWriter:
+    def __init__(self, handle, compress):
+        self._handle = handle
+        self._compressor = zlib.compressobj() if compress else None
+        self._buffer = bytearray()
+        self._string_indices = {}
+
+    def _flush_buffer(self):
+        if self._compressor is not None:
+            self._handle.write(self._compressor.compress(bytes(self._buffer)))
+        else:
+            self._handle.write(self._buffer)
+        self._buffer = bytearray()
+
+    def finish(self):
+        self._buffer.append(_RECORD_END)
+        self._flush_buffer()
+        if self._compressor is not None:
+            self._handle.write(self._compressor.flush())
+
+    def end_record(self):
+        if len(self._buffer) >= _WRITE_CHUNK_SIZE:
+            self._flush_buffer()
+
+    def write_byte(self, byte):
+        self._buffer.append(byte)
+
+    def write_varint(self, num):
+        # unsigned LEB128
+        while num >= 0x80:
+            self._buffer.append((num & 0x7f) | 0x80)
+            num >>= 7
+        self._buffer.append(num)
+
+    def write_signed_varint(self, num):
+        # zigzag encoding, so small negative numbers stay small
+        self.write_varint(num * 2 if num >= 0 else -num * 2 - 1)
+
+    def write_string(self, string):
+        string_idx = self._string_indices.get(string)
+        if string_idx is not None:
+            self.write_varint(string_idx + 1)
+            return
+
+        self._string_indices[string] = len(self._string_indices)
+        encoded = string.encode("utf-8")
+        self.write_varint(0)
+        self.write_varint(len(encoded))
+        self._buffer += encoded
+
+    def write_value(self, value):
+        # bool is checked first since it's a subclass of int
+        if isinstance(value, bool):
+            self.write_byte(_VALUE_TRUE if value else _VALUE_FALSE)
+        elif isinstance(value, int):
+            self.write_byte(_VALUE_INT)
+            self.write_signed_varint(value)
+        elif isinstance(value, float):
+            self.write_byte(_VALUE_FLOAT)
+            self._buffer += _FLOAT.pack(value)
+        elif isinstance(value, str):
+            self.write_byte(_VALUE_STRING)
+            self.write_string(value)
+        elif isinstance(value, list) and all(isinstance(el, int) and not isinstance(el, bool) for el in value):
+            self.write_byte(_VALUE_INT_LIST)
+            self.write_varint(len(value))
+            for el in value:
+                self.write_signed_varint(el)
+        else:
+            raise ValueError("Can't save value " + repr(value))
+
+class _RecordReader:
+    def __init__(self, handle, compressed):
+        self._handle = handle
+        self._decompressor = zlib.decompressobj() if compressed else None
+        self._buffer = b""
+        self._pos = 0
+        self._strings = []
+
+    def _fill(self, byte_count):
+        # makes sure there are at least byte_count unread bytes in the buffer
+        chunks = [self._buffer[self._pos:]]
+        available = len(chunks[0])
+        while available < byte_count:
+            chunk = self._handle.read(_READ_CHUNK_SIZE)
+            if len(chunk) == 0:
+                raise SaveFormatException("Save file ended unexpectedly")
+            if self._decompressor is not None:
+                try:
+                    chunk = self._decompressor.decompress(chunk)
+                except zlib.error as exp:
+                    raise SaveFormatException("Save file body is corrupt: " + str(exp))
+            chunks.append(chunk)
+            available += len(chunk)
+        self._buffer = b"".join(chunks)
+        self._pos = 0
+
+    def read_bytes(self, byte_count):
+        if len(self._buffer) - self._pos < byte_count:
+            self._fill(byte_count)
+        data = self._buffer[self._pos:self._pos + byte_count]
+        self._pos += byte_count
+        return data
+
+    def read_byte(self):
+        if self._pos >= len(self._buffer):
+            self._fill(1)
+        byte = self._buffer[self._pos]
+        self._pos += 1
+        return byte
+
+    def read_varint(self):
+        # most varints are a single byte
+        pos = self._pos
+        if pos < len(self._buffer):
+            byte = self._buffer[pos]
+            if byte < 0x80:
+                self._pos = pos + 1
+                return byte
+
+        num = 0
+        shift = 0
+        while True:
+            byte = self.read_byte()
+            num |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return num
+            shift += 7
+
+    def read_signed_varint(self):
+        num = self.read_varint()
+        return num >> 1 if num & 1 == 0 else -((num + 1) >> 1)
+
+    def read_string(self):
+        # most strings are repeats, referred to by a single byte
+        pos = self._pos
+        if pos < len(self._buffer):
+            string_ref = self._buffer[pos]
+            if 0 < string_ref < 0x80 and string_ref <= len(self._strings):
+                self._pos = pos + 1
+                return self._strings[string_ref - 1]
+
+        string_ref = self.read_varint()
+        if string_ref != 0:
+            if string_ref > len(self._strings):
+                raise SaveFormatException("Save file refers to a string that doesn't exist")
+            return self._strings[string_ref - 1]
+
+        string = self.read_bytes(self.read_varint()).decode("utf-8")
+        self._strings.append(string)
+        return string
+
+    def read_value(self):
+        value_type = self.read_byte()
+        if value_type == _VALUE_INT_LIST:
+            # shapes, the most common values
+            return [self.read_signed_varint() for _ in range(self.read_varint())]
+        elif value_type == _VALUE_INT:
+            return self.read_signed_varint()
+        elif value_type == _VALUE_FLOAT:
+            return _FLOAT.unpack(self.read_bytes(_FLOAT.size))[0]
+        elif value_type == _VALUE_FALSE:
+            return False
+        elif value_type == _VALUE_TRUE:
+            return True
+        elif value_type == _VALUE_STRING:
+            return self.read_string()
+        else:
+            raise SaveFormatException("Unknown value type " + str(value_type) + " in save file")
+
+def write_save_file(handle, metadata, vertex_records, edge_records, compress=True):
+    # vertex records are (vertex id, layer type, x, y, {field name: field value}) tuples,
+    # edge records are (edge id, source vertex id, source port id, target vertex id,
+    # target port id, is consistent) tuples
+    header = json.dumps(metadata).encode("utf-8")
+    flags = FLAG_COMPRESSED if compress else 0
+    handle.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, flags, len(header)))
+    handle.write(header)
+
+    writer = _RecordWriter(handle, compress)
+
+    for vertex_id, layer_type, x_pos, y_pos, field_values in vertex_records:
+        writer.write_byte(_RECORD_VERTEX)
+        writer.write_string(vertex_id)
+        writer.write_string(layer_type)
+        writer.write_value(x_pos)
+        writer.write_value(y_pos)
+        writer.write_varint(len(field_values))
+        for field_name in field_values:
+            writer.write_string(field_name)
+            writer.write_value(field_values[field_name])
+        writer.end_record()
+
+    for edge_id, source_vertex_id, source_port_id, target_vertex_id, target_port_id, consistent in edge_records:
+        writer.write_byte(_RECORD_EDGE)
+        writer.write_string(edge_id)
+        writer.write_string(source_vertex_id)
+        writer.write_string(source_port_id)
+        writer.write_string(target_vertex_id)
+        writer.write_string(target_port_id)
+        writer.write_byte(1 if consistent else 0)
+        writer.end_record()
+
+    writer.finish()
+
+def _read_preamble(handle):
+    preamble = handle.read(_PREAMBLE.size)
+    if len(preamble) != _PREAMBLE.size:
+        raise SaveFormatException("Save file is too short")
+
+    magic, format_version, flags, header_length = _PREAMBLE.unpack(preamble)
+    if magic != MAGIC:
+        raise SaveFormatException("Not a save file")
+    if format_version > FORMAT_VERSION:
+        raise SaveFormatException("Save file format version " + str(format_version) + " is newer than this server supports")
+
+    try:
+        metadata = json.loads(handle.read(header_length).decode("utf-8"))
+    except ValueError as exp:
+        raise SaveFormatException("Save file header is corrupt: " + str(exp))
+
+    return flags, metadata
+
+def read_save_header(handle):
+    # only reads the metadata at the start of the file
+    _, metadata = _read_preamble(handle)
+    return metadata
+
+def read_save_file(handle):
+    # Returns the metadata, and a generator that yields ("vertex", vertex record) and
+    # ("edge", edge record) pairs as they are read from the handle, in the same format that
+    # write_save_file takes them.
+    flags, metadata = _read_preamble(handle)
+    return metadata, _read_records(_RecordReader(handle, flags & FLAG_COMPRESSED != 0))
+
+def _read_records(reader):
+    read_byte = reader.read_byte
+    read_varint = reader.read_varint
+    read_string = reader.read_string
+    read_value = reader.read_value
+
+    while True:
+        record_type = read_byte()
+        if record_type == _RECORD_END:
+            return
+        elif record_type == _RECORD_VERTEX:
+            vertex_id = read_string()
+            layer_type = read_string()
+            x_pos = read_value()
+            y_pos = read_value()
+            field_values = {}
+            for _ in range(read_varint()):
+                field_name = read_string()
+                field_values[field_name] = read_value()
+            yield "vertex", (vertex_id, layer_type, x_pos, y_pos, field_values)
+        elif record_type == _RECORD_EDGE:
+            yield "edge", (
+                read_string(),
+                read_string(),
+                read_string(),
+                read_string(),
+                read_string(),
+                read_byte() == 1,
+            )
+        else:
+            raise SaveFormatException("Unknown record type " + str(record_type) + " in save file")
@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+
+class SaveWriter:
+    """Writes snapshots to files in a background thread, in the order they were queued.
+    A save to a file that already has a save waiting to be written replaces it."""
+    def __init__(self, write_file):
+        # write_file(file_path, snapshot) does the actual writing
+        self._write_file = write_file
+        self._execute = lambda func: func()
+
+        # file path -> (snapshot, completion callbacks)
+        self._pending_saves = OrderedDict()
+        self._writing_file_path = None
+        self._condition = threading.Condition()
+        self._worker = None
+
+        self._written_count = 0
+        self._coalesced_count = 0
+    
+    def set_executor(self, execute):
+        # execute(func) calls func and returns when it finishes. This lets the writing be run
+        # somewhere else, like a real OS thread when the worker thread is a green thread.
+        self._execute = execute
+    
+    def save(self, file_path, snapshot, on_complete=None):
+        # on_complete is called with None once the file is written, or with an error message
+        with self._condition:
+            callbacks = []
+            if file_path in self._pending_saves:
+                _, callbacks = self._pending_saves.pop(file_path)
+                self._coalesced_count += 1
+            if on_complete is not None:
+                callbacks.append(on_complete)
+
+            self._pending_saves[file_path] = (snapshot, callbacks)
+
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._write_forever, daemon=True)
+                self._worker.start()
+            self._condition.notify_all()
+    
+    def wait_until_written(self, file_path):
+        with self._condition:
+            while file_path in self._pending_saves or self._writing_file_path == file_path:
+                self._condition.wait()
+    
+    def wait_until_idle(self):
+        with self._condition:
+            while len(self._pending_saves) != 0 or self._writing_file_path is not None:
+                self._condition.wait()
+    
+    def stats(self):
+        with self._condition:
+            return {
+                "pendingCount": len(self._pending_saves),
+                "writtenCount": self._written_count,
+                "coalescedCount": self._coalesced_count,
+            }
+    
+    def _write_forever(self):
+        while True:
+            with self._condition:
+                while len(self._pending_saves) == 0:
+                    self._condition.wait()
+                file_path, (snapshot, callbacks) = self._pending_saves.popitem(last=False)
+                self._writing_file_path = file_path
+            
+            error = None
+            try:
+                self._execute(lambda: self._write_file(file_path, snapshot))
+            except Exception as exp:
+                error = str(exp)
+            
+            with self._condition:
+                self._writing_file_path = None
+                self._written_count += 1
+                self._condition.notify_all()
+            
+            # a failing callback mustn't stop the writer, since every later save would wait forever
+            for callback in callbacks:
+                try:
+                    callback(error)
+                except Exception as exp:
+                    print("Save completion callback for " + file_path + " failed: " + repr(exp))
@@ -0,0 +1,161 @@
+import time
+from collections import deque
+
+DEFAULT_MEMORY_BUDGET_BYTES = 32 * 1024 * 1024
+# a step that only moves vertices is merged into the step before it if that one moved the same
+# vertices and ended less than this long before, so a drag is undone all at once
+MOVE_MERGE_SECONDS = 1.0
+
+class JournalStep:
+    """The requests of one batch of model changes, and the operations that undo it"""
+    __slots__ = ("_reqs", "_inverse_ops", "_estimated_bytes")
+
+    def __init__(self, reqs):
+        self._reqs = reqs
+        self._inverse_ops = []
+        self._estimated_bytes = _estimated_size(reqs)
+
+    def reqs(self):
+        return self._reqs
+
+    def inverse_ops(self):
+        # in the order they were recorded, so they undo the batch when applied in reverse
+        return self._inverse_ops
+
+    def estimated_bytes(self):
+        return self._estimated_bytes
+
+    def _add_inverse_op(self, inverse_op):
+        self._inverse_ops.append(inverse_op)
+        self._estimated_bytes += _estimated_size(inverse_op)
+
+    def _moved_vertex_ids(self):
+        # the ids of the vertices the step moved, or None if it did or requested anything else
+        if any(not isinstance(req, dict) or req.get("type") != "moveVertex" or "vertexId" not in req for req in self._reqs):
+            return None
+        if any(inverse_op[0] != "moveVertex" for inverse_op in self._inverse_ops):
+            return None
+        return set(inverse_op[1] for inverse_op in self._inverse_ops)
+
+    def _merge_later_moves(self, step):
+        # Takes in a later step that moved some of the same vertices. This step's inverse
+        # operations already restore the positions from before both, so only the requests
+        # change: each vertex is redone to its latest position.
+        reqs_by_vertex_id = {}
+        for req in self._reqs + step._reqs:
+            reqs_by_vertex_id[req["vertexId"]] = req
+        reqs = list(reqs_by_vertex_id.values())
+        self._estimated_bytes += _estimated_size(reqs) - _estimated_size(self._reqs)
+        self._reqs = reqs
+
+class UndoJournal:
+    """Keeps undo and redo stacks of journal steps, dropping the oldest undo steps when the
+    journal's estimated size goes over its memory budget"""
+    def __init__(self, memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES):
+        self._memory_budget_bytes = memory_budget_bytes
+        self._undo_steps = deque()
+        self._redo_steps = []
+        self._open_step = None
+        self._estimated_bytes = 0
+        # the step last ended and when, while it's still the most recent undo step
+        self._last_ended_step = None
+        self._last_end_time = 0
+
+    def begin_step(self, reqs):
+        assert self._open_step is None, "Assert a journal step isn't already open"
+        self._open_step = JournalStep(reqs)
+
+    def record(self, inverse_op):
+        # changes made while no step is open (loading a file, undoing) aren't journaled
+        if self._open_step is not None:
+            self._open_step._add_inverse_op(inverse_op)
+
+    def end_step(self, clear_redo=True, merge=None):
+        # Keeps the step unless it changed nothing. clear_redo is False when the step is a redo,
+        # so the steps after it can still be redone. A step that continues a drag is merged
+        # into the previous step, see MOVE_MERGE_SECONDS; merge overrides that decision, so
+        # replaying a log merges the same steps. Returns whether the step was merged.
+        step = self._open_step
+        self._open_step = None
+
+        if len(step.inverse_ops()) == 0:
+            return False
+
+        if clear_redo:
+            for redo_step in self._redo_steps:
+                self._estimated_bytes -= redo_step.estimated_bytes()
+            self._redo_steps = []
+
+        now = time.monotonic()
+        if merge is None:
+            merge = clear_redo and now - self._last_end_time <= MOVE_MERGE_SECONDS
+        if merge and self._continues_moves(step):
+            last_step = self._last_ended_step
+            self._estimated_bytes -= last_step.estimated_bytes()
+            last_step._merge_later_moves(step)
+            self._estimated_bytes += last_step.estimated_bytes()
+            self._last_end_time = now
+            return True
+
+        self._undo_steps.append(step)
+        self._estimated_bytes += step.estimated_bytes()
+        self._last_ended_step = step
+        self._last_end_time = now
+        self._enforce_budget()
+        return False
+
+    def _continues_moves(self, step):
+        # whether the step only moved vertices that the last step ended also moved, and that
+        # step only moved vertices and is still the next to be undone
+        if self._last_ended_step is None or len(self._undo_steps) == 0 or self._undo_steps[-1] is not self._last_ended_step:
+            return False
+
+        moved_vertex_ids = step._moved_vertex_ids()
+        last_moved_vertex_ids = self._last_ended_step._moved_vertex_ids()
+        return moved_vertex_ids is not None and last_moved_vertex_ids is not None and moved_vertex_ids <= last_moved_vertex_ids
+
+    def abort_step(self):
+        # closes the open step without keeping it, and returns it so its changes can be undone
+        step = self._open_step
+        self._open_step = None
+        return step
+
+    def take_undo_step(self):
+        # Returns the most recent step, moving it onto the redo stack, or None
+        if len(self._undo_steps) == 0:
+            return None
+
+        step = self._undo_steps.pop()
+        self._redo_steps.append(step)
+        self._last_ended_step = None
+        return step
+
+    def take_redo_step(self):
+        # Returns the most recently undone step, or None. The caller applies its requests again,
+        # which journals a new undo step.
+        if len(self._redo_steps) == 0:
+            return None
+
+        step = self._redo_steps.pop()
+        self._estimated_bytes -= step.estimated_bytes()
+        self._last_ended_step = None
+        return step
+
+    def estimated_bytes(self):
+        return self._estimated_bytes
+
+    def clear(self):
+        self._undo_steps = deque()
+        self._redo_steps = []
+        self._open_step = None
+        self._estimated_bytes = 0
+        self._last_ended_step = None
+
+    def _enforce_budget(self):
+        while self._estimated_bytes > self._memory_budget_bytes and len(self._undo_steps) != 0:
+            self._estimated_bytes -= self._undo_steps.popleft().estimated_bytes()
+
+def _estimated_size(value):
+    # Rough size in bytes of the plain values journal steps are made of. Python objects take up
+    # a few times the length of their repr, and repr is much faster than walking the value.
+    return 64 + 4 * len(repr(value))
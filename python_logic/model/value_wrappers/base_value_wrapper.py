@@ -1,6 +1,8 @@
 from .value_wrapper_exception import ValueWrapperException
 
 class BaseValueWrapper:
+    __slots__ = ("_value",)
+
     def __init__(self, value):
         self.set_value(value)
     
@@ -1,7 +1,9 @@
 from .base_value_wrapper import BaseValueWrapper
 from .value_wrapper_exception import ValueWrapperException
 
-class BooleanWrapper(BaseValueWrapper):    
+class BooleanWrapper(BaseValueWrapper):
+    __slots__ = ()
+
     def copy_value(self, value):
         return value
     
@@ -1,6 +1,8 @@
 from .base_value_wrapper import BaseValueWrapper
 
 class EnumStringWrapper(BaseValueWrapper):
+    __slots__ = ("valid_vals",)
+
     def __init__(self, value, valid_vals):
         assert isinstance(valid_vals, list), "Assert valid_vals argument to enum string wrapper constructor is a list"
         
@@ -2,6 +2,8 @@ from .base_value_wrapper import BaseValueWrapper
 from .value_wrapper_exception import ValueWrapperException
 
 class FloatWrapper(BaseValueWrapper):
+    __slots__ = ()
+
     def __init__(self, val):
         super().__init__(val)
     
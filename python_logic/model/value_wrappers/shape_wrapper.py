@@ -2,6 +2,8 @@ from .base_value_wrapper import BaseValueWrapper
 from .value_wrapper_exception import ValueWrapperException
 
 class ShapeWrapper(BaseValueWrapper):
+    __slots__ = ("_min_dimension_count", "_max_dimension_count")
+
     def __init__(self, value, min_dimension_count=1, max_dimension_count=100):
         self._min_dimension_count = min_dimension_count
         self._max_dimension_count = max_dimension_count
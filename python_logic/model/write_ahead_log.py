@@ -0,0 +1,212 @@
+import json
+import os
+import threading
+import time
+import zlib
+from .file_utils import (
+    log_segment_path,
+    list_log_segments,
+    delete_log_segments,
+    spill_model,
+    queue_spill_model,
+    wait_until_spilled,
+    )
+
+# Each log entry is a line holding the crc32 of its JSON, in hex, and then the JSON. A server
+# that dies partway through writing an entry leaves a line that doesn't check out, and
+# reading stops there.
+#
+# The log is split into numbered segments. A checkpoint is the document's spill file, saved
+# with the number of the first segment that isn't included in it, so recovering a document
+# loads the checkpoint and replays the segments from that one on.
+
+COMPACT_ENTRY_COUNT = 10000
+COMMIT_INTERVAL_SECONDS = 0.005
+
+class WriteAheadLogCommitter:
+    """Fsyncs write-ahead logs in the background. All the entries appended to a log within a
+    commit interval share one fsync. Requests are answered without waiting for it, so a crash
+    can lose the changes made within the last commit interval or so."""
+    def __init__(self, commit_interval_seconds=COMMIT_INTERVAL_SECONDS):
+        self._commit_interval_seconds = commit_interval_seconds
+        self._execute = lambda func: func()
+
+        self._dirty_logs = set()
+        self._condition = threading.Condition()
+        self._worker = None
+
+        self._commit_count = 0
+        self._synced_log_count = 0
+
+    def set_executor(self, execute):
+        # execute(func) calls func and returns when it finishes, see SaveWriter.set_executor.
+        # Only the fsyncs are passed to it, so it can run them in another thread without the
+        # logs' locks, which belong to the committer's thread.
+        self._execute = execute
+
+    def log_appended(self, write_ahead_log):
+        with self._condition:
+            self._dirty_logs.add(write_ahead_log)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._commit_forever, daemon=True)
+                self._worker.start()
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "commitCount": self._commit_count,
+                "syncedLogCount": self._synced_log_count,
+            }
+
+    def _commit_forever(self):
+        while True:
+            with self._condition:
+                while len(self._dirty_logs) == 0:
+                    self._condition.wait()
+
+            # gives appends arriving soon after the first one a chance to join this commit
+            time.sleep(self._commit_interval_seconds)
+
+            with self._condition:
+                dirty_logs = self._dirty_logs
+                self._dirty_logs = set()
+
+            for write_ahead_log in dirty_logs:
+                try:
+                    sync_fd = write_ahead_log.flush_for_sync()
+                    if sync_fd is None:
+                        continue
+                    try:
+                        self._execute(lambda: os.fsync(sync_fd))
+                    finally:
+                        os.close(sync_fd)
+                except OSError as exp:
+                    print("Could not sync write-ahead log: " + str(exp))
+
+            with self._condition:
+                self._commit_count += 1
+                self._synced_log_count += len(dirty_logs)
+
+# shared by every write-ahead log
+write_ahead_log_committer = WriteAheadLogCommitter()
+
+class WriteAheadLog:
+    """Appends the changes made to one document's model to its log segment files"""
+    def __init__(self, log_dir, document_id, segment, compact_entry_count=COMPACT_ENTRY_COUNT):
+        self._log_dir = log_dir
+        self._document_id = document_id
+        self._segment = segment
+        self._compact_entry_count = compact_entry_count
+
+        # entries appended since the last checkpoint
+        self._entry_count = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(log_dir, exist_ok=True)
+        self._handle = open(log_segment_path(log_dir, document_id, segment), "ab")
+
+    def append(self, entry):
+        entry_bytes = json.dumps(entry, separators=(",", ":")).encode("utf-8")
+        line = format(zlib.crc32(entry_bytes), "08x").encode("ascii") + b" " + entry_bytes + b"\n"
+
+        with self._lock:
+            assert self._handle is not None, "Assert write-ahead log is open"
+            self._handle.write(line)
+            self._entry_count += 1
+
+        write_ahead_log_committer.log_appended(self)
+
+    def flush_for_sync(self):
+        # Writes out the buffered entries and returns a duplicate of the file's descriptor, which
+        # the caller fsyncs and closes, or None if the log is closed. The duplicate stays valid
+        # if the log moves on to a new segment or closes in the meantime, and those fsync the
+        # file themselves before closing it.
+        with self._lock:
+            if self._handle is None:
+                return None
+            self._handle.flush()
+            return os.dup(self._handle.fileno())
+
+    def needs_checkpoint(self):
+        return self._entry_count >= self._compact_entry_count
+
+    def checkpoint(self, snapshot, wait=False):
+        # Starts a new segment and writes the snapshot, which has to include every entry appended
+        # so far, as the checkpoint. The old segments are deleted once it's written. If wait is
+        # False it's written in the background, and until then the old segments are still there
+        # to recover from.
+        first_uncovered_segment = self._next_segment()
+        log_dir = self._log_dir
+        document_id = self._document_id
+
+        def on_complete(error):
+            if error is None:
+                delete_log_segments(log_dir, document_id, first_uncovered_segment)
+            else:
+                print("Could not checkpoint document " + document_id + ": " + error)
+
+        queue_spill_model(log_dir, document_id, _with_log_segment(snapshot, first_uncovered_segment), on_complete)
+        if wait:
+            wait_until_spilled(log_dir, document_id)
+
+    def close_with_checkpoint(self, snapshot):
+        # Writes the snapshot as the checkpoint, then closes the log and deletes its segments.
+        # If the checkpoint can't be written, the OSError is raised and the log stays open.
+        spill_model(self._log_dir, self._document_id, _with_log_segment(snapshot, self._segment + 1))
+        self.close()
+        delete_log_segments(self._log_dir, self._document_id)
+
+    def close(self):
+        with self._lock:
+            if self._handle is not None:
+                self._handle.flush()
+                os.fsync(self._handle.fileno())
+                self._handle.close()
+                self._handle = None
+
+    def _next_segment(self):
+        with self._lock:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+            self._handle.close()
+
+            self._segment += 1
+            self._entry_count = 0
+            self._handle = open(log_segment_path(self._log_dir, self._document_id, self._segment), "ab")
+
+            return self._segment
+
+def _with_log_segment(snapshot, segment):
+    metadata = dict(snapshot["metadata"])
+    metadata["logSegment"] = segment
+    return {
+        "metadata": metadata,
+        "vertices": snapshot["vertices"],
+        "edges": snapshot["edges"],
+    }
+
+def checkpoint_log_segment(metadata):
+    # the first log segment to replay on top of a checkpoint with this metadata
+    return metadata.get("logSegment", 0)
+
+def read_write_ahead_log(log_dir, document_id, first_segment):
+    # yields the entries in the log from the given segment on, stopping at the first entry that
+    # wasn't completely written
+    for segment in list_log_segments(log_dir, document_id):
+        if segment < first_segment:
+            continue
+
+        with open(log_segment_path(log_dir, document_id, segment), "rb") as handle:
+            for line in handle:
+                if not line.endswith(b"\n") or len(line) < 10:
+                    return
+                entry_bytes = line[9:-1]
+                try:
+                    if int(line[:8], 16) != zlib.crc32(entry_bytes):
+                        return
+                    entry = json.loads(entry_bytes)
+                except ValueError:
+                    return
+
+                yield entry
@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from .model import Model
+from .model.save_format import SaveFormatException
+from .model.file_utils import (
+    load_spilled_model,
+    move_aside_spilled_model,
+    list_spilled_document_ids,
+    list_log_segments,
+    )
+from .model.write_ahead_log import WriteAheadLog, read_write_ahead_log, checkpoint_log_segment
+
+class ModelPool:
+    """Keeps one model per document in memory, up to a memory budget.
+    Least recently used and idle models are spilled to disk and reloaded when next used.
+    Changes to resident models are written to a write-ahead log in the spill directory, so
+    documents are recovered from their last spill or checkpoint and log after a crash.
+    Requests for a document take its lock with using_model, so they run one at a time.
+    Spilling a document also holds its lock, and models in use or waited for aren't spilled."""
+    def __init__(self, spill_dir, memory_budget_bytes, max_resident_models, idle_seconds):
+        assert memory_budget_bytes > 0, "Assert memory budget is positive"
+        assert max_resident_models > 0, "Assert max resident model count is positive"
+
+        self._spill_dir = spill_dir
+        self._memory_budget_bytes = memory_budget_bytes
+        self._max_resident_models = max_resident_models
+        self._idle_seconds = idle_seconds
+
+        # document id -> model, least recently used first
+        self._resident_models = OrderedDict()
+        self._last_used_times = {}
+        self._write_ahead_logs = {}
+
+        # document id -> lock, and how many requests hold or are waiting for it
+        self._document_locks = {}
+        self._document_lock_user_counts = {}
+        # models spilled before a restart are picked up again
+        self._spilled_document_ids = set(list_spilled_document_ids(spill_dir))
+
+        self._eviction_count = 0
+        self._idle_spill_count = 0
+        self._reload_count = 0
+        self._total_reload_seconds = 0.0
+        self._max_reload_seconds = 0.0
+        self._replayed_entry_count = 0
+    
+    def get_model(self, document_id):
+        model = self._resident_models.get(document_id)
+
+        if model is not None:
+            self._resident_models.move_to_end(document_id)
+        elif document_id in self._spilled_document_ids:
+            model = self._reload(document_id)
+        else:
+            model = Model()
+            self._attach_write_ahead_log(document_id, model, 1)
+            self._resident_models[document_id] = model
+        
+        self._last_used_times[document_id] = time.monotonic()
+        self._evict_over_budget()
+
+        return model
+    
+    @contextmanager
+    def using_model(self, document_id):
+        # Yields the document's model while holding the document's lock. A request can wait
+        # partway through, on shape computations or file writes done in another thread, and
+        # requests for other documents run in the meantime.
+        with self._document_lock(document_id):
+            yield self.get_model(document_id)
+
+    @contextmanager
+    def _document_lock(self, document_id, blocking=True):
+        # Holds the document's lock, yielding whether it was taken, which can only be False
+        # if blocking is False
+        lock = self._document_locks.get(document_id)
+        if lock is None:
+            lock = threading.Lock()
+            self._document_locks[document_id] = lock
+            self._document_lock_user_counts[document_id] = 0
+        self._document_lock_user_counts[document_id] += 1
+
+        try:
+            if not lock.acquire(blocking):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                lock.release()
+        finally:
+            self._document_lock_user_counts[document_id] -= 1
+            if self._document_lock_user_counts[document_id] == 0:
+                del self._document_locks[document_id]
+                del self._document_lock_user_counts[document_id]
+
+    def _is_in_use(self, document_id):
+        # if a request holds or is waiting for the document's lock
+        return document_id in self._document_lock_user_counts
+    
+    def spill_idle_models(self):
+        # should be called periodically
+        now = time.monotonic()
+        for document_id in list(self._resident_models.keys()):
+            if document_id not in self._resident_models or self._is_in_use(document_id):
+                continue
+            if now - self._last_used_times[document_id] > self._idle_seconds and self._spill(document_id):
+                self._idle_spill_count += 1
+    
+    def _reload(self, document_id):
+        # Loads the spill file, and replays any log entries after it, which are only there if
+        # the server stopped while the model was resident. The spill file stays as the
+        # checkpoint the log continues from.
+        start_time = time.perf_counter()
+        model = Model()
+        first_log_segment = 0
+        replayed_entry_count = 0
+        try:
+            loaded = load_spilled_model(self._spill_dir, document_id)
+            if loaded is not None:
+                metadata, records = loaded
+                model.load_snapshot(metadata, records)
+                first_log_segment = checkpoint_log_segment(metadata)
+            replayed_entry_count = model.replay_log_entries(
+                read_write_ahead_log(self._spill_dir, document_id, first_log_segment)
+            )
+        except SaveFormatException as exp:
+            # The files are kept rather than being overwritten by the next spill of the empty
+            # model that replaces them
+            moved_dir = move_aside_spilled_model(self._spill_dir, document_id)
+            print("Could not reload spilled document " + document_id + ", moved its files to " + moved_dir + ": " + str(exp))
+            model = Model()
+            first_log_segment = 0
+            replayed_entry_count = 0
+
+        # a new segment is started, since the last one may end with a partly written entry
+        next_log_segment = max(list_log_segments(self._spill_dir, document_id) + [first_log_segment]) + 1
+        write_ahead_log = self._attach_write_ahead_log(document_id, model, next_log_segment)
+        if replayed_entry_count != 0:
+            write_ahead_log.checkpoint(model.save_snapshot(), wait=True)
+        reload_seconds = time.perf_counter() - start_time
+
+        self._spilled_document_ids.remove(document_id)
+        self._replayed_entry_count += replayed_entry_count
+
+        self._reload_count += 1
+        self._total_reload_seconds += reload_seconds
+        self._max_reload_seconds = max(self._max_reload_seconds, reload_seconds)
+
+        self._resident_models[document_id] = model
+        return model
+    
+    def _spill(self, document_id):
+        # Returns True if the document was spilled. It's left resident if it's in use, or if its
+        # checkpoint couldn't be written. The document's lock is held throughout, since writing
+        # the checkpoint can wait, so requests for it wait until it's spilled and reload it.
+        with self._document_lock(document_id, blocking=False) as is_locked:
+            if not is_locked:
+                return False
+
+            model = self._resident_models[document_id]
+            try:
+                self._write_ahead_logs[document_id].close_with_checkpoint(model.save_snapshot())
+            except OSError as exp:
+                print("Could not spill document " + document_id + ": " + str(exp))
+                return False
+
+            del self._resident_models[document_id]
+            del self._last_used_times[document_id]
+            del self._write_ahead_logs[document_id]
+            self._spilled_document_ids.add(document_id)
+            return True
+    
+    def _attach_write_ahead_log(self, document_id, model, segment):
+        write_ahead_log = WriteAheadLog(self._spill_dir, document_id, segment)
+        model.set_write_ahead_log(write_ahead_log)
+        self._write_ahead_logs[document_id] = write_ahead_log
+        return write_ahead_log
+    
+    def _resident_memory_bytes(self):
+        return sum(model.estimated_memory_bytes() for model in self._resident_models.values())
+    
+    def _evict_over_budget(self):
+        # The most recently used model always stays resident, even if it's over budget on its
+        # own. Models in use are skipped, so the pool can be over budget until they're released.
+        for document_id in list(self._resident_models.keys())[:-1]:
+            if not (
+                len(self._resident_models) > self._max_resident_models or
+                self._resident_memory_bytes() > self._memory_budget_bytes):
+                break
+            if document_id not in self._resident_models or self._is_in_use(document_id):
+                continue
+            if self._spill(document_id):
+                self._eviction_count += 1
+    
+    def metrics(self):
+        average_reload_seconds = 0.0
+        if self._reload_count != 0:
+            average_reload_seconds = self._total_reload_seconds / self._reload_count
+
+        return {
+            "residentCount": len(self._resident_models),
+            "spilledCount": len(self._spilled_document_ids),
+            "residentMemoryBytes": self._resident_memory_bytes(),
+            "evictionCount": self._eviction_count,
+            "idleSpillCount": self._idle_spill_count,
+            "reloadCount": self._reload_count,
+            "averageReloadMs": average_reload_seconds * 1000,
+            "maxReloadMs": self._max_reload_seconds * 1000,
+            "replayedLogEntryCount": self._replayed_entry_count,
+        }
@@ -0,0 +1,62 @@
+from .model.model import REQUIRED_REQUEST_KEYS
+
+def _is_well_formed_move(req):
+    return (
+        isinstance(req, dict) and
+        req.get("type") == "moveVertex" and
+        all(key in req for key in REQUIRED_REQUEST_KEYS["moveVertex"]) and
+        isinstance(req["vertexId"], str)
+    )
+
+class MoveCoalescer:
+    """Collects batches of moveVertex requests for each document, keeping only the latest
+    position of each vertex, so the moves made while dragging are applied together"""
+    def __init__(self):
+        # document id -> {vertex id: latest moveVertex request}
+        self._pending_moves = {}
+        # document id -> list of (vertex ids of a batch, callback for the batch's results)
+        self._pending_batches = {}
+
+    @staticmethod
+    def can_coalesce(reqs):
+        # Only well formed moves are coalesced. Other requests, malformed ones included, go
+        # to the model, which answers them with an error.
+        return isinstance(reqs, list) and len(reqs) != 0 and all(_is_well_formed_move(req) for req in reqs)
+
+    def add(self, document_id, reqs, on_applied):
+        # Takes requests that can_coalesce. on_applied is called with the error or None for
+        # each request once the moves are applied. Returns True if the document had no moves
+        # pending, so a flush needs to be scheduled.
+        assert self.can_coalesce(reqs), "Assert the requests are moves that can be coalesced"
+        is_first = document_id not in self._pending_moves
+        pending_moves = self._pending_moves.setdefault(document_id, {})
+        for req in reqs:
+            pending_moves[req["vertexId"]] = req
+
+        self._pending_batches.setdefault(document_id, []).append(
+            ([req["vertexId"] for req in reqs], on_applied)
+        )
+        return is_first
+
+    def flush(self, document_id, request_model_changes):
+        # Applies the document's pending moves with request_model_changes(reqs), which returns
+        # the result of each request. A request that was replaced by a later move of the same
+        # vertex gets the later move's result. If request_model_changes raises, every request
+        # gets the error before it's raised again. Returns False if nothing was pending.
+        pending_moves = self._pending_moves.pop(document_id, None)
+        if pending_moves is None:
+            return False
+        pending_batches = self._pending_batches.pop(document_id)
+
+        results = ["Could not apply the moves"] * len(pending_moves)
+        try:
+            results = request_model_changes(list(pending_moves.values()))
+        except Exception as exp:
+            results = ["Could not apply the moves: " + repr(exp)] * len(pending_moves)
+            raise
+        finally:
+            results_by_vertex_id = dict(zip(pending_moves.keys(), results))
+            for vertex_ids, on_applied in pending_batches:
+                on_applied([results_by_vertex_id[vertex_id] for vertex_id in vertex_ids])
+
+        return True
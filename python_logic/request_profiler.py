@@ -0,0 +1,53 @@
+import cProfile
+import io
+import pstats
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+
+KEPT_PROFILE_COUNT = 20
+TOP_FUNCTION_COUNT = 30
+
+class RequestProfiler:
+    """Profiles a random sample of requests with cProfile, keeping the most recent profiles.
+    Only one request is profiled at a time. Other requests that run while it waits are
+    included in its profile, since they run on the same thread."""
+    def __init__(self, sample_rate, kept_profile_count=KEPT_PROFILE_COUNT, top_function_count=TOP_FUNCTION_COUNT):
+        assert 0 <= sample_rate <= 1, "Assert profile sample rate is between 0 and 1"
+
+        self._sample_rate = sample_rate
+        self._top_function_count = top_function_count
+        self._profiles = deque(maxlen=kept_profile_count)
+        self._is_profiling = False
+
+    @contextmanager
+    def profiled(self, name):
+        if self._is_profiling or self._sample_rate == 0 or random.random() >= self._sample_rate:
+            yield
+            return
+
+        self._is_profiling = True
+        profile = cProfile.Profile()
+        start_time = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - start_time
+            self._is_profiling = False
+
+            stats_stream = io.StringIO()
+            stats = pstats.Stats(profile, stream=stats_stream)
+            stats.sort_stats("cumulative").print_stats(self._top_function_count)
+            self._profiles.append({
+                "name": name,
+                "time": time.time(),
+                "durationMs": duration * 1000,
+                "stats": stats_stream.getvalue(),
+            })
+
+    def recent_profiles(self):
+        # most recent last
+        return list(self._profiles)
@@ -0,0 +1,36 @@
+"""Checks that a batch of model changes requested as atomic is applied all or not at all.
+
+Run from the repository root with:
+    python -m pytest tests
+"""
+from python_logic.model.model import Model
+
+
+def test_failed_atomic_batch_changes_nothing():
+    model = Model()
+    model.request_model_changes([{"type": "createLayer", "layerType": "Dense", "newLayerId": "a", "x": 0, "y": 0}])
+    graph = model.json_serializable_graph()
+
+    results = model.request_model_changes([
+        {"type": "createLayer", "layerType": "Dense", "newLayerId": "b", "x": 0, "y": 0},
+        {"type": "moveVertex", "vertexId": "a", "x": 5, "y": 5},
+        {"type": "deleteVertex", "vertexId": "missing"},
+        {"type": "deleteVertex", "vertexId": "a"},
+    ], atomic=True)
+
+    assert model.json_serializable_graph() == graph
+    # every request is answered with why it wasn't applied
+    assert results[0] == results[1] == "Rolled back, since a later request in the batch failed"
+    assert results[2] == "Vertex missing does not exist"
+    assert results[3] == "Not applied, since an earlier request in the batch failed"
+
+
+def test_atomic_batch_is_applied_when_every_request_succeeds():
+    model = Model()
+    results = model.request_model_changes([
+        {"type": "createLayer", "layerType": "Dense", "newLayerId": "a", "x": 0, "y": 0},
+        {"type": "moveVertex", "vertexId": "a", "x": 5, "y": 5},
+    ], atomic=True)
+
+    assert results == [None, None]
+    assert model.json_serializable_graph()["vertices"]["a"]["geo"] == {"x": 5, "y": 5}
@@ -0,0 +1,62 @@
+"""Checks which requests the move coalescer takes, and that every batch it takes is answered.
+
+Run from the repository root with:
+    python -m pytest tests
+"""
+import pytest
+
+from python_logic.move_coalescer import MoveCoalescer
+
+
+@pytest.mark.parametrize("reqs,expected", [
+    ([{"type": "moveVertex", "vertexId": "a", "x": 1, "y": 2}], True),
+    ([], False),
+    (None, False),
+    ([{"type": "moveVertex", "vertexId": "a", "x": 1}], False),
+    ([{"type": "moveVertex", "x": 1, "y": 2}], False),
+    ([{"type": "moveVertex", "vertexId": ["a"], "x": 1, "y": 2}], False),
+    ([{"vertexId": "a", "x": 1, "y": 2}], False),
+    (["moveVertex"], False),
+    ([{"type": "moveVertex", "vertexId": "a", "x": 1, "y": 2}, {"type": "deleteVertex", "vertexId": "a"}], False),
+])
+def test_can_coalesce(reqs, expected):
+    assert MoveCoalescer.can_coalesce(reqs) == expected
+
+
+def test_later_move_of_a_vertex_replaces_earlier_one():
+    coalescer = MoveCoalescer()
+    answered = []
+    coalescer.add("doc", [{"type": "moveVertex", "vertexId": "a", "x": 1, "y": 1}], answered.append)
+    coalescer.add("doc", [
+        {"type": "moveVertex", "vertexId": "a", "x": 2, "y": 2},
+        {"type": "moveVertex", "vertexId": "b", "x": 3, "y": 3},
+    ], answered.append)
+
+    applied = []
+    def request_model_changes(reqs):
+        applied.extend(reqs)
+        return [None, "Vertex b does not exist"]
+
+    assert coalescer.flush("doc", request_model_changes)
+    assert applied == [
+        {"type": "moveVertex", "vertexId": "a", "x": 2, "y": 2},
+        {"type": "moveVertex", "vertexId": "b", "x": 3, "y": 3},
+    ]
+    assert answered == [[None], [None, "Vertex b does not exist"]]
+    assert not coalescer.flush("doc", request_model_changes)
+
+
+def test_batches_are_answered_when_applying_raises():
+    coalescer = MoveCoalescer()
+    answered = []
+    coalescer.add("doc", [{"type": "moveVertex", "vertexId": "a", "x": 1, "y": 1}], answered.append)
+    coalescer.add("doc", [{"type": "moveVertex", "vertexId": "b", "x": 1, "y": 1}], answered.append)
+
+    def request_model_changes(reqs):
+        raise RuntimeError("model failed")
+
+    with pytest.raises(RuntimeError):
+        coalescer.flush("doc", request_model_changes)
+    assert len(answered) == 2
+    assert all(results[0].startswith("Could not apply the moves") for results in answered)
+    assert not coalescer.flush("doc", request_model_changes)
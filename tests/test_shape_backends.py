@@ -0,0 +1,82 @@
+"""Checks that the analytic shape computations agree with Keras.
+
+Run from the repository root, with the packages in requirements-keras.txt installed, with:
+    python -m pytest tests
+"""
+import itertools
+import pytest
+
+keras = pytest.importorskip("keras")
+
+from python_logic.model.layers import analytic_shapes, keras_shapes, LayerUpdateException
+
+
+def shape_or_error(func, *args):
+    # the shape, or "error" if the computation raised a LayerUpdateException
+    try:
+        return func(*args)
+    except LayerUpdateException:
+        return "error"
+
+
+def keras_reshape_output_shape(input_shape, target_shape):
+    try:
+        layer = keras.layers.Reshape(target_shape)
+        return list(layer.compute_output_shape(tuple([None] + input_shape)))[1:]
+    except Exception as exp:
+        raise LayerUpdateException("Unknown keras error: " + str(exp))
+
+
+@pytest.mark.parametrize("input_shape,units", [
+    ([10], 1),
+    ([10], 64),
+    ([3, 7], 5),
+    ([2, 3, 4, 5], 16),
+])
+def test_dense_output_shape(input_shape, units):
+    assert (
+        shape_or_error(analytic_shapes.dense_output_shape, input_shape, units) ==
+        shape_or_error(keras_shapes.dense_output_shape, input_shape, units)
+    )
+
+
+CONV2D_INPUT_SHAPES = [[28, 28, 1], [32, 17, 3], [7, 9, 8], [2, 2, 4]]
+CONV2D_KERNEL_SIZES = [[1, 1], [3, 3], [5, 3], [2, 4]]
+CONV2D_STRIDES = [[1, 1], [2, 2], [3, 1], [1, 4]]
+
+
+@pytest.mark.parametrize("input_shape,kernel_size,strides,padding", list(itertools.product(
+    CONV2D_INPUT_SHAPES,
+    CONV2D_KERNEL_SIZES,
+    CONV2D_STRIDES,
+    ["same", "valid"],
+)))
+def test_conv2d_output_shape(input_shape, kernel_size, strides, padding):
+    # includes valid padding with a kernel bigger than the input
+    args = (input_shape, 6, kernel_size, strides, padding)
+    assert (
+        shape_or_error(analytic_shapes.conv2d_output_shape, *args) ==
+        shape_or_error(keras_shapes.conv2d_output_shape, *args)
+    )
+
+
+def test_conv2d_unknown_padding_is_an_error():
+    args = ([28, 28, 1], 6, [3, 3], [1, 1], "bogus")
+    assert shape_or_error(analytic_shapes.conv2d_output_shape, *args) == "error"
+    assert shape_or_error(keras_shapes.conv2d_output_shape, *args) == "error"
+
+
+@pytest.mark.parametrize("input_shape,target_shape", [
+    ([244, 244, 3], [244, 244, 3]),
+    ([244, 244, 3], [244 * 244 * 3]),
+    ([6, 4], [2, 3, 4]),
+    ([12], [3, 2, 2]),
+    # the products differ
+    ([6, 4], [5, 5]),
+    ([12], [3, 5]),
+])
+def test_reshape_output_shape(input_shape, target_shape):
+    assert (
+        shape_or_error(analytic_shapes.reshape_output_shape, input_shape, target_shape) ==
+        shape_or_error(keras_reshape_output_shape, input_shape, target_shape)
+    )
@@ -0,0 +1,50 @@
+"""Checks which batches of model changes become undo steps.
+
+Run from the repository root with:
+    python -m pytest tests
+"""
+from python_logic.model.model import Model
+from python_logic.model import undo_journal
+
+
+def vertex_position(model, vtx_id):
+    geo = model.json_serializable_graph()["vertices"][vtx_id]["geo"]
+    return geo["x"], geo["y"]
+
+
+def model_with_layer():
+    model = Model()
+    model.request_model_changes([{"type": "createLayer", "layerType": "Dense", "newLayerId": "a", "x": 0, "y": 0}])
+    return model
+
+
+def test_batch_that_changes_nothing_is_not_an_undo_step():
+    model = model_with_layer()
+    model.request_model_changes([{"type": "moveVertex", "vertexId": "a", "x": 5, "y": 5}])
+    model.request_model_changes([{"type": "moveVertex", "vertexId": "a", "x": 5, "y": 5}])
+    units = model.make_info_request({"type": "getLayerInfo", "layerId": "a"})["data"]["fields"]["units"]["value"]
+    model.request_model_changes([{"type": "setLayerFields", "layerId": "a", "fieldValues": {"units": units}}])
+
+    model.make_versioning_request({"type": "undo"})
+    assert vertex_position(model, "a") == (0, 0)
+
+
+def test_drag_is_one_undo_step():
+    model = model_with_layer()
+    for x in range(1, 6):
+        model.request_model_changes([{"type": "moveVertex", "vertexId": "a", "x": x, "y": x}])
+
+    model.make_versioning_request({"type": "undo"})
+    assert vertex_position(model, "a") == (0, 0)
+    model.make_versioning_request({"type": "redo"})
+    assert vertex_position(model, "a") == (5, 5)
+
+
+def test_moves_far_apart_are_separate_undo_steps(monkeypatch):
+    model = model_with_layer()
+    monkeypatch.setattr(undo_journal, "MOVE_MERGE_SECONDS", -1)
+    model.request_model_changes([{"type": "moveVertex", "vertexId": "a", "x": 1, "y": 1}])
+    model.request_model_changes([{"type": "moveVertex", "vertexId": "a", "x": 2, "y": 2}])
+
+    model.make_versioning_request({"type": "undo"})
+    assert vertex_position(model, "a") == (1, 1)
@@ -0,0 +1,75 @@
+"""Checks that documents recovered from their write-ahead logs after a crash keep their graph
+versions going up.
+
+Run from the repository root with:
+    python -m pytest tests
+"""
+from python_logic.model_pool import ModelPool
+from python_logic.model.file_utils import save_writer
+
+
+def new_pool(spill_dir):
+    return ModelPool(str(spill_dir), 10 ** 9, 100, 1000)
+
+
+def change_and_publish(model, reqs):
+    # like a request to the server, which sends the clients the changes after applying them
+    model.request_model_changes(reqs)
+    return model.take_graph_changes()["version"]
+
+
+def crash(pool, document_id):
+    # the log is written out, but the model is never spilled
+    save_writer.wait_until_idle()
+    pool._write_ahead_logs[document_id].close()
+
+
+def recovered_version(spill_dir, document_id):
+    model = new_pool(spill_dir).get_model(document_id)
+    graph_changes = model.take_graph_changes()
+    # the clients' graphs may be from before the crash, so they get the whole graph
+    assert "newGraph" in graph_changes
+    return graph_changes["version"]
+
+
+def test_version_goes_up_after_recovery(tmp_path):
+    pool = new_pool(tmp_path)
+    model = pool.get_model("doc")
+    change_and_publish(model, [{"type": "createLayer", "layerType": "Dense", "newLayerId": "a", "x": 0, "y": 0}])
+    for x in range(1, 4):
+        client_version = change_and_publish(model, [{"type": "moveVertex", "vertexId": "a", "x": x, "y": 0}])
+    crash(pool, "doc")
+
+    assert recovered_version(tmp_path, "doc") > client_version
+
+
+def test_version_goes_up_after_recovery_from_checkpoint(tmp_path):
+    pool = new_pool(tmp_path)
+    model = pool.get_model("doc")
+    change_and_publish(model, [{"type": "createLayer", "layerType": "Dense", "newLayerId": "a", "x": 0, "y": 0}])
+    model.request_model_changes([{"type": "createLayer", "layerType": "Dense", "newLayerId": "b", "x": 0, "y": 0}])
+    # checkpointed after the changes are applied but before they're sent, as when the log is compacted
+    model._write_ahead_log.checkpoint(model.save_snapshot(), wait=True)
+    client_version = model.take_graph_changes()["version"]
+    crash(pool, "doc")
+
+    # nothing is replayed, and the checkpoint is the graph the clients have
+    model = new_pool(tmp_path).get_model("doc")
+    assert model.take_graph_changes() is None
+    assert model.graph_version() == client_version
+    assert change_and_publish(model, [{"type": "moveVertex", "vertexId": "a", "x": 1, "y": 0}]) > client_version
+
+
+def test_version_goes_up_after_repeated_recovery(tmp_path):
+    pool = new_pool(tmp_path)
+    model = pool.get_model("doc")
+    client_version = change_and_publish(model, [{"type": "createLayer", "layerType": "Dense", "newLayerId": "a", "x": 0, "y": 0}])
+    for x in range(1, 4):
+        crash(pool, "doc")
+        pool = new_pool(tmp_path)
+        model = pool.get_model("doc")
+        recovered = model.take_graph_changes()["version"]
+        assert recovered > client_version
+        client_version = change_and_publish(model, [{"type": "moveVertex", "vertexId": "a", "x": x, "y": 0}])
+        model.make_versioning_request({"type": "undo"})
+        client_version = model.take_graph_changes()["version"]